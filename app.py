@@ -1,11 +1,12 @@
 import streamlit as st
 from datetime import datetime
 import database as db
-import recommendations
+import importlib
 import os
 from dotenv import load_dotenv
-import dashboard
-import edit_delete
+import tag_index
+import stats  # noqa: F401 - registers the stats change-feed handler before any write
+import collab_filter
 
 
 load_dotenv()
@@ -14,6 +15,17 @@ AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "ap-south-1")
 
 
+# Page modules are imported on first use, so the landing, login and register
+# pages never load pandas, matplotlib or requests. See profile_startup.py.
+def load_page(module_name):
+    return importlib.import_module(module_name)
+
+
+if os.getenv("REFRESH_RECOMMENDATIONS_ON_CHANGE", "0") == "1":
+    # The recommendation refresh handler must be registered before any write.
+    load_page("recommendations")
+
+
 STATUS_OPTIONS = ["To Read", "Reading", "Completed"]
 GENRE_OPTIONS = [
     'Adventure Fiction', 'Alternate History', 'Autobiography', 'Beat Literature',
@@ -193,18 +205,12 @@ def add_book():
 
             user_id = st.session_state.user_id
             user_email = st.session_state.user_email
-            existing_books = db.get_user_books(user_id).values()
-
-            for book in existing_books:
-                if book['title'].strip().lower() == title.strip().lower() and \
-                        book['author'].strip().lower() == author.strip().lower():
-                    st.error(f"This book ('{title}' by {author}) is already in your collection.")
-                    return
+            if db.find_book_by_title_author(user_id, title, author):
+                st.error(f"This book ('{title}' by {author}) is already in your collection.")
+                return
 
-            book_id = db.generate_next_book_id(user_id)
             book_data = {
                 'user_id': user_id,
-                'book_id': book_id,
                 'title': title,
                 'author': author,
                 'genre': genre,
@@ -217,26 +223,134 @@ def add_book():
                 'email': user_email
             }
 
-            db.save_book(book_data)
+            # The put is conditional, so a clashing ID just draws the next one.
+            for _ in range(3):
+                book_data['book_id'] = db.generate_next_book_id(user_id)
+                if db.save_book(book_data):
+                    break
+            else:
+                st.error("Could not save the book. Please try again.")
+                return
+
             st.success(f"Book '{title}' added")
 
-            user_info = db.get_user(user_email)
-            recommend = user_info.get('recommendation', [])
+            also_read = collab_filter.similar_books([book_data], limit=5)
+            if also_read:
+                with st.expander("Readers who have this book also read", expanded=True):
+                    for rec in also_read:
+                        st.markdown(f"- **{rec['title']}** by *{rec['author']}* ({rec['genre']})")
 
-            if recommend:
-                with st.expander("Recommended for You!", expanded=True):
-                    for rec in recommend:
-                        rec_title = rec.get("title", "Unknown")
-                        rec_author = rec.get("author", "Unknown")
-                        rec_genre = rec.get("genre", "Unknown")
-                        st.markdown(f"- **{rec_title}** by *{rec_author}* ({rec_genre})")
-            else:
-                st.info("No recommendations found yet. Please add more books or wait a few seconds.")
+            # Computed in the background; shown below the form once ready.
+            # With refresh-on-change enabled, the change-feed handler starts it.
+            recommendations = load_page("recommendations")
+            if not recommendations.REFRESH_ON_CHANGE:
+                recommendations.prefetch_recommendations(user_id, user_email)
+            st.session_state['rec_prefetch_user'] = user_id
+            st.session_state.pop('rec_prefetch_future', None)
+
+    show_prefetched_recommendations()
+
+
+def show_prefetched_recommendations():
+    """Shows the recommendations started by the last add, without blocking on them."""
+    user_id = st.session_state.get('rec_prefetch_user')
+    if not user_id or user_id != st.session_state.get('user_id'):
+        return
+    future = st.session_state.get('rec_prefetch_future') or load_page("recommendations").get_prefetch(user_id)
+    if future is None or not future.done():
+        # With refresh-on-change the poller may not have queued it yet.
+        st.info("🎯 Preparing recommendations for your updated library...")
+        if st.button("🔄 Check recommendations"):
+            st.rerun()
+        return
+    # get_prefetch hands a finished prefetch out only once; keep it for reruns.
+    st.session_state['rec_prefetch_future'] = future
+    recommend = None if future.cancelled() or future.exception() else future.result()
+    if recommend:
+        with st.expander("Recommended for You!", expanded=True):
+            for rec in recommend:
+                rec_title = rec.get("title", "Unknown")
+                rec_author = rec.get("author", "Unknown")
+                rec_genre = rec.get("genre", "Unknown")
+                st.markdown(f"- **{rec_title}** by *{rec_author}* ({rec_genre})")
+    else:
+        st.info("No recommendations found yet. Add more books to get suggestions.")
+
+
+def import_books_page():
+    st.subheader("📥 Import Books")
+    st.caption("Upload a CSV (title, author, genre, rating, status, tags...), a Goodreads library export, or JSON lines.")
+    uploaded = st.file_uploader("Library file", type=["csv", "jsonl", "json", "ndjson"])
+    if uploaded is None or not st.button("📥 Import"):
+        return
+
+    importer = load_page("importer")
+    progress_bar = st.progress(0.0, text="Importing...")
+
+    def report(summary):
+        fraction = min(uploaded.tell() / max(uploaded.size, 1), 1.0)
+        progress_bar.progress(fraction, text=f"Imported {summary['imported']} book(s)...")
+
+    try:
+        result = importer.import_file(
+            st.session_state.user_id, st.session_state.user_email, uploaded,
+            name=uploaded.name, progress=report
+        )
+    except Exception as e:
+        st.error(f"Import failed: {e}")
+        return
+    progress_bar.progress(1.0, text="Done")
+    st.success(f"Imported {result['imported']} book(s).")
+    if result['duplicates'] or result['invalid']:
+        st.info(f"Skipped {result['duplicates']} book(s) already in your library "
+                f"and {result['invalid']} row(s) without a title and author.")
+    if result['undated']:
+        st.info(f"{result['undated']} imported book(s) had no readable date and were left undated.")
+
+
+def export_library_page():
+    st.subheader("📤 Export Library")
+    exporter = load_page("exporter")
+    fmt = st.selectbox("Format", list(exporter.FORMATS), format_func=str.upper)
+    fields = st.multiselect("Fields", exporter.EXPORT_FIELDS, default=exporter.EXPORT_FIELDS)
+    use_dates = st.checkbox("Only books added in a date range")
+    start = end = None
+    if use_dates:
+        col1, col2 = st.columns(2)
+        with col1:
+            start = st.date_input("From").isoformat()
+        with col2:
+            end = st.date_input("To").isoformat()
+
+    if st.button("📤 Prepare export"):
+        if not fields:
+            st.warning("Select at least one field.")
+            return
+        # The previous export's temporary file is no longer needed.
+        previous = st.session_state.pop('export_file', None)
+        if previous and os.path.exists(previous['path']):
+            os.remove(previous['path'])
+        with st.spinner("Exporting..."):
+            try:
+                path, count = exporter.export_library(st.session_state.user_id, fmt, fields, start, end)
+            except Exception as e:
+                st.error(f"Export failed: {e}")
+                return
+        st.session_state['export_file'] = {'path': path, 'fmt': fmt, 'count': count}
+
+    export_file = st.session_state.get('export_file')
+    if export_file and os.path.exists(export_file['path']):
+        st.success(f"{export_file['count']} book(s) exported.")
+        with open(export_file['path'], 'rb') as f:
+            st.download_button(
+                "⬇️ Download", f, f"My_Books.{export_file['fmt']}",
+                mime=exporter.FORMATS[export_file['fmt']]
+            )
 
 
 def view_books():
     st.subheader("Your Book Collection")
-    books = list(db.get_user_books(st.session_state.user_id).values())
+    books = db.fetch_all_user_books(st.session_state.user_id)
     if not books:
         st.info("Your book collection is empty. Add a book to get started!")
         return
@@ -273,19 +387,46 @@ def view_books():
 
 def search_books():
     st.subheader("🔍 Search Books by Tag")
-    books = list(db.get_user_books(st.session_state.user_id).values())
-    if not books:
+    user_id = st.session_state.user_id
+    library = db.get_user_books(user_id)
+    if not library:
         st.info("You have no books to search.")
         return
-    tag = st.text_input("🏷️ Enter a tag to search for:").strip()
-    if tag:
-        found_books = [b for b in books if tag.lower() in [t.lower() for t in b.get('tags', [])]]
+    index = tag_index.get_tag_index(user_id)
+
+    query = st.text_input("🏷️ Enter one or more tags (comma separated):").strip()
+    col1, col2 = st.columns(2)
+    with col1:
+        mode = st.radio("Match", ["All tags", "Any tag"], horizontal=True)
+    with col2:
+        prefix = st.checkbox("Match tag prefixes")
+
+    if query:
+        terms = [t.strip() for t in query.split(',') if t.strip()]
+        found_ids = index.query(terms, mode='and' if mode == "All tags" else 'or', prefix=prefix)
+        found_books = [library[book_id] for book_id in found_ids if book_id in library]
         if found_books:
-            st.write(f"Found {len(found_books)} book(s) with the tag '{tag}':")
+            st.write(f"Found {len(found_books)} book(s) with the tag '{query}':")
             for b in found_books:
                 st.markdown(f"- **{b['title']}** by {b['author']}")
         else:
-            st.warning(f"No books found with the tag '{tag}'.")
+            st.warning(f"No books found with the tag '{query}'.")
+            suggestions = index.tags_with_prefix(terms[-1], limit=10) if terms else []
+            if suggestions:
+                st.caption("Did you mean: " + ", ".join(suggestions))
+
+    tag_counts = index.counts()
+    if tag_counts:
+        top_tags = sorted(tag_counts.items(), key=lambda item: (-item[1], item[0]))[:20]
+        st.caption("Your tags: " + " | ".join(f"{tag} ({count})" for tag, count in top_tags))
+
+def full_text_search_page():
+    st.subheader("🔎 Search Your Library")
+    text = st.text_input("Search titles, authors and tags").strip()
+    limit = st.slider("Maximum results", min_value=5, max_value=50, value=10, step=5)
+    if text:
+        display_query_results(db.search_books(st.session_state.user_id, text, limit=limit))
+
 
 # --- NEW: Helper function to display query results ---
 def display_query_results(books):
@@ -363,8 +504,11 @@ def main_app():
         "Dashboard": "📊",
         "View Books": "📚",
         "Add Book": "➕",
+        "Import Books": "📥",
+        "Export Library": "📤",
         "Edit and Delete Books": "✏️",
         "Search by Tag": "🏷️",
+        "Search Library": "🔎",
         "Query Library": "🗂️",
         "Recommendation": "💡",
         "Logout": "🚪"
@@ -387,17 +531,23 @@ def main_app():
 
     # --- UPDATED: Navigation logic ---
     if selection == "Dashboard":
-        dashboard.dashboard_page()
+        load_page("dashboard").dashboard_page()
     elif selection == "Recommendation":
-        recommendations.show_recommendations_page()
+        load_page("recommendations").show_recommendations_page()
     elif selection == "Add Book":
         add_book()
+    elif selection == "Import Books":
+        import_books_page()
+    elif selection == "Export Library":
+        export_library_page()
     elif selection == "Edit and Delete Books":
-        edit_delete.edit_delete_book()
+        load_page("edit_delete").edit_delete_book()
     elif selection == "View Books":
         view_books()
     elif selection == "Search by Tag":
         search_books()
+    elif selection == "Search Library":
+        full_text_search_page()
     elif selection == "Query Library":
         query_page()
     elif selection == "Logout":
@@ -0,0 +1,83 @@
+"""
+Benchmark: time and memory to turn a user's library into the dashboard /
+report frame and its formatted rows, as the old path (object-dtype
+DataFrame, errors='coerce' timestamps, iterrows formatting) versus
+books_to_frame with the vectorized format_ratings / format_dates.
+
+Memory is reported twice: the frame's own footprint
+(memory_usage(deep=True)) and the tracemalloc peak of the whole build.
+    python bench_book_frame.py [--books 100000]
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from book_frame import books_to_frame, format_dates, format_ratings
+
+BOOKS = 100000
+GENRES = ["Fantasy", "Mystery", "Romance", "History", "Science Fiction", "Horror", "Biography"]
+STATUSES = ["Completed", "Reading", "To Read", "DNF"]
+
+
+def make_books(count, rng):
+    return [
+        {
+            'book_id': f"BS_US001_{n:06d}",
+            'title': f"Book {n}",
+            'genre': rng.choice(GENRES),
+            'status': rng.choice(STATUSES),
+            'rating': str(rng.randint(1, 5)) if n % 5 else '',
+            'timestamp': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:{n % 60:02d}:00",
+        }
+        for n in range(count)
+    ]
+
+
+def legacy(items):
+    df = pd.DataFrame(items)
+    df['title'] = df.get('title', 'Untitled')
+    df['genre'] = df.get('genre', 'Unknown')
+    df['rating'] = pd.to_numeric(df.get('rating', 0), errors='coerce').round(1)
+    df['timestamp'] = pd.to_datetime(df.get('timestamp', pd.NaT), errors='coerce')
+    df['status'] = df.get('status', 'unknown').astype(str).str.lower()
+    df = df[['title', 'genre', 'rating', 'status', 'timestamp']].sort_values(by='timestamp').reset_index(drop=True)
+    rows = [
+        (row['title'], f"{row['rating']:.1f}" if pd.notna(row['rating']) else '',
+         row['timestamp'].date().isoformat() if pd.notna(row['timestamp']) else '')
+        for _, row in df.iterrows()
+    ]
+    return df, rows
+
+
+def current(items):
+    df = books_to_frame(items)
+    rows = list(zip(df['title'], format_ratings(df['rating']), format_dates(df['timestamp'])))
+    return df, rows
+
+
+def measure(build, items):
+    """Returns (seconds, frame bytes, tracemalloc peak bytes)."""
+    started = time.perf_counter()
+    df, _ = build(items)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    build(items)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, int(df.memory_usage(deep=True).sum()), peak
+
+
+def main(count):
+    items = make_books(count, random.Random(42))
+    print(f"{count} books")
+    print(f"{'path':<30} {'time':>9} {'frame':>10} {'peak':>10}")
+    for name, build in (('DataFrame + iterrows (before)', legacy), ('books_to_frame (after)', current)):
+        seconds, frame_bytes, peak = measure(build, items)
+        print(f"{name:<30} {seconds * 1000:>7.0f}ms {frame_bytes / 2**20:>8.1f}MB {peak / 2**20:>8.1f}MB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[sys.argv.index('--books') + 1]) if '--books' in sys.argv else BOOKS)
@@ -0,0 +1,109 @@
+"""
+Benchmark: allocating a user ID from the atomic counter versus the full
+UsersTable scan it replaced, at several table sizes.
+
+Runs against moto's in-memory DynamoDB (pip install moto), so absolute
+times are not DynamoDB's; what matters is how each path grows with the
+number of users. The scan's read capacity is estimated the way DynamoDB
+bills it: 0.5 RCU per 4 KB of whole items read, whatever the projection
+(moto does not model consumed capacity).
+    python bench_id_allocation.py [--sizes 10000,100000,1000000] [--allocations 100]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+SIZES = [10000, 100000, 1000000]
+ALLOCATIONS = 100
+
+
+def create_tables(client):
+    for name, key in (('UsersTable', 'email'), ('CountersTable', 'counter_name')):
+        client.create_table(
+            TableName=name,
+            KeySchema=[{'AttributeName': key, 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST',
+        )
+
+
+def item_bytes(item):
+    """DynamoDB's size of a string-only item: attribute names plus values."""
+    return sum(len(name) + len(value) for name, value in item.items())
+
+
+def fill_users(db, start, end):
+    """Writes users start..end-1 and returns their total size in bytes."""
+    total = 0
+    with db.users_table.batch_writer() as batch:
+        for n in range(start, end):
+            item = {
+                'email': f"reader{n}@example.com",
+                'user_id': f"US{n:03d}",
+                'name': f"Reader {n}",
+                'password': 'x' * 64,
+            }
+            total += item_bytes(item)
+            batch.put_item(Item=item)
+    return total
+
+
+def time_scan(db):
+    """One allocation the old way: a full projected scan for the highest ID."""
+    pages = 0
+    scan_kwargs = {'ProjectionExpression': "user_id"}
+    started = time.perf_counter()
+    while True:
+        response = db.users_table.scan(**scan_kwargs)
+        pages += 1
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+    return time.perf_counter() - started, pages
+
+
+def time_counter(db, allocations):
+    """Average time of generate_next_user_id once the counter is seeded."""
+    db.generate_next_user_id()
+    started = time.perf_counter()
+    for _ in range(allocations):
+        db.generate_next_user_id()
+    return (time.perf_counter() - started) / allocations
+
+
+def main(sizes, allocations):
+    import boto3
+    from moto import mock_aws
+
+    with mock_aws():
+        create_tables(boto3.client('dynamodb'))
+        import database as db
+        from counters import CounterAllocator
+
+        print(f"{'users':>10}  {'scan (1 ID)':>12}  {'pages':>6}  {'scan RCU':>9}  {'counter (per ID)':>17}")
+        filled, table_bytes = 0, 0
+        for size in sorted(sizes):
+            table_bytes += fill_users(db, filled + 1, size + 1)
+            filled = size
+            scan_seconds, pages = time_scan(db)
+            capacity = table_bytes / 4096 * 0.5
+            # A fresh counter each round, seeded from the scan like the first deploy.
+            db.counters_table.delete_item(Key={'counter_name': 'user_id'})
+            db.user_id_counter = CounterAllocator(db.counters_table, 'user_id')
+            per_id = time_counter(db, allocations)
+            print(f"{size:>10}  {scan_seconds * 1000:>10.1f}ms  {pages:>6}  {capacity:>9.1f}  "
+                  f"{per_id * 1000:>15.2f}ms")
+
+
+if __name__ == "__main__":
+    sizes = SIZES
+    if '--sizes' in sys.argv:
+        sizes = [int(s) for s in sys.argv[sys.argv.index('--sizes') + 1].split(',')]
+    allocations = int(sys.argv[sys.argv.index('--allocations') + 1]) if '--allocations' in sys.argv else ALLOCATIONS
+    main(sizes, allocations)
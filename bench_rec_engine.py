@@ -0,0 +1,121 @@
+"""
+Benchmark: latency of the in-process rec_engine versus a round trip to the
+recommendation Lambda through rec_client.post_json, for the same history.
+
+With --url (or LAMBDA_FUNCTION_URL) the real service is called. Without
+one, a local HTTP stub that runs rec_engine behind the same JSON contract
+is started, which measures the floor of the round trip: serialisation,
+HTTP and connection reuse, with no network distance or cold starts.
+    python bench_rec_engine.py [--catalog 1000,10000,100000] [--history 200] [--runs 50] [--url https://...]
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rec_client
+import rec_engine
+
+CATALOG_SIZES = [1000, 10000, 100000]
+HISTORY = 200
+RUNS = 50
+GENRES = ["Fantasy", "Mystery", "Romance", "History", "Science Fiction", "Horror", "Biography", "Thriller"]
+TAGS = ["dragons", "quest", "detective", "war", "space", "family", "classic", "series", "short"]
+
+
+def make_catalog(count, rng):
+    return [
+        {
+            'title': f"Catalog Book {n}",
+            'author': f"Author {rng.randrange(count // 10 + 1)}",
+            'genre': rng.choice(GENRES),
+            'tags': ",".join(rng.sample(TAGS, rng.randint(0, 3))),
+        }
+        for n in range(count)
+    ]
+
+
+def make_history(catalog, count, rng):
+    return [
+        {
+            'book_id': f"BS_US001_{n:04d}", 'title': book['title'], 'author': book['author'],
+            'genre': book['genre'], 'rating': rng.choice(['', 1, 2, 3, 4, 5]), 'tags': book['tags'].split(','),
+        }
+        for n, book in enumerate(rng.sample(catalog, min(count, len(catalog))))
+    ]
+
+
+def start_stub(catalog):
+    """Serves rec_engine over HTTP with the Lambda's request/response shape."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out as separate writes; without this, delayed
+        # ACKs add ~40 ms to every response.
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            recommendations, top_genres, top_authors, _ = rec_engine.recommend(body['reading_history'], catalog)
+            payload = json.dumps({'recommendations': recommendations, 'top_genres': top_genres,
+                                  'top_authors': top_authors}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/"
+
+
+def timings(call, runs):
+    """Returns (median, p95) in milliseconds after one warm-up call."""
+    call()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def main(sizes, history_size, runs, url=None):
+    rng = random.Random(42)
+    print(f"history of {history_size} books, {runs} runs each; "
+          + (f"remote service {url}" if url else "local HTTP stub (round-trip floor)"))
+    print(f"{'catalog':>8}  {'load':>8}  {'in-process p50/p95':>20}  {'round trip p50/p95':>20}")
+    for size in sizes:
+        books = make_catalog(size, rng)
+        started = time.perf_counter()
+        catalog = rec_engine.Catalog(books)
+        load = time.perf_counter() - started
+        history = make_history(books, history_size, rng)
+
+        local = timings(lambda: rec_engine.recommend(history, catalog), runs)
+        server, target = (None, url) if url else start_stub(catalog)
+        try:
+            remote = timings(lambda: rec_client.post_json({'reading_history': history}, url=target), runs)
+        finally:
+            if server:
+                server.shutdown()
+        local, remote = (f"{p50:.2f}/{p95:.2f}ms" for p50, p95 in (local, remote))
+        print(f"{size:>8}  {load * 1000:>6.0f}ms  {local:>20}  {remote:>20}")
+
+
+if __name__ == "__main__":
+    sizes = CATALOG_SIZES
+    if '--catalog' in sys.argv:
+        sizes = [int(s) for s in sys.argv[sys.argv.index('--catalog') + 1].split(',')]
+    history = int(sys.argv[sys.argv.index('--history') + 1]) if '--history' in sys.argv else HISTORY
+    runs = int(sys.argv[sys.argv.index('--runs') + 1]) if '--runs' in sys.argv else RUNS
+    url = sys.argv[sys.argv.index('--url') + 1] if '--url' in sys.argv else os.getenv("LAMBDA_FUNCTION_URL")
+    main(sizes, history, runs, url)
@@ -0,0 +1,86 @@
+"""
+Benchmark: build time and query latency of the full-text SearchIndex at
+several library sizes, for exact, multi-term and misspelled queries. For
+the misspellings (one dropped or one swapped letter) it also reports the
+share of queries that still found a book.
+
+Libraries are synthetic: titles, authors and tags drawn from a fixed word
+list, so the vocabulary stays realistic while the book count grows.
+    python bench_search.py [--sizes 1000,10000,100000] [--queries 200]
+"""
+import random
+import sys
+import time
+
+from search_engine import SearchIndex
+
+SIZES = [1000, 10000, 100000]
+QUERIES = 200
+WORDS = (
+    "night shadow river empire garden winter silver storm crown forest "
+    "memory ocean fire glass city dragon secret kingdom stone letter "
+    "daughter war light house road star song island dream mountain "
+    "hunter ghost blood wind iron tide moon summer promise library"
+).split()
+AUTHORS = [f"{first} {last}" for first in ("Anna", "Mark", "Lena", "Omar", "Ruth", "Ivan", "Sara", "Theo")
+           for last in ("Hale", "Moreno", "Okafor", "Lindqvist", "Baker", "Sato", "Novak", "Reyes")]
+TAGS = ["fantasy", "mystery", "romance", "history", "classic", "favourite", "book club", "series"]
+
+
+def make_books(count, rng):
+    return [
+        {
+            'book_id': f"BS_US001_{n:06d}",
+            'title': " ".join(rng.sample(WORDS, rng.randint(2, 5))) + f" {n}",
+            'author': rng.choice(AUTHORS),
+            'tags': rng.sample(TAGS, rng.randint(0, 3)),
+        }
+        for n in range(count)
+    ]
+
+
+def drop_letter(word, rng):
+    i = rng.randrange(len(word))
+    return word[:i] + word[i + 1:]
+
+
+def swap_letters(word, rng):
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def time_queries(index, queries):
+    """Returns (seconds per query, share of queries with at least one hit)."""
+    hits = 0
+    started = time.perf_counter()
+    for query in queries:
+        hits += bool(index.search(query, limit=10))
+    return (time.perf_counter() - started) / len(queries), hits / len(queries)
+
+
+def main(sizes, query_count):
+    rng = random.Random(42)
+    print(f"{'books':>8}  {'build':>9}  {'exact':>9}  {'2 terms':>9}  {'dropped letter':>17}  {'swapped letters':>17}")
+    for size in sizes:
+        books = make_books(size, rng)
+        started = time.perf_counter()
+        index = SearchIndex(books)
+        build = time.perf_counter() - started
+
+        exact = [rng.choice(WORDS) for _ in range(query_count)]
+        pairs = [f"{rng.choice(WORDS)} {rng.choice(AUTHORS).split()[1]}" for _ in range(query_count)]
+        dropped = [drop_letter(rng.choice(WORDS), rng) for _ in range(query_count)]
+        swapped = [swap_letters(rng.choice(WORDS), rng) for _ in range(query_count)]
+        (exact_time, _), (pair_time, _) = time_queries(index, exact), time_queries(index, pairs)
+        typo_columns = [f"{t * 1000:>6.2f}ms {found:>4.0%} hit" for t, found in
+                        (time_queries(index, dropped), time_queries(index, swapped))]
+        print(f"{size:>8}  {build * 1000:>7.0f}ms  {exact_time * 1000:>7.2f}ms  {pair_time * 1000:>7.2f}ms  "
+              + "  ".join(typo_columns))
+
+
+if __name__ == "__main__":
+    sizes = SIZES
+    if '--sizes' in sys.argv:
+        sizes = [int(s) for s in sys.argv[sys.argv.index('--sizes') + 1].split(',')]
+    queries = int(sys.argv[sys.argv.index('--queries') + 1]) if '--queries' in sys.argv else QUERIES
+    main(sizes, queries)
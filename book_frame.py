@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+FRAME_COLUMNS = ['title', 'genre', 'rating', 'status', 'timestamp']
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _rating(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_timestamps(values):
+    """
+    Parses a Series of stored timestamps to naive datetime64. The app's own
+    TIMESTAMP_FORMAT is parsed in one fast pass; anything else (imported
+    ISO strings, bare dates, offsets) is retried with per-value format
+    inference, and only what still fails becomes NaT, with a count logged.
+    """
+    timestamps = pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors='coerce')
+    retry = timestamps.isna() & values.notna() & (values.astype(str).str.strip() != '')
+    if retry.any():
+        # Offsets are converted to UTC so every value ends up naive.
+        reparsed = pd.to_datetime(values[retry].astype(str), format='mixed', errors='coerce', utc=True)
+        timestamps[retry] = reparsed.dt.tz_localize(None)
+        unparsed = int(timestamps[retry].isna().sum())
+        if unparsed:
+            print(f"books_to_frame: {unparsed} timestamp(s) could not be parsed and are left empty.")
+    return timestamps
+
+
+def books_to_frame(items):
+    """
+    Converts DynamoDB book items straight into typed columns: categorical
+    genre and status, float32 rating (1 dp, NaN when unrated) and
+    datetime64 timestamp. Rows are sorted oldest first.
+    """
+    count = len(items)
+    titles = [b.get('title', 'Untitled') for b in items]
+    genres = [b.get('genre', 'Unknown') for b in items]
+    statuses = [str(b.get('status', 'unknown')).lower() for b in items]
+    ratings = np.fromiter((_rating(b.get('rating')) for b in items), dtype=np.float32, count=count)
+    timestamps = parse_timestamps(pd.Series([b.get('timestamp') for b in items], dtype=object))
+
+    df = pd.DataFrame({
+        'title': titles,
+        'genre': pd.Categorical(genres),
+        'rating': np.round(ratings, 1),
+        'status': pd.Categorical(statuses),
+        'timestamp': timestamps.to_numpy(),
+    }, columns=FRAME_COLUMNS)
+    return df.sort_values(by='timestamp', ascending=True, kind='stable').reset_index(drop=True)
+
+
+def format_ratings(ratings):
+    """Formats a rating column as '4.0'-style strings, '' where unrated."""
+    values = ratings.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(values), '', np.char.mod('%.1f', values))
+
+
+def format_dates(timestamps, fmt='%Y-%m-%d'):
+    """Formats a datetime column as strings, '' where missing."""
+    return timestamps.dt.strftime(fmt).fillna('').to_numpy()
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A small thread-safe cache with per-entry expiry and LRU eviction.
+    Streamlit serves every session from a thread of the same process,
+    so a single instance is shared by all of them.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, max_bytes=None, sizeof=len, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Optional memory cap: entries are weighed with `sizeof(value)` and
+        # the least recently used ones are evicted once the total exceeds it.
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # Optional `on_evict(key, value)`, called outside the lock for entries
+        # dropped by expiry or LRU eviction (not for invalidate, clear or an
+        # overwrite by set), so values holding resources can release them.
+        self.on_evict = on_evict
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _weigh(self, value):
+        return self.sizeof(value) if self.max_bytes is not None else 0
+
+    def _pop(self, key):
+        _, value = self._data.pop(key)
+        self._bytes -= self._weigh(value)
+        return value
+
+    def _evict(self):
+        """Drops entries over the limits; returns them as (key, value) pairs."""
+        evicted = []
+        while len(self._data) > self.maxsize or \
+                (self.max_bytes is not None and self._bytes > self.max_bytes and self._data):
+            key = next(iter(self._data))
+            evicted.append((key, self._pop(key)))
+        return evicted
+
+    def _notify(self, evicted):
+        if self.on_evict is not None:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def get(self, key, default=None):
+        evicted = []
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                evicted.append((key, self._pop(key)))
+                value = default
+            else:
+                self._data.move_to_end(key)
+        self._notify(evicted)
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += self._weigh(value)
+            evicted = self._evict()
+        self._notify(evicted)
+
+    def update(self, key, func):
+        """
+        Replaces a live cached value with `func(value)`, keeping its expiry.
+        Returns False on a miss so the next reader reloads from the source.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return False
+            value = func(entry[1])
+            self._bytes += self._weigh(value) - self._weigh(entry[1])
+            self._data[key] = (entry[0], value)
+            evicted = self._evict()
+        self._notify(evicted)
+        return True
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class PerUserIndexes:
+    """
+    Per-user in-memory indexes, built with `factory(user_id)` on a miss and
+    kept current from change-feed events. Indexes provide add_book(book)
+    and remove_book(book_id), and cover active books only.
+    """
+
+    def __init__(self, factory, maxsize=256, ttl=300):
+        self.factory = factory
+        self._indexes = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id):
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = self.factory(user_id)
+            self._indexes.set(user_id, index)
+        return index
+
+    def apply(self, events):
+        """Change-feed handler: applies book writes to the loaded indexes."""
+        for event in events:
+            index = self._indexes.get(event.user_id)
+            if index is None:
+                continue
+            # Archiving takes a book out of the index like a delete.
+            if event.new_book is None or event.new_book.get('archived'):
+                index.remove_book(event.book_id)
+            else:
+                index.add_book(event.new_book)
@@ -0,0 +1,329 @@
+"""
+Change-feed processing for data derived from the BooksTable.
+
+Book writes are turned into DynamoDB Streams-shaped records (eventID,
+eventName, dynamodb.Keys/OldImage/NewImage/SequenceNumber) and fanned out in
+batches to the registered handlers: stats, tag index, search index and
+recommendation refresh. Each handler keeps its own checkpoint, so records
+it has finished are skipped. Delivery is at least once: a batch that fails
+is retried whole, so a handler that applied part of it before raising sees
+that part again. The index handlers are idempotent; the stats aggregate can
+drift and is repaired by `python migrations.py check-stats`.
+
+Writes made by this process are published to an in-memory LocalStream and
+processed by a background poller thread, so a write never waits on the
+handlers. A captured stream or dead-letter file can be replayed offline:
+    python change_feed.py replay records.jsonl [--checkpoints checkpoints.json] [--only HANDLER]
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+import database as db
+
+ChangeEvent = namedtuple(
+    'ChangeEvent', ['event_id', 'event_name', 'user_id', 'book_id', 'old_book', 'new_book', 'sequence']
+)
+
+BATCH_SIZE = int(os.getenv('CHANGE_FEED_BATCH_SIZE', '100'))
+# A batch that fails this many times in a row, and anything past
+# MAX_BACKLOG records behind, is moved to the handler's dead-letter file
+# so one broken handler cannot hold the whole stream in memory.
+MAX_ATTEMPTS = int(os.getenv('CHANGE_FEED_MAX_ATTEMPTS', '5'))
+MAX_BACKLOG = int(os.getenv('CHANGE_FEED_MAX_BACKLOG', '10000'))
+DEAD_LETTER_DIR = os.getenv('CHANGE_FEED_DEAD_LETTER_DIR', 'change_feed_dead_letter')
+# The poller waits this long between polls, so a burst of writes is handled
+# in one pass, and RETRY_DELAY before retrying a handler that failed.
+POLL_INTERVAL = float(os.getenv('CHANGE_FEED_POLL_INTERVAL', '0.5'))
+RETRY_DELAY = float(os.getenv('CHANGE_FEED_RETRY_DELAY', '5'))
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+# --- Records ---
+def _serialize(book):
+    return {k: _serializer.serialize(v) for k, v in book.items()}
+
+
+def _deserialize(image):
+    return {k: _deserializer.deserialize(v) for k, v in image.items()} if image else None
+
+
+def make_record(sequence, user_id, book_id, old_book, new_book):
+    """Builds a DynamoDB Streams-style record for one book write."""
+    if old_book is None:
+        event_name = 'INSERT'
+    elif new_book is None:
+        event_name = 'REMOVE'
+    else:
+        event_name = 'MODIFY'
+    change = {
+        'Keys': _serialize({'user_id': user_id, 'book_id': book_id}),
+        'SequenceNumber': str(sequence),
+    }
+    if old_book is not None:
+        change['OldImage'] = _serialize(old_book)
+    if new_book is not None:
+        change['NewImage'] = _serialize(new_book)
+    return {'eventID': f"local-{sequence}", 'eventName': event_name, 'dynamodb': change}
+
+
+def to_event(record):
+    change = record['dynamodb']
+    keys = _deserialize(change['Keys'])
+    return ChangeEvent(
+        event_id=record['eventID'],
+        event_name=record['eventName'],
+        user_id=keys['user_id'],
+        book_id=keys['book_id'],
+        old_book=_deserialize(change.get('OldImage')),
+        new_book=_deserialize(change.get('NewImage')),
+        sequence=int(change['SequenceNumber']),
+    )
+
+
+# --- Simulated stream ---
+class LocalStream:
+    """An in-memory, single-shard stand-in for a DynamoDB stream."""
+
+    def __init__(self, records=()):
+        self._lock = threading.Lock()
+        self._records = list(records)
+        self._sequence = max((int(r['dynamodb']['SequenceNumber']) for r in self._records), default=0)
+
+    def publish(self, user_id, book_id, old_book, new_book):
+        with self._lock:
+            self._sequence += 1
+            self._records.append(make_record(self._sequence, user_id, book_id, old_book, new_book))
+
+    def read(self, after_sequence=0, limit=None):
+        with self._lock:
+            records = [r for r in self._records if int(r['dynamodb']['SequenceNumber']) > after_sequence]
+        return records[:limit] if limit else records
+
+    def trim(self, up_to_sequence):
+        """Drops records every consumer has already processed."""
+        with self._lock:
+            self._records = [r for r in self._records if int(r['dynamodb']['SequenceNumber']) > up_to_sequence]
+
+    @classmethod
+    def from_jsonl(cls, path):
+        with open(path) as f:
+            return cls(json.loads(line) for line in f if line.strip())
+
+
+# --- Checkpoints ---
+class CheckpointStore:
+    """
+    Last processed sequence number per handler. Kept in memory, and
+    persisted as JSON when a path is given.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._positions = json.load(f)
+
+    def get(self, name):
+        with self._lock:
+            return self._positions.get(name, 0)
+
+    def set(self, name, sequence):
+        with self._lock:
+            self._positions[name] = sequence
+            if self.path:
+                with open(self.path, 'w') as f:
+                    json.dump(self._positions, f)
+
+
+# --- Processor ---
+_handlers = {}
+
+
+def register_handler(name, handler):
+    """Registers `handler(events)`, called with batches of ChangeEvents."""
+    _handlers[name] = handler
+
+
+class ChangeFeedProcessor:
+    def __init__(self, handlers=None, checkpoints=None, batch_size=BATCH_SIZE):
+        self.handlers = handlers if handlers is not None else _handlers
+        self.checkpoints = checkpoints or CheckpointStore()
+        self.batch_size = batch_size
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def process_records(self, records):
+        """
+        Delivers `records` to every handler in batches, skipping records at
+        or before the handler's checkpoint. A handler that fails keeps its
+        checkpoint and stops for this call; the others carry on. After
+        MAX_ATTEMPTS failures the batch is dead-lettered and skipped.
+        """
+        by_sequence = {int(r['dynamodb']['SequenceNumber']): r for r in records}
+        events = sorted((to_event(r) for r in records), key=lambda e: e.sequence)
+        with self._lock:
+            for name, handler in list(self.handlers.items()):
+                position = self.checkpoints.get(name)
+                pending = [e for e in events if e.sequence > position]
+                if len(pending) > MAX_BACKLOG:
+                    overflow, pending = pending[:-MAX_BACKLOG], pending[-MAX_BACKLOG:]
+                    self._dead_letter(name, overflow, by_sequence, "backlog over CHANGE_FEED_MAX_BACKLOG")
+                for start in range(0, len(pending), self.batch_size):
+                    batch = pending[start:start + self.batch_size]
+                    try:
+                        handler(batch)
+                    except Exception as e:
+                        print(f"Change feed handler '{name}' failed at sequence {batch[0].sequence}: {e}")
+                        failures = self._failures.get(name, 0) + 1
+                        self._failures[name] = failures
+                        if failures < MAX_ATTEMPTS:
+                            break
+                        self._dead_letter(name, batch, by_sequence, f"failed {failures} times: {e}")
+                        continue
+                    self._failures.pop(name, None)
+                    self.checkpoints.set(name, batch[-1].sequence)
+
+    def _dead_letter(self, name, events, by_sequence, reason):
+        """
+        Appends the events' records to DEAD_LETTER_DIR/<handler>.jsonl and
+        moves the handler's checkpoint past them. Replay them with
+        `python change_feed.py replay <file> --only <handler>`.
+        """
+        path = os.path.join(DEAD_LETTER_DIR, f"{name}.jsonl")
+        try:
+            os.makedirs(DEAD_LETTER_DIR, exist_ok=True)
+            with open(path, 'a') as f:
+                for event in events:
+                    f.write(json.dumps(by_sequence[event.sequence]) + "\n")
+        except OSError as e:
+            path = f"nowhere ({e})"
+        print(f"Change feed handler '{name}': dead-lettered sequences {events[0].sequence}-"
+              f"{events[-1].sequence} to {path} ({reason}).")
+        self._failures.pop(name, None)
+        self.checkpoints.set(name, events[-1].sequence)
+
+    def low_watermark(self):
+        """The highest sequence number every handler has processed."""
+        return min((self.checkpoints.get(name) for name in self.handlers), default=0)
+
+    def poll(self, stream):
+        """
+        Processes the stream's unprocessed records and trims what every
+        handler has finished. Returns False while a handler is behind.
+        """
+        records = stream.read(after_sequence=self.low_watermark())
+        if not records:
+            return True
+        last = int(records[-1]['dynamodb']['SequenceNumber'])
+        if not self.handlers:
+            # Nobody is listening, so there is nothing to keep the records for.
+            stream.trim(last)
+            return True
+        self.process_records(records)
+        stream.trim(self.low_watermark())
+        return self.low_watermark() >= last
+
+
+class StreamPoller:
+    """
+    Feeds a stream to a processor from a daemon thread. Writers only
+    publish and call notify(); the thread wakes, polls, and then waits
+    `interval` (or `retry_delay` while a handler is failing) before the
+    next poll.
+    """
+
+    def __init__(self, stream, processor, interval=POLL_INTERVAL, retry_delay=RETRY_DELAY):
+        self.stream = stream
+        self.processor = processor
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def notify(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def drain(self):
+        """Processes everything published so far on the calling thread."""
+        return self.processor.poll(self.stream)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                caught_up = self.drain()
+            except Exception as e:
+                print(f"Change feed poll failed: {e}")
+                caught_up = False
+            if caught_up:
+                time.sleep(self.interval)
+            else:
+                time.sleep(self.retry_delay)
+                self._wake.set()
+
+
+def replay(path, checkpoint_path=None, handlers=None):
+    """
+    Replays a JSON-lines file of records (a captured stream or a dead-letter
+    file) through `handlers` (all registered ones by default) and returns
+    the processor.
+    """
+    processor = ChangeFeedProcessor(handlers=handlers, checkpoints=CheckpointStore(checkpoint_path))
+    processor.poll(LocalStream.from_jsonl(path))
+    return processor
+
+
+# --- Background processing of this process's own writes ---
+local_stream = LocalStream()
+processor = ChangeFeedProcessor()
+poller = StreamPoller(local_stream, processor)
+# Short-lived scripts (imports, migrations) exit before the poller wakes.
+atexit.register(poller.drain)
+
+
+def _on_book_changes(changes):
+    for user_id, book_id, old_book, new_book in changes:
+        local_stream.publish(user_id, book_id, old_book, new_book)
+    poller.notify()
+
+
+db.add_book_batch_listener(_on_book_changes)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != 'replay':
+        print("Usage: python change_feed.py replay records.jsonl [--checkpoints checkpoints.json] [--only HANDLER]")
+        sys.exit(1)
+    # Importing the handler modules registers them with the importable
+    # change_feed module, not with this __main__ copy of it.
+    import stats  # noqa: F401
+    import tag_index  # noqa: F401
+    import search_engine  # noqa: F401
+    import recommendations  # noqa: F401
+    import collab_filter  # noqa: F401
+    from change_feed import replay, _handlers
+
+    checkpoint_path = sys.argv[sys.argv.index('--checkpoints') + 1] if '--checkpoints' in sys.argv else None
+    handlers = _handlers
+    if '--only' in sys.argv:
+        only = sys.argv[sys.argv.index('--only') + 1]
+        handlers = {only: _handlers[only]}
+    result = replay(sys.argv[2], checkpoint_path, handlers)
+    print(f"Processed up to sequence {result.low_watermark()}.")
@@ -0,0 +1,78 @@
+import hashlib
+import io
+import json
+import os
+
+from matplotlib.figure import Figure
+
+from cache import TTLCache
+
+# Rendered PNGs keyed by chart kind plus a fingerprint of the plotted series.
+# The key already changes with the data, so entries only age out by LRU.
+_charts = TTLCache(
+    maxsize=512,
+    ttl=float(os.getenv('CHART_CACHE_TTL', '86400')),
+    max_bytes=int(os.getenv('CHART_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+)
+
+
+def _fingerprint(kind, items):
+    payload = json.dumps([kind, [[str(k), float(v)] for k, v in items]])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _render(kind, items, draw):
+    """Returns the PNG for `items`, drawing it with `draw(ax, labels, values)` on a miss."""
+    key = _fingerprint(kind, items)
+    png = _charts.get(key)
+    if png is None:
+        # Figure objects (unlike pyplot) are safe to draw from worker threads.
+        fig = Figure()
+        ax = fig.subplots()
+        draw(ax, [k for k, _ in items], [v for _, v in items])
+        fig.tight_layout()
+        image = io.BytesIO()
+        fig.savefig(image, format='png')
+        png = image.getvalue()
+        _charts.set(key, png)
+    return png
+
+
+def _by_count(counts):
+    """Most common first, ties by label, so equal data always hashes the same."""
+    return sorted(((str(k), int(v)) for k, v in counts.items()), key=lambda item: (-item[1], item[0]))
+
+
+def rating_chart(rating_counts):
+    def draw(ax, labels, values):
+        ax.bar(labels, values, width=0.4, color='skyblue', edgecolor='black')
+        ax.set_xlabel("Rating")
+        ax.set_ylabel("Count")
+    return _render('rating', sorted((float(k), int(v)) for k, v in rating_counts.items()), draw)
+
+
+def genre_pie_chart(genre_counts):
+    def draw(ax, labels, values):
+        ax.pie(values, labels=labels, autopct='%1.1f%%')
+        ax.set_ylabel('')
+    return _render('genre_pie', _by_count(genre_counts), draw)
+
+
+def genre_bar_chart(genre_counts):
+    def draw(ax, labels, values):
+        ax.bar(labels, values, color='lightcoral', edgecolor='black')
+        ax.tick_params(axis='x', labelrotation=90)
+        ax.set_xlabel("Genre")
+        ax.set_ylabel("Count")
+        ax.set_title("Books per Genre")
+    return _render('genre_bar', _by_count(genre_counts), draw)
+
+
+def monthly_chart(monthly_counts):
+    def draw(ax, labels, values):
+        ax.bar(labels, values, color='orange', edgecolor='black')
+        ax.tick_params(axis='x', labelrotation=90)
+        ax.set_xlabel("Month")
+        ax.set_ylabel("Books Read")
+        ax.set_title("Books Read Per Month")
+    return _render('monthly', sorted((str(k), int(v)) for k, v in monthly_counts.items()), draw)
@@ -0,0 +1,338 @@
+"""
+Item-item collaborative filtering over every user's library.
+
+The batch job builds a sparse user x book matrix from the BooksTable (books
+are identified across users by their normalized title/author key), keeps
+the book x book co-occurrence matrix, and writes each book's top-k cosine
+neighbours to .npy files that the app memory-maps for millisecond lookups.
+
+    python collab_filter.py build    # full rebuild from a table scan
+    python collab_filter.py update   # fold in users changed since the last run
+
+Book writes queue their user_id for the next `update` through a change-feed
+handler, so the nightly run only re-reads users whose libraries changed.
+NumPy and SciPy are imported on demand to keep the app's startup light.
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+
+import change_feed
+import database as db
+
+CF_INDEX_DIR = os.getenv("CF_INDEX_DIR", "cf_index")
+CF_NEIGHBORS = int(os.getenv("CF_NEIGHBORS", "20"))
+PENDING_FILE = 'pending_users.txt'
+
+
+def _path(name):
+    return os.path.join(CF_INDEX_DIR, name)
+
+
+def _weight(book):
+    """Implicit feedback: rated books by rating/5, unrated ones as 0.5."""
+    try:
+        rating = float(book.get('rating'))
+    except (TypeError, ValueError):
+        rating = 0
+    return rating / 5 if rating > 0 else 0.5
+
+
+class _Vocab:
+    """user_id -> row and title/author key -> column, plus display info per book."""
+
+    def __init__(self, users=None, items=None):
+        self.users = users or {}
+        self.items = items or []
+        self.item_index = {item['key']: i for i, item in enumerate(self.items)}
+
+    def user(self, user_id):
+        return self.users.setdefault(user_id, len(self.users))
+
+    def item(self, book):
+        key = db.title_author_key(book.get('title', ''), book.get('author', ''))
+        if key not in self.item_index:
+            self.item_index[key] = len(self.items)
+            self.items.append({
+                'key': key,
+                'title': book.get('title', ''),
+                'author': book.get('author', ''),
+                'genre': book.get('genre', 'Unknown'),
+            })
+        return self.item_index[key]
+
+    def row(self, books):
+        """Returns {column: weight} for one user's books."""
+        weights = {}
+        for book in books:
+            if book.get('title') and book.get('author'):
+                column = self.item(book)
+                weights[column] = max(weights.get(column, 0), _weight(book))
+        return weights
+
+
+# --- Batch job ---
+def _save_state(matrix, cooccurrence, vocab):
+    from scipy import sparse
+    os.makedirs(CF_INDEX_DIR, exist_ok=True)
+    sparse.save_npz(_path('users_books.npz'), matrix.tocsr())
+    sparse.save_npz(_path('cooccurrence.npz'), cooccurrence.tocsr())
+    with open(_path('users.json.tmp'), 'w') as f:
+        json.dump(vocab.users, f)
+    os.replace(_path('users.json.tmp'), _path('users.json'))
+
+
+def _write_neighbors(cooccurrence, vocab, rows=None):
+    """
+    Recomputes the top-k cosine neighbours of `rows` (all items when None)
+    and atomically replaces the memory-mapped index files.
+    """
+    import numpy as np
+    count = len(vocab.items)
+    cooccurrence = cooccurrence.tocsr()
+    norms = np.sqrt(np.maximum(cooccurrence.diagonal(), 1e-12)).astype(np.float32)
+
+    neighbors = np.full((count, CF_NEIGHBORS), -1, dtype=np.int32)
+    scores = np.zeros((count, CF_NEIGHBORS), dtype=np.float32)
+    if rows is not None and os.path.exists(_path('neighbors.npy')):
+        previous_neighbors = np.load(_path('neighbors.npy'))
+        previous_scores = np.load(_path('scores.npy'))
+        kept = min(len(previous_neighbors), count)
+        width = min(previous_neighbors.shape[1], CF_NEIGHBORS)
+        neighbors[:kept, :width] = previous_neighbors[:kept, :width]
+        scores[:kept, :width] = previous_scores[:kept, :width]
+        # Items added since the last run have no list yet.
+        rows = set(rows) | set(range(kept, count))
+    rows = range(count) if rows is None else sorted(rows)
+
+    for i in rows:
+        start, end = cooccurrence.indptr[i], cooccurrence.indptr[i + 1]
+        columns = cooccurrence.indices[start:end]
+        similarity = cooccurrence.data[start:end] / (norms[i] * norms[columns])
+        similarity[columns == i] = 0
+        top = min(CF_NEIGHBORS, len(columns))
+        neighbors[i] = -1
+        scores[i] = 0
+        if top:
+            best = np.argpartition(-similarity, top - 1)[:top]
+            best = best[np.argsort(-similarity[best], kind='stable')]
+            best = best[similarity[best] > 0]
+            neighbors[i, :len(best)] = columns[best]
+            scores[i, :len(best)] = similarity[best]
+
+    os.makedirs(CF_INDEX_DIR, exist_ok=True)
+    for name, array in (('neighbors', neighbors), ('scores', scores)):
+        with open(_path(f'{name}.npy.tmp'), 'wb') as f:
+            np.save(f, array)
+        os.replace(_path(f'{name}.npy.tmp'), _path(f'{name}.npy'))
+    with open(_path('items.json.tmp'), 'w') as f:
+        json.dump(vocab.items, f)
+    os.replace(_path('items.json.tmp'), _path('items.json'))
+
+
+def build():
+    """Full rebuild from a scan of every user's books."""
+    from scipy import sparse
+    from migrations import scan_all_books
+
+    # Users queued before the scan are covered by it; later ones stay queued.
+    claimed = _claim_pending()
+    vocab = _Vocab()
+    libraries = {}
+    for book in scan_all_books(['user_id', 'title', 'author', 'genre', 'rating']):
+        libraries.setdefault(book['user_id'], []).append(book)
+
+    rows, columns, values = [], [], []
+    for user_id, books in libraries.items():
+        user_row = vocab.user(user_id)
+        for column, weight in vocab.row(books).items():
+            rows.append(user_row)
+            columns.append(column)
+            values.append(weight)
+    matrix = sparse.csr_matrix(
+        (values, (rows, columns)), shape=(len(vocab.users), len(vocab.items)), dtype='float32'
+    )
+    cooccurrence = (matrix.T @ matrix).tocsr()
+    _save_state(matrix, cooccurrence, vocab)
+    _write_neighbors(cooccurrence, vocab)
+    for path in claimed:
+        os.remove(path)
+    return len(vocab.users), len(vocab.items)
+
+
+def _claim_pending():
+    """
+    Moves the pending queue aside under a unique name and returns every
+    claimed queue file, including ones left behind by a run that crashed.
+    """
+    pending = _path(PENDING_FILE)
+    if os.path.exists(pending):
+        os.replace(pending, f"{pending}.{os.getpid()}.{time.time_ns()}.processing")
+    return sorted(glob.glob(f"{pending}.*.processing"))
+
+
+def update():
+    """
+    Re-reads only the users queued since the last run and adjusts the
+    co-occurrence matrix by Xnew^T Xnew - Xold^T Xold over their stacked
+    old and new rows. Neighbour lists are recomputed for the books whose
+    similarities moved.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    if not os.path.exists(_path('users_books.npz')):
+        return build()
+    claimed = _claim_pending()
+    user_ids = set()
+    for path in claimed:
+        with open(path) as f:
+            user_ids.update(line.strip() for line in f if line.strip())
+    if not user_ids:
+        for path in claimed:
+            os.remove(path)
+        return 0, 0
+    user_ids = sorted(user_ids)
+
+    with open(_path('users.json')) as f:
+        users = json.load(f)
+    with open(_path('items.json')) as f:
+        items = json.load(f)
+    vocab = _Vocab(users, items)
+    matrix = sparse.load_npz(_path('users_books.npz'))
+    cooccurrence = sparse.load_npz(_path('cooccurrence.npz'))
+
+    # Read every queued user first, so the vocabulary only grows once.
+    user_rows, new_weights = [], []
+    for user_id in user_ids:
+        new_weights.append(vocab.row(db.iter_user_books(user_id)))
+        user_rows.append(vocab.user(user_id))
+    shape = (len(vocab.users), len(vocab.items))
+    matrix.resize(shape)
+    cooccurrence.resize((shape[1], shape[1]))
+    matrix = matrix.tocsr()
+
+    old_rows = matrix[user_rows]
+    rows, columns, values = [], [], []
+    for i, weights in enumerate(new_weights):
+        rows.extend([i] * len(weights))
+        columns.extend(weights.keys())
+        values.extend(weights.values())
+    new_rows = sparse.csr_matrix((values, (rows, columns)), shape=(len(user_rows), shape[1]), dtype='float32')
+
+    cooccurrence = (cooccurrence.tocsr() + new_rows.T @ new_rows - old_rows.T @ old_rows).tocsr()
+    cooccurrence.eliminate_zeros()
+    # Swap the users' rows: zero the old ones, then add the new ones in place.
+    keep = np.ones(shape[0], dtype='float32')
+    keep[user_rows] = 0
+    placement = sparse.csr_matrix(
+        (np.ones(len(user_rows), dtype='float32'), (user_rows, range(len(user_rows)))),
+        shape=(shape[0], len(user_rows))
+    )
+    matrix = (sparse.diags(keep) @ matrix + placement @ new_rows).tocsr()
+    matrix.eliminate_zeros()
+
+    changed = set(old_rows.indices.tolist()) | set(new_rows.indices.tolist())
+    # Books co-read with a changed book see their cosine denominators move too.
+    affected = set(changed)
+    for i in changed:
+        affected.update(cooccurrence.indices[cooccurrence.indptr[i]:cooccurrence.indptr[i + 1]].tolist())
+
+    _save_state(matrix, cooccurrence, vocab)
+    _write_neighbors(cooccurrence, vocab, rows=affected)
+    for path in claimed:
+        os.remove(path)
+    return len(user_ids), len(affected)
+
+
+def handle_changes(events):
+    """Change-feed handler: queues changed users for the next update run."""
+    user_ids = {event.user_id for event in events}
+    if not user_ids:
+        return
+    os.makedirs(CF_INDEX_DIR, exist_ok=True)
+    with open(_path(PENDING_FILE), 'a') as f:
+        f.writelines(f"{user_id}\n" for user_id in sorted(user_ids))
+
+
+change_feed.register_handler('collab_filter', handle_changes)
+
+
+# --- Serving ---
+_index = None
+_index_lock = threading.Lock()
+
+
+def _load_index():
+    """Memory-maps the neighbour index, reloading it after a job replaces it."""
+    global _index
+    try:
+        version = os.path.getmtime(_path('neighbors.npy'))
+    except OSError:
+        return None
+    with _index_lock:
+        if _index is None or _index['version'] != version:
+            import numpy as np
+            try:
+                with open(_path('items.json')) as f:
+                    items = json.load(f)
+                _index = {
+                    'version': version,
+                    'items': items,
+                    'item_index': {item['key']: i for i, item in enumerate(items)},
+                    'neighbors': np.load(_path('neighbors.npy'), mmap_mode='r'),
+                    'scores': np.load(_path('scores.npy'), mmap_mode='r'),
+                }
+            except (OSError, ValueError) as e:
+                # A missing or truncated file: keep serving the last good
+                # index (if any) until a job writes a complete one.
+                print(f"Could not load the collaborative filtering index: {e}")
+        return _index
+
+
+def similar_books(books, limit=10):
+    """
+    Returns up to `limit` books that readers of `books` also have, as
+    {'title', 'author', 'genre'} dicts, best first. Empty when no index has
+    been built yet.
+    """
+    index = _load_index()
+    if index is None:
+        return []
+    owned = {db.title_author_key(b.get('title', ''), b.get('author', '')) for b in books}
+    totals = {}
+    for book in books:
+        i = index['item_index'].get(db.title_author_key(book.get('title', ''), book.get('author', '')))
+        if i is None or i >= len(index['neighbors']):
+            continue
+        weight = _weight(book)
+        for neighbor, score in zip(index['neighbors'][i], index['scores'][i]):
+            if neighbor < 0:
+                break
+            totals[int(neighbor)] = totals.get(int(neighbor), 0) + weight * float(score)
+    ranked = sorted(totals.items(), key=lambda item: -item[1])
+    results = []
+    for i, _ in ranked:
+        # items.json is replaced last, so a job may be between the two.
+        if i >= len(index['items']):
+            continue
+        item = index['items'][i]
+        if item['key'] in owned:
+            continue
+        results.append({'title': item['title'], 'author': item['author'], 'genre': item['genre']})
+        if len(results) >= limit:
+            break
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ('build', 'update'):
+        print("Usage: python collab_filter.py [build | update]")
+        sys.exit(1)
+    if sys.argv[1] == 'build':
+        print("Built index for {} user(s) and {} book(s).".format(*build()))
+    else:
+        print("Updated {} user(s); recomputed {} neighbour list(s).".format(*update()))
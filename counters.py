@@ -0,0 +1,61 @@
+import threading
+
+
+class CounterNotSeededError(Exception):
+    """Raised when a counter item has not been created yet."""
+
+
+class CounterAllocator:
+    """
+    Hands out increasing integers from an atomic counter item
+    ({'counter_name': name, 'counter_value': N}) in a DynamoDB table.
+
+    Each round trip is a single `UpdateItem ADD`, so concurrent processes
+    never receive the same value. With `block_size` > 1 a process reserves
+    a whole block at once and serves the rest of it from memory; values
+    left unused when the process exits are simply skipped.
+    """
+
+    def __init__(self, table, name, block_size=1):
+        self.table = table
+        self.name = name
+        self.block_size = max(1, int(block_size))
+        self._lock = threading.Lock()
+        self._next = 1
+        self._ceiling = 0
+
+    def next_value(self):
+        with self._lock:
+            if self._next > self._ceiling:
+                self._next, self._ceiling = self.reserve(self.block_size)
+            value = self._next
+            self._next += 1
+            return value
+
+    def reserve(self, count):
+        """Atomically reserves `count` values and returns (first, last)."""
+        try:
+            response = self.table.update_item(
+                Key={'counter_name': self.name},
+                UpdateExpression="ADD counter_value :n",
+                ConditionExpression="attribute_exists(counter_value)",
+                ExpressionAttributeValues={':n': count},
+                ReturnValues='UPDATED_NEW'
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise CounterNotSeededError(self.name)
+        last = int(response['Attributes']['counter_value'])
+        return last - count + 1, last
+
+    def seed(self, current_value):
+        """
+        Creates the counter at `current_value` unless it already exists, so
+        the next allocated value is `current_value + 1`. Safe to race.
+        """
+        try:
+            self.table.put_item(
+                Item={'counter_name': self.name, 'counter_value': int(current_value)},
+                ConditionExpression="attribute_not_exists(counter_name)"
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
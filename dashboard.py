@@ -1,86 +1,17 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import boto3
-from boto3.dynamodb.conditions import Key
-
-DYNAMODB_TABLE_NAME = 'BooksTable'
-REGION = 'ap-south-1'
+import database as db
+import book_frame
+import stats
+import reports
+import charts
 
 def get_user_books(user_id):
-    dynamodb = boto3.resource('dynamodb', region_name=REGION)
-    table = dynamodb.Table(DYNAMODB_TABLE_NAME)
     try:
-        response = table.query(
-            KeyConditionExpression=Key('user_id').eq(user_id)
-        )
-        return response.get('Items', [])
+        return db.fetch_all_user_books(user_id)
     except Exception as e:
         print("Error fetching books:", e)
         return []
 
-def generate_pdf(df, user_id):
-    import io
-    import matplotlib.pyplot as plt
-    from reportlab.lib.pagesizes import A4
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Image as RLImage, Spacer
-    from reportlab.lib import colors
-
-    buffer = io.BytesIO()
-
-    # Rating chart
-    fig1, ax1 = plt.subplots()
-    df['rating'].hist(bins=5, ax=ax1, color='skyblue', edgecolor='black')
-    ax1.set_xlabel("Rating")
-    ax1.set_ylabel("Count")
-    img_rating = io.BytesIO()
-    fig1.savefig(img_rating, format='png')
-    plt.close(fig1)
-    img_rating.seek(0)
-
-    # Genre chart
-    fig2, ax2 = plt.subplots()
-    df['genre'].value_counts().plot(kind='bar', ax=ax2, color='lightgreen', edgecolor='black')
-    ax2.set_ylabel("Count")
-    img_genre = io.BytesIO()
-    fig2.savefig(img_genre, format='png')
-    plt.close(fig2)
-    img_genre.seek(0)
-
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
-
-    table_data = [['Title', 'Genre', 'Rating', 'Date']]
-    for _, row in df.iterrows():
-        table_data.append([
-            row['title'],
-            row['genre'],
-            f"{row['rating']:.1f}" if pd.notna(row['rating']) else '',
-            row['timestamp'].date().isoformat() if pd.notna(row['timestamp']) else ''
-        ])
-
-    data_table = Table(table_data, repeatRows=1)
-    data_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-    ]))
-
-    elements.append(data_table)
-    elements.append(Spacer(1, 12))
-    elements.append(RLImage(img_rating, width=400, height=200))
-    elements.append(Spacer(1, 12))
-    elements.append(RLImage(img_genre, width=400, height=200))
-
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
-
 def dashboard_page():
     if "user_id" not in st.session_state:
         st.error("Unauthorized access. Please log in.")
@@ -89,10 +20,9 @@ def dashboard_page():
     user_id = st.session_state["user_id"]
     st.title(f"📊 Here's your Dashboard")
 
-    books = get_user_books(user_id)
-    items = get_user_books(user_id)
+    user_stats = stats.get_user_stats(user_id)
 
-    if not books:
+    if not user_stats.total_books:
         st.markdown("""
             <div style='
                 background-color: #1e1e1e;
@@ -114,14 +44,8 @@ def dashboard_page():
             st.rerun()
         return
 
-    df = pd.DataFrame(items)
-    df['title'] = df.get('title', 'Untitled')
-    df['genre'] = df.get('genre', 'Unknown')
-    df['rating'] = pd.to_numeric(df.get('rating', 0), errors='coerce').round(1)
-    df['timestamp'] = pd.to_datetime(df.get('timestamp', pd.NaT), errors='coerce')
-    df['status'] = df.get('status', 'unknown').astype(str).str.lower()
-    df = df[['title', 'genre', 'rating', 'status', 'timestamp']].sort_values(by='timestamp', ascending=True)
-    df = df.reset_index(drop=True)
+    items = get_user_books(user_id)
+    df = book_frame.books_to_frame(items)
 
     st.markdown("""
     <style>
@@ -153,18 +77,29 @@ def dashboard_page():
         csv_data = df.to_csv(index=False).encode('utf-8')
         st.download_button("📥 Your Books", csv_data, f'My_Books.csv', mime='text/csv', use_container_width=True)
     with col_dl2:
-        pdf_bytes = generate_pdf(df, user_id)
-        st.download_button("📄 Report", pdf_bytes, f'My_report.pdf', mime="application/pdf", use_container_width=True)
+        # Rendered in the background and reused until the library changes.
+        job = reports.request_report(user_id, df)
+        st.session_state["report_job"] = job
+        pdf = job.read() if job.done() and job.error() is None else None
+        if pdf is not None:
+            st.download_button("📄 Report", pdf, f'My_report.pdf', mime="application/pdf", use_container_width=True)
+        elif job.done() and job.error() is not None:
+            st.error(f"Could not build your report: {job.error()}")
+        else:
+            st.progress(job.progress, text="📄 Preparing your report...")
+            if st.button("🔄 Check report", use_container_width=True):
+                st.rerun()
 
     st.markdown("<br>", unsafe_allow_html=True)
 
-    total_books = len(df)
-    completed_books = df[df['status'].isin(['completed', 'done', 'read']) & (df['rating'] > 0)].shape[0]
-    progress_pct = (completed_books / total_books * 100) if total_books > 0 else 0
-    avg_rating = df[df['rating'] > 0]['rating'].mean()
+    # Headline figures and charts come from the precomputed stats aggregate.
+    total_books = user_stats.total_books
+    completed_books = user_stats.completed_books
+    progress_pct = user_stats.progress_pct
+    avg_rating = user_stats.avg_rating
     latest_book = df[df['timestamp'].notnull()].sort_values('timestamp', ascending=False).iloc[0] if df['timestamp'].notnull().any() else None
-    monthly_counts = df.dropna(subset=['timestamp']).groupby(df['timestamp'].dt.to_period("M")).size() if df['timestamp'].notnull().any() else None
-    avg_per_month = monthly_counts.mean() if monthly_counts is not None else None
+    monthly_counts = user_stats.monthly_counts or None
+    avg_per_month = user_stats.avg_per_month
 
     card_style = """
 <style>
@@ -206,7 +141,7 @@ def dashboard_page():
             <h4>⭐ Average Rating</h4>
             <p>{avg_rating:.2f} / 5</p> 
         </div>
-        """ if pd.notna(avg_rating) else """
+        """ if avg_rating is not None else """
         <div class='card'>
             <h4>⭐ Average Rating</h4>
             <p>–</p>
@@ -259,17 +194,10 @@ def dashboard_page():
         st.success("✅ All books completed!")
 
     st.subheader("📈 Rating Distribution")
-    fig1, ax1 = plt.subplots()
-    df['rating'].hist(bins=10, ax=ax1, color='skyblue', edgecolor='black')
-    ax1.set_xlabel("Rating")
-    ax1.set_ylabel("Count")
-    st.pyplot(fig1)
+    st.image(charts.rating_chart(user_stats.rating_counts))
 
     st.subheader("🥧 Favorite genres")
-    fig2, ax2 = plt.subplots()
-    df['genre'].value_counts().plot.pie(autopct='%1.1f%%', ax=ax2)
-    ax2.set_ylabel('')
-    st.pyplot(fig2)
+    st.image(charts.genre_pie_chart(user_stats.genre_counts))
 
     st.subheader("🏆 Top-Rated Books")
     top_rated = df[df['rating'] > 0].sort_values(by='rating', ascending=False).head(5)
@@ -281,21 +209,10 @@ def dashboard_page():
         st.info("No rated books to show.")
 
     st.subheader("📚 Books Read Per Genre")
-    genre_counts = df['genre'].value_counts()
-    fig4, ax4 = plt.subplots()
-    genre_counts.plot(kind='bar', ax=ax4, color='lightcoral', edgecolor='black')
-    ax4.set_xlabel("Genre")
-    ax4.set_ylabel("Count")
-    ax4.set_title("Books per Genre")
-    st.pyplot(fig4)
+    st.image(charts.genre_bar_chart(user_stats.genre_counts))
 
     if monthly_counts is not None:
         st.subheader("📆 Books Read Per Month")
-        fig3, ax3 = plt.subplots()
-        monthly_counts.plot(kind='bar', ax=ax3, color='orange', edgecolor='black')
-        ax3.set_xlabel("Month")
-        ax3.set_ylabel("Books Read")
-        ax3.set_title("Books Read Per Month")
-        st.pyplot(fig3)
+        st.image(charts.monthly_chart(user_stats.monthly_counts))
     else:
         st.info("Not enough data to calculate monthly reading trends.")
@@ -1,22 +1,35 @@
-from boto3.dynamodb.conditions import Key, Attr
-from dotenv import load_dotenv
-import boto3
+from boto3.dynamodb.conditions import Attr, Key
 import uuid
+from datetime import datetime
 import os
 from boto3.dynamodb.types import TypeDeserializer
+from decimal import Decimal, InvalidOperation
+import operator
+from cache import TTLCache
+from counters import CounterAllocator, CounterNotSeededError
+import dynamo_client
 
 
 # --- DynamoDB Connection ---
-load_dotenv()
-dynamodb = boto3.resource(
-    'dynamodb',
-    region_name=os.getenv('AWS_REGION', 'ap-south-1'),
-    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+books_table = dynamo_client.get_table('BooksTable')
+users_table = dynamo_client.get_table('UsersTable')
+counters_table = dynamo_client.get_table(os.getenv('COUNTERS_TABLE', 'CountersTable'))
+
+# Atomic ID sequences. A block size above 1 lets each process hand out
+# several IDs per DynamoDB round trip, at the cost of gaps on restart.
+user_id_counter = CounterAllocator(
+    counters_table, 'user_id', block_size=int(os.getenv('USER_ID_BLOCK_SIZE', '1'))
 )
 
-books_table = dynamodb.Table('BooksTable')
-users_table = dynamodb.Table('UsersTable')
+# Upper bound on how many books a single page load will materialize.
+MAX_LIBRARY_BOOKS = int(os.getenv('MAX_LIBRARY_BOOKS', '50000'))
+
+# Per-user libraries ({book_id: book}) shared by every page of a session.
+# Cached dicts are never mutated; writes swap in an updated copy.
+library_cache = TTLCache(
+    maxsize=int(os.getenv('LIBRARY_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('LIBRARY_CACHE_TTL', '300'))
+)
 
 
 # --- User Management Functions ---
@@ -30,6 +43,24 @@ def save_user(user_id, name, email, password):
     })
 
 
+def save_user_recommendations(email, recommendations):
+    """Stores the latest recommendation list on the user's record."""
+    users_table.update_item(
+        Key={'email': email},
+        UpdateExpression="SET recommendation = :r",
+        ExpressionAttributeValues={':r': recommendations}
+    )
+
+
+def save_recommendation_cache(email, entry):
+    """Persists a recommendation cache entry on the user's record."""
+    users_table.update_item(
+        Key={'email': email},
+        UpdateExpression="SET recommendation_cache = :c",
+        ExpressionAttributeValues={':c': entry}
+    )
+
+
 def load_user(email):
     """Loads a user's data from the UsersTable using their email."""
     response = users_table.get_item(Key={'email': email})
@@ -39,30 +70,31 @@ def load_user(email):
 def generate_next_book_id(user_id):
     """
     Generates a new book ID like BS_US001_001, BS_US001_002, etc.
-    The sequence is specific to each user.
+    The sequence is specific to each user and is kept in an atomic counter,
+    seeded on first use from the user's existing book IDs.
     """
-    user_books = get_user_books(user_id).values()
+    counter = CounterAllocator(counters_table, f"book_id#{user_id}")
+    try:
+        next_id_num = counter.next_value()
+    except CounterNotSeededError:
+        counter.seed(_max_book_number(user_id))
+        next_id_num = counter.next_value()
 
-    if not user_books:
-        # This is the user's first book
-        return f"BS_{user_id}_001"
+    # Format the new book ID with zero-padding
+    return f"BS_{user_id}_{next_id_num:03d}"
 
-    # Extract the numeric part of the book IDs
-    ids = []
-    for book in user_books:
+
+def _max_book_number(user_id):
+    """Returns the highest numeric suffix among the user's book IDs (0 if none)."""
+    highest = 0
+    for book in iter_user_books(user_id, projection=['book_id']):
         try:
             # Assumes format BS_USERID_XXX
-            numeric_part = int(book['book_id'].split('_')[-1])
-            ids.append(numeric_part)
+            highest = max(highest, int(book['book_id'].split('_')[-1]))
         except (ValueError, IndexError):
             # Ignore malformed book IDs
             continue
-
-    # Determine the next ID
-    next_id_num = max(ids) + 1 if ids else 1
-
-    # Format the new book ID with zero-padding
-    return f"BS_{user_id}_{next_id_num:03d}"
+    return highest
 
 
 # --- Book Management Functions ---
@@ -71,65 +103,600 @@ def generate_book_id():
     return f"BK{uuid.uuid4().hex[:6].upper()}"
 
 
-def save_book(book_data):
-    """Saves or updates a book's data in the BooksTable."""
-    books_table.put_item(Item=book_data)
+def reserve_book_ids(user_id, count):
+    """Allocates `count` consecutive book IDs with one counter update."""
+    counter = CounterAllocator(counters_table, f"book_id#{user_id}")
+    try:
+        first, last = counter.reserve(count)
+    except CounterNotSeededError:
+        counter.seed(_max_book_number(user_id))
+        first, last = counter.reserve(count)
+    return [f"BS_{user_id}_{n:03d}" for n in range(first, last + 1)]
+
+
+def save_books(books):
+    """
+    Writes new books in 25-item batches; boto3's batch writer resends any
+    unprocessed items. The books must have freshly reserved IDs, since batch
+    puts cannot be conditional. Cached libraries of the affected users are
+    dropped rather than patched one book at a time.
+    """
+    with books_table.batch_writer() as batch:
+        for book in books:
+            _add_derived_keys(book)
+            batch.put_item(Item=book)
+    for user_id in {book['user_id'] for book in books}:
+        invalidate_user_books(user_id)
+    _notify_book_changes([(book['user_id'], book['book_id'], None, book) for book in books])
+
+
+def save_book(book_data, overwrite=False):
+    """
+    Saves a book's data in the BooksTable. Unless `overwrite` is set, the
+    write is conditional on the book_id being unused, and False is returned
+    instead of replacing an existing book.
+    """
+    _add_derived_keys(book_data)
+    put_kwargs = {'Item': book_data, 'ReturnValues': 'ALL_OLD'}
+    if not overwrite:
+        put_kwargs['ConditionExpression'] = "attribute_not_exists(book_id)"
+    try:
+        response = books_table.put_item(**put_kwargs)
+    except books_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    _cache_put_book(book_data, response.get('Attributes'))
+    return True
+
+
+def title_author_key(title, author):
+    """
+    Normalized duplicate-detection key: case-folded title and author with
+    whitespace collapsed, e.g. 'the hobbit#j.r.r. tolkien'.
+    """
+    def normalize(value):
+        return " ".join(str(value).split()).casefold()
+    return f"{normalize(title)}#{normalize(author)}"
+
+
+def rating_key(rating):
+    """
+    Numeric sort key for the UserRatingIndex, or None for unrated books.
+    Unrated books store rating as "", which a number-typed index key would
+    reject, so the index is fed from this separate attribute instead.
+    """
+    if rating in (None, ''):
+        return None
+    try:
+        key = Decimal(str(rating))
+    except InvalidOperation:
+        return None
+    # NaN and Infinity parse but are not valid DynamoDB numbers.
+    return key if key.is_finite() else None
+
+
+def index_keys(book):
+    """Returns the derived attributes that back the secondary indexes."""
+    keys = {}
+    if book.get('title') and book.get('author'):
+        keys['title_author_key'] = title_author_key(book['title'], book['author'])
+    rating = rating_key(book.get('rating'))
+    if rating is not None:
+        keys['rating_key'] = rating
+    # User-partitioned keys, so genre/status lookups only touch one user's books.
+    if book.get('user_id'):
+        if book.get('genre'):
+            keys['user_genre'] = f"{book['user_id']}#{book['genre']}"
+        if book.get('status'):
+            keys['user_status'] = f"{book['user_id']}#{book['status']}"
+    return keys
+
+
+def archive_keys(user_id, archived):
+    """
+    Returns (set_fields, remove_fields) for the sparse archive indexes: only
+    active books carry active_user_id (UserActiveIndex) and only archived
+    ones carry archived_user_id (UserArchiveIndex, sorted by archived_date).
+    """
+    if archived:
+        return {'archived_user_id': user_id}, ['active_user_id']
+    return {'active_user_id': user_id}, ['archived_user_id']
+
+
+def _add_derived_keys(book):
+    """Sets every derived index attribute on a full book item before a put."""
+    book.update(index_keys(book))
+    set_fields, remove_fields = archive_keys(book['user_id'], book.get('archived'))
+    book.update(set_fields)
+    for name in remove_fields:
+        book.pop(name, None)
+
+
+def find_book_by_title_author(user_id, title, author):
+    """
+    Returns the user's book with this title and author, or None. Archived
+    books count, as they do for the importer's duplicate check.
+    Uses a point lookup on the TitleAuthorIndex GSI (partition key user_id,
+    sort key title_author_key) and falls back to reading the user's books
+    when the index is not available.
+    """
+    key = title_author_key(title, author)
+    try:
+        response = books_table.query(
+            IndexName='TitleAuthorIndex',
+            KeyConditionExpression=Key('user_id').eq(user_id) & Key('title_author_key').eq(key),
+            Limit=1
+        )
+        items = response.get('Items', [])
+        return items[0] if items else None
+    except Exception as e:
+        print(f"Error querying TitleAuthorIndex: {e}. Falling back to the full library.")
+
+    for book in iter_user_books(user_id):
+        if title_author_key(book.get('title', ''), book.get('author', '')) == key:
+            return book
+    return None
+
+
+def _update_kwargs(user_id, book_id, set_fields=None, remove_fields=None):
+    """
+    Builds the update_item arguments for a book, keeping the index
+    attributes in step with the fields they are derived from. Returns
+    (update_kwargs, set_fields, remove_fields) with the derived keys added.
+    """
+    set_fields = dict(set_fields or {})
+    remove_fields = list(remove_fields or [])
+    set_fields.update(index_keys({'user_id': user_id, **set_fields}))
+    rating_cleared = ('rating' in set_fields and 'rating_key' not in set_fields) or 'rating' in remove_fields
+    if rating_cleared and 'rating_key' not in remove_fields:
+        remove_fields.append('rating_key')
+    # Archiving moves the book from the active index to the archive index.
+    if 'archived' in set_fields or 'archived' in remove_fields:
+        archived = bool(set_fields.get('archived')) and 'archived' not in remove_fields
+        if archived:
+            set_fields.setdefault('archived_date', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        extra_set, extra_remove = archive_keys(user_id, archived)
+        set_fields.update(extra_set)
+        remove_fields.extend(name for name in extra_remove if name not in remove_fields)
+
+    names, values, clauses = {}, {}, []
+    if set_fields:
+        assignments = []
+        for i, (name, value) in enumerate(set_fields.items()):
+            names[f"#s{i}"] = name
+            values[f":s{i}"] = value
+            assignments.append(f"#s{i} = :s{i}")
+        clauses.append("SET " + ", ".join(assignments))
+    if remove_fields:
+        removals = []
+        for i, name in enumerate(remove_fields):
+            names[f"#r{i}"] = name
+            removals.append(f"#r{i}")
+        clauses.append("REMOVE " + ", ".join(removals))
+    if not clauses:
+        raise ValueError("update_book needs at least one field to set or remove.")
+
+    update_kwargs = {
+        'Key': {'user_id': user_id, 'book_id': book_id},
+        'UpdateExpression': " ".join(clauses),
+        'ExpressionAttributeNames': names,
+    }
+    if values:
+        update_kwargs['ExpressionAttributeValues'] = values
+    return update_kwargs, set_fields, remove_fields
+
+
+def _updated_book(user_id, book_id, old_book, set_fields, remove_fields):
+    book = {'user_id': user_id, 'book_id': book_id, **(old_book or {}), **set_fields}
+    for name in remove_fields:
+        book.pop(name, None)
+    return book
+
+
+def update_book(user_id, book_id, set_fields=None, remove_fields=None):
+    """
+    Updates individual attributes of a book and returns the stored item.
+    `set_fields` maps attribute names to new values; `remove_fields`
+    lists attributes to drop.
+    """
+    update_kwargs, set_fields, remove_fields = _update_kwargs(user_id, book_id, set_fields, remove_fields)
+    response = books_table.update_item(ReturnValues='ALL_OLD', **update_kwargs)
+    # The new item is rebuilt from the old one so listeners can see both.
+    old_book = response.get('Attributes') or None
+    book = _updated_book(user_id, book_id, old_book, set_fields, remove_fields)
+    _cache_put_book(book, old_book)
+    return book
+
+
+# --- Bulk Writes ---
+BULK_CHUNK_SIZE = 25
+
+
+def _get_books(user_id, book_ids):
+    """
+    Reads the current items for up to 100 of the user's book_ids with one
+    BatchGetItem (unprocessed keys are resent) and returns {book_id: item}.
+    Ids that do not exist are simply absent.
+    """
+    client = books_table.meta.client
+    request = {books_table.name: {'Keys': [{'user_id': user_id, 'book_id': b} for b in book_ids]}}
+    books = {}
+    while request:
+        response = client.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(books_table.name, []):
+            books[item['book_id']] = item
+        request = response.get('UnprocessedKeys')
+    return books
+
+
+def _merge_changes(changes):
+    """
+    Folds repeated book_ids into one change each, later changes winning,
+    since a transaction may not touch the same item twice.
+    """
+    merged = {}
+    for book_id, set_fields, remove_fields in changes:
+        fields, removals = merged.setdefault(book_id, ({}, []))
+        for name in remove_fields or []:
+            fields.pop(name, None)
+            if name not in removals:
+                removals.append(name)
+        for name, value in (set_fields or {}).items():
+            fields[name] = value
+            if name in removals:
+                removals.remove(name)
+    return [(book_id, fields, removals) for book_id, (fields, removals) in merged.items()]
+
+
+def update_books(user_id, changes):
+    """
+    Applies many book updates with one TransactWriteItems call per 25
+    books. `changes` is a list of (book_id, set_fields, remove_fields);
+    repeated book_ids are merged and ids that do not exist are skipped.
+    Each chunk's current items are read first with BatchGetItem, so the
+    cache patch and the listeners get the stored old images. Each chunk is
+    all-or-nothing. Returns the updated books; a failed chunk raises after
+    the earlier ones have been applied.
+    """
+    client = books_table.meta.client
+    changes = _merge_changes(changes)
+    updated = []
+    for start in range(0, len(changes), BULK_CHUNK_SIZE):
+        chunk_changes = changes[start:start + BULK_CHUNK_SIZE]
+        old_books = _get_books(user_id, [book_id for book_id, _, _ in chunk_changes])
+        transact_items, chunk = [], []
+        for book_id, set_fields, remove_fields in chunk_changes:
+            old_book = old_books.get(book_id)
+            if old_book is None:
+                continue
+            update_kwargs, set_fields, remove_fields = _update_kwargs(user_id, book_id, set_fields, remove_fields)
+            # Fails the chunk if the book was deleted since it was read.
+            transact_items.append({'Update': {
+                'TableName': books_table.name,
+                'ConditionExpression': "attribute_exists(book_id)",
+                **update_kwargs,
+            }})
+            chunk.append((old_book, _updated_book(user_id, book_id, old_book, set_fields, remove_fields)))
+        if not transact_items:
+            continue
+        client.transact_write_items(TransactItems=transact_items)
+
+        books = {book['book_id']: book for _, book in chunk}
+        library_cache.update(user_id, lambda library: {
+            **{k: v for k, v in library.items() if k not in books},
+            **{k: v for k, v in books.items() if not v.get('archived')},
+        })
+        _notify_book_changes([(user_id, book['book_id'], old_book, book) for old_book, book in chunk])
+        updated.extend(book for _, book in chunk)
+    return updated
+
+
+def delete_books(user_id, book_ids):
+    """
+    Deletes many books through the batch writer (25 keys per request, with
+    unprocessed keys resent). Each chunk's items are read first, so ids that
+    do not exist are skipped and listeners receive the stored books, archived
+    or not, as one batch per chunk. The cached library is patched rather
+    than re-read. Returns the number of books deleted.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    deleted = 0
+    for start in range(0, len(book_ids), BULK_CHUNK_SIZE):
+        old_books = _get_books(user_id, book_ids[start:start + BULK_CHUNK_SIZE])
+        if not old_books:
+            continue
+        with books_table.batch_writer() as batch:
+            for book_id in old_books:
+                batch.delete_item(Key={'user_id': user_id, 'book_id': book_id})
+        library_cache.update(user_id, lambda library: {
+            k: v for k, v in library.items() if k not in old_books
+        })
+        _notify_book_changes([(user_id, book_id, book, None) for book_id, book in old_books.items()])
+        deleted += len(old_books)
+    return deleted
+
+
+def to_plain(value):
+    """Converts DynamoDB Decimals (also inside lists and sets) to int/float."""
+    if isinstance(value, Decimal):
+        return float(value) if value % 1 else int(value)
+    if isinstance(value, (set, list, tuple)):
+        return [to_plain(v) for v in value]
+    return value
+
+
+def projection_kwargs(projection):
+    """Builds ProjectionExpression arguments for a list of attribute names."""
+    if not projection:
+        return {}
+    # Attribute names such as 'status' and 'timestamp' are reserved words,
+    # so every projected attribute goes through a placeholder.
+    names = {f"#p{i}": name for i, name in enumerate(projection)}
+    return {
+        'ProjectionExpression': ", ".join(names),
+        'ExpressionAttributeNames': names
+    }
+
+
+def iter_user_books(user_id, projection=None, page_size=None):
+    """
+    Lazily yields a user's books, following LastEvaluatedKey so that
+    libraries larger than one 1 MB query page are returned in full.
+    `projection` is an optional list of attribute names to fetch and
+    `page_size` caps the number of items read per request.
+    """
+    query_kwargs = {'KeyConditionExpression': Key('user_id').eq(user_id)}
+    query_kwargs.update(projection_kwargs(projection))
+    if page_size:
+        query_kwargs['Limit'] = page_size
+
+    while True:
+        response = books_table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def iter_active_books(user_id, projection=None):
+    """
+    Lazily yields the user's books that are not archived, read from the
+    sparse UserActiveIndex so archived books cost no reads. Falls back to
+    filtering the base table when the index is not available.
+    """
+    query_kwargs = {
+        'IndexName': 'UserActiveIndex',
+        'KeyConditionExpression': Key('active_user_id').eq(user_id),
+    }
+    query_kwargs.update(projection_kwargs(projection))
+    try:
+        response = books_table.query(**query_kwargs)
+    except Exception as e:
+        print(f"Error querying UserActiveIndex: {e}. Falling back to the full library.")
+        fallback_projection = projection and list(projection) + ['archived']
+        for book in iter_user_books(user_id, projection=fallback_projection):
+            if not book.get('archived'):
+                if projection and 'archived' not in projection:
+                    book.pop('archived', None)
+                yield book
+        return
+
+    while True:
+        yield from response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+        response = books_table.query(**query_kwargs)
+
+
+def get_archived_books(user_id, limit=20, start_key=None):
+    """
+    Returns one page of the user's archived books, most recently archived
+    first, as (books, next_key); pass next_key back in for the next page.
+    Reads the sparse UserArchiveIndex, falling back to a filtered query.
+    """
+    query_kwargs = {
+        'IndexName': 'UserArchiveIndex',
+        'KeyConditionExpression': Key('archived_user_id').eq(user_id),
+        'ScanIndexForward': False,
+        'Limit': limit,
+    }
+    if start_key:
+        query_kwargs['ExclusiveStartKey'] = start_key
+    try:
+        response = books_table.query(**query_kwargs)
+        return response.get('Items', []), response.get('LastEvaluatedKey')
+    except Exception as e:
+        print(f"Error querying UserArchiveIndex: {e}. Falling back to filtering the full library.")
+
+    query_kwargs = {
+        'KeyConditionExpression': Key('user_id').eq(user_id),
+        'FilterExpression': Attr('archived').eq(True),
+    }
+    if start_key:
+        query_kwargs['ExclusiveStartKey'] = start_key
+    books = []
+    while len(books) < limit:
+        response = books_table.query(**query_kwargs)
+        books.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return books, None
+        query_kwargs['ExclusiveStartKey'] = last_key
+    return books, last_key
+
+
+def fetch_all_user_books(user_id, projection=None, max_items=MAX_LIBRARY_BOOKS):
+    """
+    Returns a list of the user's active (not archived) books, reading at
+    most `max_items` of them. Shared by the pages that need the whole
+    library at once.
+    """
+    library = library_cache.get(user_id)
+    if library is None and not projection and max_items is None:
+        library = _load_library(user_id)
+    if library is not None:
+        books = list(library.values())
+        return books if max_items is None else books[:max_items]
+
+    # Read one book past the bound: if it never comes, this is the whole
+    # library and can be cached like _load_library would.
+    books = []
+    for book in iter_active_books(user_id, projection=projection):
+        if max_items is not None and len(books) >= max_items:
+            return books
+        books.append(book)
+    if not projection and len(books) <= MAX_LIBRARY_BOOKS:
+        library_cache.set(user_id, {b['book_id']: b for b in books})
+    return books
 
 
 def get_user_books(user_id):
-    """Retrieves all books for a given user_id."""
-    response = books_table.query(
-        KeyConditionExpression=Key('user_id').eq(user_id)
-    )
+    """Retrieves the active books for a given user_id."""
     # Return as a dictionary for easy lookup by book_id
-    return {b['book_id']: b for b in response.get('Items', [])}
+    return dict(_load_library(user_id))
+
+
+def search_books(user_id, text, limit=10):
+    """Full-text, typo-tolerant search over a user's titles, authors and tags."""
+    # Imported here because search_engine registers itself on this module.
+    from search_engine import search_user_books
+    return search_user_books(user_id, text, limit=limit)
 
 
 def delete_book(user_id, book_id):
     """Deletes a book from the BooksTable."""
-    books_table.delete_item(Key={'user_id': user_id, 'book_id': book_id})
+    response = books_table.delete_item(
+        Key={'user_id': user_id, 'book_id': book_id},
+        ReturnValues='ALL_OLD'
+    )
+    library_cache.update(user_id, lambda library: {
+        k: v for k, v in library.items() if k != book_id
+    })
+    old_book = response.get('Attributes')
+    if old_book:
+        _notify_book_change(user_id, book_id, old_book, None)
 
 
-def generate_next_user_id():
+# --- Change Listeners ---
+# Callables invoked as listener(user_id, book_id, old_book, new_book) after
+# every book write made through this module. `old_book` is None for a new
+# book and `new_book` is None when the book was deleted.
+_book_listeners = []
+# Callables invoked with a list of such (user_id, book_id, old_book,
+# new_book) tuples; bulk writes deliver all their changes in one call.
+_book_batch_listeners = []
+
+
+def add_book_listener(listener):
+    """Registers a callback for book writes (used by in-process indexes)."""
+    if listener not in _book_listeners:
+        _book_listeners.append(listener)
+
+
+def add_book_batch_listener(listener):
+    """Registers a callback that receives book writes as a list of changes."""
+    if listener not in _book_batch_listeners:
+        _book_batch_listeners.append(listener)
+
+
+def _notify_book_change(user_id, book_id, old_book, new_book):
+    _notify_book_changes([(user_id, book_id, old_book, new_book)])
+
+
+def _notify_book_changes(changes):
+    if not changes:
+        return
+    for listener in _book_batch_listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            print(f"Error in book change listener {listener!r}: {e}")
+    for listener in _book_listeners:
+        for change in changes:
+            try:
+                listener(*change)
+            except Exception as e:
+                print(f"Error in book change listener {listener!r}: {e}")
+
+
+# --- Library Cache Helpers ---
+def _load_library(user_id):
     """
-    Generates a new sequential user ID like US001, US002, etc.
-    Scans the UsersTable to find the highest current ID and increments it.
+    Returns the user's active {book_id: book} library, reading it from
+    DynamoDB on a cache miss. Archived books are left out; they are paged in
+    on demand with get_archived_books. Libraries above MAX_LIBRARY_BOOKS are
+    returned but not cached.
     """
-    try:
-        response = users_table.scan(ProjectionExpression="user_id")
-        users = response.get('Items', [])
+    library = library_cache.get(user_id)
+    if library is not None:
+        return library
+    library = {b['book_id']: b for b in iter_active_books(user_id)}
+    if len(library) <= MAX_LIBRARY_BOOKS:
+        library_cache.set(user_id, library)
+    return library
 
-        if not users:
-            return "US001"
 
-        # Extract the numeric part of the IDs
-        ids = []
-        for user in users:
-            if user.get('user_id', '').startswith("US"):
-                try:
-                    ids.append(int(user['user_id'][2:]))
-                except (ValueError, TypeError):
-                    continue
+def _cache_put_book(book, old_book=None):
+    """Writes a saved book through to its owner's cached library and listeners."""
+    if book.get('archived'):
+        library_cache.update(book['user_id'], lambda library: {
+            k: v for k, v in library.items() if k != book['book_id']
+        })
+    else:
+        library_cache.update(book['user_id'], lambda library: {**library, book['book_id']: book})
+    _notify_book_change(book['user_id'], book['book_id'], old_book, book)
+
 
-        if not ids:
-            return "US001"
+def invalidate_user_books(user_id):
+    """Drops a user's cached library so the next read goes to DynamoDB."""
+    library_cache.invalidate(user_id)
 
-        # Determine the next ID
-        next_id_num = max(ids) + 1
+
+def generate_next_user_id():
+    """
+    Generates a new sequential user ID like US001, US002, etc.
+    Draws the number from an atomic counter in the CountersTable; the first
+    call after deployment seeds the counter from a one-off UsersTable scan.
+    """
+    try:
+        try:
+            next_id_num = user_id_counter.next_value()
+        except CounterNotSeededError:
+            user_id_counter.seed(_max_user_id_from_scan())
+            next_id_num = user_id_counter.next_value()
 
         # Format the new user ID with three-digit zero-padding
         return f"US{next_id_num:03d}"
 
     except Exception as e:
-        # If the scan fails, fallback to a unique ID to prevent crashing
+        # If the counter fails, fallback to a unique ID to prevent crashing
         print(f"ERROR generating sequential user ID: {e}. Falling back to UUID.")
         return f"U_{uuid.uuid4().hex[:8]}"
 
 
+def _max_user_id_from_scan():
+    """Returns the highest numeric USxxx ID in the UsersTable (0 if none)."""
+    highest = 0
+    scan_kwargs = {'ProjectionExpression': "user_id"}
+    while True:
+        response = users_table.scan(**scan_kwargs)
+        for user in response.get('Items', []):
+            if user.get('user_id', '').startswith("US"):
+                try:
+                    highest = max(highest, int(user['user_id'][2:]))
+                except (ValueError, TypeError):
+                    continue
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return highest
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
 deserializer = TypeDeserializer()
 def get_user(email):
-    dynamodb_new = boto3.client('dynamodb', region_name='ap-south-1')
-    response = dynamodb_new.get_item(
+    response = dynamo_client.get_client().get_item(
         TableName='UsersTable',
         Key={'email': {'S': email}}
     )
@@ -147,45 +714,76 @@ def get_user(email):
 
 # --- Rectified Book Query Functions ---
 
+RATING_COMPARISONS = {
+    'eq': operator.eq, 'gte': operator.ge, 'lte': operator.le,
+    'gt': operator.gt, 'lt': operator.lt
+}
+
+
+# The genre, rating and status lookups cover the active library, like the
+# fetch_all_user_books fallback; the indexes also hold archived books.
+NOT_ARCHIVED = Attr('archived').not_exists() | Attr('archived').eq(False)
+
+
+def _query_all(**query_kwargs):
+    """Runs a query and follows LastEvaluatedKey until every page is read."""
+    items = []
+    while True:
+        response = books_table.query(**query_kwargs)
+        items.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return items
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
 def query_books_by_genre(genre, user_id):
     try:
-        response = books_table.query(
-            IndexName='GenreIndex',
-            KeyConditionExpression=Key('genre').eq(genre),
-            FilterExpression=Attr('user_id').eq(user_id)
+        return _query_all(
+            IndexName='UserGenreIndex',
+            KeyConditionExpression=Key('user_genre').eq(f"{user_id}#{genre}"),
+            FilterExpression=NOT_ARCHIVED
         )
-        return response.get('Items', [])
     except Exception as e:
         print(f"Error querying by genre: {e}")
-        print("Please ensure a GSI named 'GenreIndex' with partition key 'genre' exists on the BooksTable.")
-        return []
+        print("Please ensure a GSI named 'UserGenreIndex' with partition key 'user_genre' exists on the BooksTable.")
+    return [b for b in fetch_all_user_books(user_id, max_items=None) if b.get('genre') == genre]
 
 
 def query_books_by_rating(rating, user_id, comparison='gte'):
-    if comparison not in ['eq', 'gte', 'lte', 'gt', 'lt']:
+    if comparison not in RATING_COMPARISONS:
         raise ValueError("Invalid comparison operator. Use 'eq', 'gte', 'lte', 'gt', or 'lt'.")
 
-    filter_expression = Attr('user_id').eq(user_id) & Attr('rating').__getattribute__(comparison)(rating)
+    key_condition = Key('user_id').eq(user_id) & getattr(Key('rating_key'), comparison)(rating)
 
     try:
-        response = books_table.scan(
-            FilterExpression=filter_expression
+        return _query_all(
+            IndexName='UserRatingIndex',
+            KeyConditionExpression=key_condition,
+            FilterExpression=NOT_ARCHIVED
         )
-        return response.get('Items', [])
     except Exception as e:
-        print(f"Error scanning by rating: {e}")
-        return []
+        print(f"Error querying by rating: {e}")
+        print("Please ensure a GSI named 'UserRatingIndex' with partition key 'user_id' "
+              "and numeric sort key 'rating_key' exists on the BooksTable.")
+
+    # Fall back to filtering the user's library in memory.
+    compare = RATING_COMPARISONS[comparison]
+    target = Decimal(str(rating))
+    return [
+        b for b in fetch_all_user_books(user_id, max_items=None)
+        if rating_key(b.get('rating')) is not None and compare(rating_key(b.get('rating')), target)
+    ]
 
 
 def query_books_by_status(status, user_id):
     try:
-        response = books_table.query(
-            IndexName='StatusIndex',
-            KeyConditionExpression=Key('status').eq(status),
-            FilterExpression=Attr('user_id').eq(user_id)
+        return _query_all(
+            IndexName='UserStatusIndex',
+            KeyConditionExpression=Key('user_status').eq(f"{user_id}#{status}"),
+            FilterExpression=NOT_ARCHIVED
         )
-        return response.get('Items', [])
     except Exception as e:
         print(f"Error querying by status: {e}")
-        print("Please ensure a GSI named 'StatusIndex' with partition key 'status' exists on the BooksTable.")
-        return []
+        print("Please ensure a GSI named 'UserStatusIndex' with partition key 'user_status' exists on the BooksTable.")
+    return [b for b in fetch_all_user_books(user_id, max_items=None) if b.get('status') == status]
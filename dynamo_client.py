@@ -0,0 +1,97 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+
+# --- Shared DynamoDB connection settings ---
+load_dotenv()
+AWS_REGION = os.getenv('AWS_REGION', 'ap-south-1')
+MAX_POOL_CONNECTIONS = int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '20'))
+MAX_ATTEMPTS = int(os.getenv('DYNAMODB_MAX_ATTEMPTS', '5'))
+CONNECT_TIMEOUT = float(os.getenv('DYNAMODB_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.getenv('DYNAMODB_READ_TIMEOUT', '10'))
+
+_lock = threading.Lock()
+_session = None
+_client = None
+# boto3 resources (and the Table objects made from them) are not
+# thread-safe, so every thread builds its own; see get_resource.
+_local = threading.local()
+
+
+def _build_config():
+    return Config(
+        region_name=AWS_REGION,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        retries={'max_attempts': MAX_ATTEMPTS, 'mode': 'adaptive'},
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+    )
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+            region_name=AWS_REGION,
+        )
+    return _session
+
+
+def get_resource():
+    """
+    Returns the calling thread's DynamoDB resource, created on first use.
+    The shared session is not thread-safe either, so resources are created
+    from it under the lock.
+    """
+    resource = getattr(_local, 'resource', None)
+    if resource is None:
+        with _lock:
+            resource = _get_session().resource('dynamodb', config=_build_config())
+        _local.resource = resource
+        _local.tables = {}
+    return resource
+
+
+def get_client():
+    """
+    Returns the process-wide low-level client, created on first use.
+    Clients are thread-safe, so every Streamlit session shares its
+    connection pool. It takes and returns typed values ({'S': ...}).
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _get_session().client('dynamodb', config=_build_config())
+    return _client
+
+
+class ThreadLocalTable:
+    """
+    A Table handle that can be shared across threads: every attribute is
+    looked up on a Table built from the calling thread's own resource.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def _table(self):
+        resource = get_resource()
+        table = _local.tables.get(self.name)
+        if table is None:
+            table = _local.tables[self.name] = resource.Table(self.name)
+        return table
+
+    def __getattr__(self, attr):
+        return getattr(self._table(), attr)
+
+
+def get_table(name):
+    """Returns a thread-safe Table handle; see ThreadLocalTable."""
+    return ThreadLocalTable(name)
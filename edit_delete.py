@@ -1,17 +1,8 @@
 import streamlit as st
-import boto3
-from boto3.dynamodb.conditions import Key
 from datetime import datetime
-import os
-from dotenv import load_dotenv
+import database as db
 
 def edit_delete_book():
-    # --- Load AWS credentials ---
-    load_dotenv()
-    aws_access_key = os.getenv("AWS_ACCESS_KEY_ID")
-    aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
-    aws_region = os.getenv("AWS_REGION", "ap-south-1")
-
     # --- Check user login ---
     if "user_id" not in st.session_state:
         st.error("Please login first.")
@@ -19,22 +10,13 @@ def edit_delete_book():
 
     user_id = st.session_state["user_id"]
 
-    # --- Connect to DynamoDB ---
-    dynamodb = boto3.resource(
-        'dynamodb',
-        region_name=aws_region,
-        aws_access_key_id=aws_access_key,
-        aws_secret_access_key=aws_secret_key
-    )
-    table = dynamodb.Table("BooksTable")
-
-    # --- Get all books for user ---
-    response = table.query(KeyConditionExpression=Key('user_id').eq(user_id))
-    items = response.get("Items", [])
+    # --- Get active books for user (served from the library cache) ---
+    items = list(db.get_user_books(user_id).values())
 
     # --- Filter books ---
-    books = [b for b in items if not b.get("archived", False)]
-    archived_books = [b for b in items if b.get("archived", False)]
+    # Copies, since the overdue flag below must not leak into the shared cache.
+    # The cached library holds active books only; archived ones are paged below.
+    books = [dict(b) for b in items if not b.get("archived", False)]
 
     # --- Helper functions ---
     def calculate_progress(pages_read, total_pages):
@@ -58,6 +40,10 @@ def edit_delete_book():
 
     status_options = ["To Read", "Reading", "Completed"]
 
+    # --- Bulk actions ---
+    if books:
+        bulk_actions(user_id, books, status_options)
+
     # --- Display books ---
     if books:
         for book in books:
@@ -110,21 +96,13 @@ def edit_delete_book():
                         st.warning("For 'To Read' status, Pages Read must be 0.")
                     else:
                         try:
-                            table.update_item(
-                                Key={'user_id': user_id, 'book_id': book['book_id']},
-                                UpdateExpression="""
-                                    SET #s = :s, pages_read = :pr, total_pages = :tp,
-                                        due_date = :dd, rating = :rt
-                                """,
-                                ExpressionAttributeNames={'#s': 'status'},
-                                ExpressionAttributeValues={
-                                    ':s': new_status,
-                                    ':pr': pages_read,
-                                    ':tp': total_pages,
-                                    ':dd': str(new_due_date),
-                                    ':rt': new_rating
-                                }
-                            )
+                            db.update_book(user_id, book['book_id'], set_fields={
+                                'status': new_status,
+                                'pages_read': pages_read,
+                                'total_pages': total_pages,
+                                'due_date': str(new_due_date),
+                                'rating': new_rating
+                            })
                             st.success("Book updated successfully!")
                             st.rerun()
                         except Exception as e:
@@ -132,9 +110,7 @@ def edit_delete_book():
 
                 if st.button("🗑️ Delete Book", key=f"del_{book['book_id']}"):
                     try:
-                        table.delete_item(
-                            Key={'user_id': user_id, 'book_id': book['book_id']}
-                        )
+                        db.delete_book(user_id, book['book_id'])
                         st.success("Book deleted successfully!")
                         st.rerun()
                     except Exception as e:
@@ -143,14 +119,10 @@ def edit_delete_book():
                 if new_status == "Completed" and not book.get("archived", False):
                     if st.button("🗃️ Archive Book", key=f"archive_{book['book_id']}"):
                         try:
-                            table.update_item(
-                                Key={'user_id': user_id, 'book_id': book['book_id']},
-                                UpdateExpression="SET archived = :a, archived_date = :d",
-                                ExpressionAttributeValues={
-                                    ':a': True,
-                                    ':d': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                }
-                            )
+                            db.update_book(user_id, book['book_id'], set_fields={
+                                'archived': True,
+                                'archived_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                            })
                             st.success("Book archived successfully!")
                             st.rerun()
                         except Exception as e:
@@ -159,24 +131,102 @@ def edit_delete_book():
         st.info("📭 No active books found.")
 
     # --- Archived Books Section ---
-    if archived_books:
-        st.subheader("🗃️ Archived Books")
-        show_archived = st.checkbox("View Archived Books", value=True)
-
-        if show_archived:
-            for book in archived_books:
-                with st.expander(f"{book['title']} by {book['author']}"):
-                    st.markdown(f"**Pages Read:** {book['pages_read']} / {book['total_pages']}")
-                    st.markdown(f"**📌 Status:** {book['status']}")
-                    st.markdown(f"**⏰ Due Date:** {book.get('due_date', 'N/A')}")
-
-                    if st.button("Unarchive Book", key=f"unarchive_{book['book_id']}"):
-                        try:
-                            table.update_item(
-                                Key={'user_id': user_id, 'book_id': book['book_id']},
-                                UpdateExpression='REMOVE archived'
-                            )
-                            st.success("Book unarchived successfully!")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error unarchiving book: {e}")
+    # Read a page at a time from the archive index, and only when asked for.
+    st.subheader("🗃️ Archived Books")
+    if st.checkbox("View Archived Books", value=False, key="show_archived"):
+        archive_browser(user_id)
+
+def bulk_actions(user_id, books, status_options):
+    """Multi-select actions, written in batches of 25 instead of one call per book."""
+    with st.expander("🧰 Bulk Actions"):
+        completed = [b for b in books if b.get("status") == "Completed"]
+        if completed and st.button(f"🗃️ Archive all completed ({len(completed)})", key="bulk_archive_completed"):
+            archive_books(user_id, completed)
+
+        labels = {b["book_id"]: f"{b.get('title', 'N/A')} by {b.get('author', 'N/A')}" for b in books}
+        selected = st.multiselect("Select books", list(labels), format_func=labels.get, key="bulk_selected")
+        if not selected:
+            return
+        by_id = {b["book_id"]: b for b in books}
+        chosen = [by_id[book_id] for book_id in selected]
+
+        col1, col2 = st.columns(2)
+        with col1:
+            new_status = st.selectbox("📌 New status", status_options, key="bulk_status")
+            if st.button(f"Set status on {len(chosen)} book(s)", key="bulk_status_apply"):
+                changes = []
+                for book in chosen:
+                    fields = {'status': new_status}
+                    # Same page rules as the single-book editor.
+                    if new_status == "Completed":
+                        fields['pages_read'] = int(book.get("total_pages", 0) or 0)
+                    elif new_status == "To Read":
+                        fields['pages_read'] = 0
+                    changes.append((book["book_id"], fields, None))
+                run_bulk(lambda: db.update_books(user_id, changes), f"Updated {len(changes)} book(s).")
+        with col2:
+            archivable = [b for b in chosen if b.get("status") == "Completed"]
+            if archivable and st.button(f"🗃️ Archive {len(archivable)} completed", key="bulk_archive_selected"):
+                archive_books(user_id, archivable)
+            confirm = st.checkbox(f"Yes, delete {len(chosen)} book(s)", key="bulk_delete_confirm")
+            if st.button("🗑️ Delete selected", key="bulk_delete", disabled=not confirm):
+                run_bulk(lambda: db.delete_books(user_id, selected), f"Deleted {len(selected)} book(s).")
+
+
+def archive_books(user_id, books):
+    archived_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    changes = [(b["book_id"], {'archived': True, 'archived_date': archived_date}, None) for b in books]
+    run_bulk(lambda: db.update_books(user_id, changes), f"Archived {len(changes)} book(s).")
+
+
+def run_bulk(action, message):
+    # The library cache is patched by the bulk write, so the rerun does not re-query.
+    try:
+        with st.spinner("Applying changes..."):
+            action()
+    except Exception as e:
+        st.error(f"Bulk action failed: {e}")
+        return
+    st.session_state.pop("bulk_selected", None)
+    st.toast(message)
+    st.rerun()
+
+
+ARCHIVE_PAGE_SIZE = 20
+
+
+def archive_browser(user_id):
+    # Start keys of the pages visited so far, so Previous can step back.
+    cursors = st.session_state.setdefault("archive_cursors", [None])
+    archived_books, next_key = db.get_archived_books(user_id, limit=ARCHIVE_PAGE_SIZE, start_key=cursors[-1])
+
+    if not archived_books and len(cursors) == 1:
+        st.info("📭 No archived books.")
+        return
+
+    for book in archived_books:
+        with st.expander(f"{book['title']} by {book['author']}"):
+            st.markdown(f"**Pages Read:** {book.get('pages_read', 0)} / {book.get('total_pages', 0)}")
+            st.markdown(f"**📌 Status:** {book.get('status', 'N/A')}")
+            st.markdown(f"**⏰ Due Date:** {book.get('due_date', 'N/A')}")
+            st.markdown(f"**🗃️ Archived:** {book.get('archived_date', 'N/A')}")
+
+            if st.button("Unarchive Book", key=f"unarchive_{book['book_id']}"):
+                try:
+                    db.update_book(user_id, book['book_id'], remove_fields=['archived'])
+                    st.success("Book unarchived successfully!")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error unarchiving book: {e}")
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if len(cursors) > 1 and st.button("⬅️ Previous", key="archive_prev"):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        if next_key and st.button("Next ➡️", key="archive_next"):
+            cursors.append(next_key)
+            st.rerun()
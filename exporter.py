@@ -0,0 +1,124 @@
+"""
+Streaming library export to CSV, JSON lines or Parquet.
+
+Books are read page by page from DynamoDB and written straight to a
+temporary file, so the library is never held in memory as a whole.
+    python exporter.py USER_ID csv|jsonl|parquet [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+import csv
+import json
+import os
+import sys
+import tempfile
+
+import database as db
+
+EXPORT_FIELDS = [
+    'book_id', 'title', 'author', 'genre', 'rating', 'status', 'tags',
+    'timestamp', 'total_pages', 'pages_read',
+]
+FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+PARQUET_ROW_GROUP = int(os.getenv('EXPORT_PARQUET_ROW_GROUP', '5000'))
+
+
+def iter_export_books(user_id, fields=None, start=None, end=None):
+    """
+    Yields the user's books reduced to `fields`, optionally limited to
+    timestamps in [start, end] ('YYYY-MM-DD' dates, both inclusive).
+    """
+    fields = list(fields or EXPORT_FIELDS)
+    projection = fields if 'timestamp' in fields or not (start or end) else fields + ['timestamp']
+    # Timestamps are 'YYYY-MM-DD HH:MM:SS', so string comparison orders them.
+    end = f"{end} 23:59:59" if end else None
+    for book in db.iter_user_books(user_id, projection=projection):
+        timestamp = str(book.get('timestamp') or '')
+        if (start and timestamp < start) or (end and timestamp > end):
+            continue
+        yield {field: db.to_plain(book.get(field)) for field in fields}
+
+
+def write_csv(books, fields, output):
+    writer = csv.DictWriter(output, fieldnames=fields)
+    writer.writeheader()
+    count = 0
+    for book in books:
+        if isinstance(book.get('tags'), list):
+            book['tags'] = ", ".join(book['tags'])
+        writer.writerow(book)
+        count += 1
+    return count
+
+
+def write_jsonl(books, fields, output):
+    count = 0
+    for book in books:
+        output.write(json.dumps(book, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def write_parquet(books, fields, path):
+    """Writes one row group per PARQUET_ROW_GROUP books."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'rating': pa.float64(), 'total_pages': pa.int64(), 'pages_read': pa.int64(), 'tags': pa.list_(pa.string())}
+    schema = pa.schema([(field, types.get(field, pa.string())) for field in fields])
+
+    def column(rows, field):
+        values = [row.get(field) for row in rows]
+        if field == 'rating':
+            return [float(v) if isinstance(v, (int, float)) else None for v in values]
+        if field in ('total_pages', 'pages_read'):
+            return [int(v) if isinstance(v, (int, float)) else None for v in values]
+        if field == 'tags':
+            return [[str(t) for t in v] if isinstance(v, list) else None for v in values]
+        return [None if v is None else str(v) for v in values]
+
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        rows = []
+        for book in books:
+            rows.append(book)
+            if len(rows) >= PARQUET_ROW_GROUP:
+                writer.write_table(pa.table({f: column(rows, f) for f in fields}, schema=schema))
+                count += len(rows)
+                rows = []
+        if rows or not count:
+            writer.write_table(pa.table({f: column(rows, f) for f in fields}, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_library(user_id, fmt, fields=None, start=None, end=None):
+    """
+    Writes the export to a new temporary file and returns (path, count).
+    The caller owns the file and removes it when done.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    fields = list(fields or EXPORT_FIELDS)
+    books = iter_export_books(user_id, fields, start, end)
+    handle, path = tempfile.mkstemp(prefix='bookmate_export_', suffix=f'.{fmt}')
+    os.close(handle)
+    try:
+        if fmt == 'parquet':
+            count = write_parquet(books, fields, path)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as output:
+                writer = write_csv if fmt == 'csv' else write_jsonl
+                count = writer(books, fields, output)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[2] not in FORMATS:
+        print("Usage: python exporter.py USER_ID csv|jsonl|parquet [--from YYYY-MM-DD] [--to YYYY-MM-DD]")
+        sys.exit(1)
+    start = sys.argv[sys.argv.index('--from') + 1] if '--from' in sys.argv else None
+    end = sys.argv[sys.argv.index('--to') + 1] if '--to' in sys.argv else None
+    path, count = export_library(sys.argv[1], sys.argv[2], start=start, end=end)
+    print(f"Exported {count} book(s) to {path}")
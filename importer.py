@@ -0,0 +1,216 @@
+"""
+Bulk import of books from CSV, Goodreads library exports and JSON lines.
+
+Rows are parsed as a stream and written in chunks, so memory stays flat no
+matter how long the file is: each chunk reserves its book IDs with one
+counter update and is written through the batch writer.
+    python importer.py USER_ID EMAIL books.csv
+"""
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import database as db
+# Registering these handlers means imports run from the CLI still update the
+# stats aggregate and queue the users for the collaborative-filtering job.
+import stats  # noqa: F401
+import collab_filter  # noqa: F401
+
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '500'))
+FORMATS = ('csv', 'goodreads', 'jsonl')
+
+# Goodreads "Exclusive Shelf" values and their reading status.
+GOODREADS_SHELVES = {'read': 'Completed', 'currently-reading': 'Reading', 'to-read': 'To Read'}
+STATUSES = {'to read': 'To Read', 'reading': 'Reading', 'completed': 'Completed'}
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%Y/%m/%d', '%d/%m/%Y')
+
+
+def detect_format(name, first_line):
+    """Guesses the format from the file name and its first line."""
+    if name.lower().endswith(('.jsonl', '.json', '.ndjson')) or first_line.lstrip().startswith('{'):
+        return 'jsonl'
+    if 'Exclusive Shelf' in first_line or 'My Rating' in first_line:
+        return 'goodreads'
+    return 'csv'
+
+
+def iter_rows(binary_file, fmt):
+    """Yields one dict per input row, decoding the file as it is read."""
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'jsonl':
+            for line in text:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None
+        else:
+            yield from csv.DictReader(text)
+    finally:
+        # Leave the underlying file open for the caller.
+        text.detach()
+
+
+def _first(row, *names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _int(value, default=0):
+    try:
+        return max(int(float(value)), 0)
+    except (TypeError, ValueError):
+        return default
+
+
+def _timestamp(value):
+    """
+    Returns the date in the app's timestamp format, or '' when the row has
+    none or it cannot be read; an import time would pass for a real date.
+    """
+    text = str(value or '').strip()
+    if not text:
+        return ''
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return ''
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _tags(value):
+    if isinstance(value, list):
+        return [str(t).strip() for t in value if str(t).strip()]
+    return [t.strip() for t in str(value or '').split(',') if t.strip()]
+
+
+def to_book(row, fmt):
+    """Maps an input row to the app's book fields, or None if it is unusable."""
+    if not isinstance(row, dict):
+        return None
+    if fmt == 'goodreads':
+        shelf = (row.get('Exclusive Shelf') or '').strip()
+        status = GOODREADS_SHELVES.get(shelf, 'To Read')
+        book = {
+            'title': row.get('Title'),
+            'author': row.get('Author'),
+            'genre': 'Unknown',
+            'rating': _int(row.get('My Rating')),
+            'status': status,
+            'tags': [t for t in _tags(row.get('Bookshelves')) if t != shelf],
+            'timestamp': _timestamp(_first(row, 'Date Read', 'Date Added')),
+            'total_pages': _int(row.get('Number of Pages')),
+        }
+    else:
+        status = str(_first(row, 'status', 'Status') or '').strip().lower()
+        book = {
+            'title': _first(row, 'title', 'Title'),
+            'author': _first(row, 'author', 'Author'),
+            'genre': _first(row, 'genre', 'Genre') or 'Unknown',
+            'rating': _int(_first(row, 'rating', 'Rating')),
+            'status': STATUSES.get(status, 'To Read'),
+            'tags': _tags(_first(row, 'tags', 'Tags')),
+            'timestamp': _timestamp(_first(row, 'timestamp', 'date', 'Date')),
+            'total_pages': _int(_first(row, 'total_pages', 'Total Pages')),
+            'pages_read': _int(_first(row, 'pages_read', 'Pages Read')),
+        }
+
+    book['title'] = str(book['title'] or '').strip()
+    book['author'] = str(book['author'] or '').strip()
+    if not book['title'] or not book['author']:
+        return None
+    # Same rules as the add-book form: 1-5 stars, none for unread books.
+    rating = min(book['rating'], 5)
+    book['rating'] = rating if rating and book['status'] != 'To Read' else ""
+    if 'pages_read' not in book:
+        book['pages_read'] = book['total_pages'] if book['status'] == 'Completed' else 0
+    return book
+
+
+def _existing_keys(user_id):
+    """Title/author keys already in the library, read in one projected pass."""
+    keys = set()
+    for book in db.iter_user_books(user_id, projection=['title_author_key', 'title', 'author']):
+        keys.add(book.get('title_author_key') or db.title_author_key(book.get('title', ''), book.get('author', '')))
+    return keys
+
+
+def import_books(user_id, email, rows, fmt, progress=None):
+    """
+    Imports `rows` (an iterable of parsed input rows) into the user's
+    library, skipping books that are already there or repeated in the input.
+    `progress(summary)` is called after each written chunk. Returns the
+    summary dict: imported, duplicates and invalid row counts, plus how
+    many of the imported books were left undated.
+    """
+    summary = {'imported': 0, 'duplicates': 0, 'invalid': 0, 'undated': 0}
+    seen = _existing_keys(user_id)
+    chunk = []
+
+    def flush():
+        for book, book_id in zip(chunk, db.reserve_book_ids(user_id, len(chunk))):
+            book['book_id'] = book_id
+        db.save_books(chunk)
+        summary['imported'] += len(chunk)
+        summary['undated'] += sum(1 for book in chunk if not book['timestamp'])
+        chunk.clear()
+        if progress:
+            progress(summary)
+
+    for row in rows:
+        book = to_book(row, fmt)
+        if book is None:
+            summary['invalid'] += 1
+            continue
+        key = db.title_author_key(book['title'], book['author'])
+        if key in seen:
+            summary['duplicates'] += 1
+            continue
+        seen.add(key)
+        book.update({'user_id': user_id, 'email': email})
+        chunk.append(book)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+    return summary
+
+
+def import_file(user_id, email, binary_file, name='', fmt=None, progress=None):
+    """Detects the format of an open binary file and imports it."""
+    if fmt is None:
+        first_line = binary_file.readline().decode('utf-8-sig', errors='replace')
+        binary_file.seek(0)
+        fmt = detect_format(name, first_line)
+    return import_books(user_id, email, iter_rows(binary_file, fmt), fmt, progress=progress)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: python importer.py USER_ID EMAIL books.(csv|jsonl)")
+        sys.exit(1)
+    user_id, email, path = sys.argv[1:]
+
+    def report(summary):
+        print(f"  {summary['imported']} imported...", flush=True)
+
+    with open(path, 'rb') as f:
+        result = import_file(user_id, email, f, name=path, progress=report)
+    print(f"Imported {result['imported']} book(s); skipped {result['duplicates']} duplicate(s) "
+          f"and {result['invalid']} invalid row(s).")
+    if result['undated']:
+        print(f"{result['undated']} imported book(s) had no readable date and were left undated.")
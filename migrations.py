@@ -0,0 +1,96 @@
+"""
+One-off data migrations for the BooksTable.
+
+Run from the project root, e.g.:
+    python migrations.py index-keys
+"""
+import sys
+
+import database as db
+import stats
+
+
+def scan_all_books(projection=None):
+    """Yields every item in the BooksTable, page by page."""
+    scan_kwargs = db.projection_kwargs(projection)
+    while True:
+        response = db.books_table.scan(**scan_kwargs)
+        yield from response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
+def backfill_index_keys():
+    """
+    Writes the derived index attributes (title_author_key, rating_key,
+    user_genre, user_status) on every book where they are missing or stale.
+    """
+    derived = ['title_author_key', 'rating_key', 'user_genre', 'user_status']
+    source = ['user_id', 'book_id', 'title', 'author', 'rating', 'genre', 'status']
+    updated = 0
+    for book in scan_all_books(source + derived):
+        keys = db.index_keys(book)
+        stale = {name: value for name, value in keys.items() if book.get(name) != value}
+        orphaned = [name for name in derived if name in book and name not in keys]
+        if not (stale or orphaned):
+            continue
+        db.update_book(book['user_id'], book['book_id'], set_fields=stale, remove_fields=orphaned)
+        updated += 1
+    return updated
+
+
+def backfill_archive_keys():
+    """
+    Writes the sparse archive index attributes (active_user_id or
+    archived_user_id plus archived_date) on every book that lacks them.
+    """
+    fields = ['user_id', 'book_id', 'archived', 'archived_date', 'active_user_id', 'archived_user_id']
+    updated = 0
+    for book in scan_all_books(fields):
+        expected, unexpected = db.archive_keys(book['user_id'], book.get('archived'))
+        missing = any(book.get(name) != value for name, value in expected.items())
+        if book.get('archived') and not book.get('archived_date'):
+            missing = True
+        if not missing and not any(name in book for name in unexpected):
+            continue
+        if book.get('archived'):
+            set_fields = {'archived': True}
+            if book.get('archived_date'):
+                set_fields['archived_date'] = book['archived_date']
+            db.update_book(book['user_id'], book['book_id'], set_fields=set_fields)
+        else:
+            db.update_book(book['user_id'], book['book_id'], remove_fields=['archived'])
+        updated += 1
+    return updated
+
+
+def check_all_stats():
+    """
+    Recomputes every user's stats aggregate from the raw rows, reports any
+    drift and repairs it.
+    """
+    user_ids = {book['user_id'] for book in scan_all_books(['user_id'])}
+    repaired = 0
+    for user_id in sorted(user_ids):
+        mismatches = stats.check_stats(user_id, repair=True)
+        if mismatches:
+            print(f"{user_id}: {mismatches}")
+            repaired += 1
+    return repaired
+
+
+MIGRATIONS = {
+    'index-keys': backfill_index_keys,
+    'archive-keys': backfill_archive_keys,
+    'check-stats': check_all_stats,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in MIGRATIONS:
+        print(f"Usage: python migrations.py [{' | '.join(MIGRATIONS)}]")
+        sys.exit(1)
+    count = MIGRATIONS[sys.argv[1]]()
+    print(f"{sys.argv[1]}: updated {count} item(s).")
@@ -0,0 +1,62 @@
+"""
+Startup-time profile: how long each module group takes to import cold.
+
+Each group is imported in a fresh interpreter with `python -X importtime`,
+and the slowest imports are listed along with the group's total.
+    python profile_startup.py [--top 15]
+"""
+import subprocess
+import sys
+
+# What app.py imports before a user logs in, and what each page adds on top.
+GROUPS = {
+    'login path': ['streamlit', 'database', 'tag_index', 'stats', 'collab_filter'],
+    'dashboard': ['dashboard'],
+    'edit_delete': ['edit_delete'],
+    'recommendations': ['recommendations'],
+}
+HEAVY_MODULES = ('pandas', 'matplotlib', 'numpy', 'requests', 'reportlab')
+
+
+def profile_imports(modules):
+    """Returns [(cumulative_us, depth, module)] for every module the import loaded."""
+    code = "; ".join(f"import {m}" for m in modules)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Names are indented two spaces per nesting level after one separator space.
+        name = name.rstrip()[1:]
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings.append((int(cumulative), depth, name.strip()))
+    return timings
+
+
+def main(top=15):
+    for group, modules in GROUPS.items():
+        try:
+            timings = profile_imports(modules)
+        except RuntimeError as e:
+            print(f"== {group}: could not import ({e})\n")
+            continue
+        total_ms = sum(us for us, depth, name in timings if depth == 0 and name in modules) / 1000
+        print(f"== {group} ({', '.join(modules)}): {total_ms:.1f} ms")
+        for us, _, name in sorted(timings, reverse=True)[:top]:
+            print(f"  {us / 1000:9.1f} ms  {name}")
+        loaded = {name.split('.')[0] for _, _, name in timings}
+        heavy = [m for m in HEAVY_MODULES if m in loaded]
+        if group == 'login path' and heavy:
+            print(f"  WARNING: login path loads {', '.join(heavy)}")
+        print()
+
+
+if __name__ == "__main__":
+    top = int(sys.argv[sys.argv.index('--top') + 1]) if '--top' in sys.argv else 15
+    main(top)
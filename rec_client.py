@@ -0,0 +1,164 @@
+import gzip
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+
+# --- Recommendation Lambda connection settings ---
+load_dotenv()
+LAMBDA_URL = os.getenv("LAMBDA_FUNCTION_URL")
+POOL_SIZE = int(os.getenv('LAMBDA_POOL_SIZE', '10'))
+CONNECT_TIMEOUT = float(os.getenv('LAMBDA_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.getenv('LAMBDA_READ_TIMEOUT', '15'))
+MAX_ATTEMPTS = int(os.getenv('LAMBDA_MAX_ATTEMPTS', '3'))
+BACKOFF_BASE = float(os.getenv('LAMBDA_BACKOFF_BASE', '0.25'))
+BACKOFF_MAX = float(os.getenv('LAMBDA_BACKOFF_MAX', '4'))
+# Request bodies at least this large are sent gzip-compressed with
+# Content-Encoding: gzip; 0 disables it. Only enable once the Lambda
+# decompresses request bodies.
+GZIP_MIN_BYTES = int(os.getenv('LAMBDA_GZIP_MIN_BYTES', '0'))
+BREAKER_FAILURES = int(os.getenv('LAMBDA_BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('LAMBDA_BREAKER_RESET_SECONDS', '30'))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ServiceUnavailableError(Exception):
+    """Raised when the Lambda keeps failing or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failed calls and rejects calls for
+    `reset_seconds`; then lets a single trial call through (half-open), and
+    closes again once one succeeds.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failed = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failed = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failed += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failed >= self.failures:
+                self._opened_at = time.monotonic()
+
+
+_lock = threading.Lock()
+_session = None
+breaker = CircuitBreaker()
+
+
+def get_session():
+    """Returns the process-wide keep-alive session, created on first use."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                # Retries are done below so they can back off with jitter.
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def _encode(payload):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if GZIP_MIN_BYTES and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+
+def _backoff(attempt):
+    """Full jitter: a random wait up to the capped exponential delay."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def post_json(payload, url=None):
+    """
+    POSTs `payload` to the recommendation Lambda and returns the decoded
+    JSON response. Connection errors, timeouts and 429/5xx responses are
+    retried; raises ServiceUnavailableError when every attempt failed or the
+    circuit breaker is open.
+    """
+    url = url or LAMBDA_URL
+    if not breaker.allow():
+        raise ServiceUnavailableError("Recommendation service is temporarily disabled after repeated failures.")
+    try:
+        return _post_with_retries(payload, url)
+    except ServiceUnavailableError:
+        raise
+    except Exception as e:
+        # Anything unexpected still settles the breaker, so a half-open
+        # trial can never be left running.
+        breaker.record_failure()
+        raise ServiceUnavailableError(f"Recommendation request failed: {e}")
+
+
+def _post_with_retries(payload, url):
+    body, headers = _encode(payload)
+    last_error = None
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(_backoff(attempt))
+        try:
+            response = get_session().post(
+                url, data=body, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_error = e
+            continue
+        except requests.RequestException as e:
+            # Redirect loops, bad URLs, broken bodies: not worth retrying.
+            breaker.record_failure()
+            raise ServiceUnavailableError(f"Recommendation request failed: {e}")
+        if response.status_code in RETRY_STATUSES:
+            last_error = requests.HTTPError(f"{response.status_code} from recommendation service")
+            continue
+        try:
+            response.raise_for_status()
+            data = response.json()
+        except (ValueError, requests.exceptions.ContentDecodingError, requests.exceptions.ChunkedEncodingError) as e:
+            # Malformed JSON is not going to improve on a retry.
+            breaker.record_failure()
+            raise ServiceUnavailableError(f"Invalid response from recommendation service: {e}")
+        except requests.HTTPError as e:
+            # Other 4xx responses mean the request itself is wrong; the
+            # service is up, so they don't count against the breaker.
+            breaker.record_success()
+            raise ServiceUnavailableError(str(e))
+        breaker.record_success()
+        return data
+    breaker.record_failure()
+    raise ServiceUnavailableError(f"Recommendation service failed after {MAX_ATTEMPTS} attempt(s): {last_error}")
@@ -0,0 +1,159 @@
+"""
+In-process recommendation engine, an alternative to the recommendation Lambda.
+
+Candidates come from a local catalog file (BOOK_CATALOG_PATH, CSV or JSON
+lines with title, author, genre and optional tags). A reader's genre,
+author and tag affinities are learned from their history, weighted by
+rating, and every catalog book is scored against them in one vectorized pass.
+"""
+import csv
+import json
+import os
+import threading
+
+import numpy as np
+
+CATALOG_PATH = os.getenv("BOOK_CATALOG_PATH", "")
+TOP_N = int(os.getenv("LOCAL_RECOMMENDATIONS", "9"))
+
+GENRE_WEIGHT = 1.0
+AUTHOR_WEIGHT = 0.6
+TAG_WEIGHT = 0.4
+
+
+def _key(value):
+    return " ".join(str(value or '').split()).casefold()
+
+
+def _tags(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [_key(t) for t in value or [] if _key(t)]
+
+
+class Catalog:
+    """Catalog books with genre/author/tag columns encoded as integer indices."""
+
+    def __init__(self, books):
+        self.books = [b for b in books if b.get('title')]
+        self.genres, genre_idx = self._encode(_key(b.get('genre')) for b in self.books)
+        self.authors, author_idx = self._encode(_key(b.get('author')) for b in self.books)
+        self.genre_idx = np.asarray(genre_idx, dtype=np.int32)
+        self.author_idx = np.asarray(author_idx, dtype=np.int32)
+
+        # Tags flattened CSR-style: tag_idx holds every book's tags back to back
+        # and tag_book the book each entry belongs to.
+        self.tags = {}
+        tag_idx, tag_ptr = [], [0]
+        for book in self.books:
+            for tag in _tags(book.get('tags')):
+                tag_idx.append(self.tags.setdefault(tag, len(self.tags)))
+            tag_ptr.append(len(tag_idx))
+        self.tag_idx = np.asarray(tag_idx, dtype=np.int32)
+        self.tag_counts = np.diff(np.asarray(tag_ptr, dtype=np.int64))
+        self.tag_book = np.repeat(np.arange(len(self.books)), self.tag_counts)
+        self.keys = {(_key(b['title']), _key(b.get('author'))): i for i, b in enumerate(self.books)}
+
+    @staticmethod
+    def _encode(values):
+        vocab, codes = {}, []
+        for value in values:
+            codes.append(vocab.setdefault(value, len(vocab)))
+        return vocab, codes
+
+    @classmethod
+    def load(cls, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            if path.endswith('.csv'):
+                return cls(csv.DictReader(f))
+            return cls(json.loads(line) for line in f if line.strip())
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None and CATALOG_PATH:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = Catalog.load(CATALOG_PATH)
+    return _catalog
+
+
+def _affinity(vocab, history, field, weights):
+    """Rating-weighted preference for each vocabulary entry, scaled to [0, 1]."""
+    scores = np.zeros(len(vocab), dtype=np.float32)
+    for book, weight in zip(history, weights):
+        values = _tags(book.get(field)) if field == 'tags' else [_key(book.get(field))]
+        for value in values:
+            index = vocab.get(value)
+            if index is not None:
+                scores[index] += weight
+    peak = scores.max() if len(scores) else 0
+    return scores / peak if peak > 0 else scores
+
+
+def _history_weights(history):
+    """Liked books count for more; unrated ones count as neutral (3/5)."""
+    weights = []
+    for book in history:
+        try:
+            rating = float(book.get('rating'))
+        except (TypeError, ValueError):
+            rating = 0
+        weights.append((rating if rating > 0 else 3) / 5)
+    return np.asarray(weights, dtype=np.float32)
+
+
+def _top_names(history, field, weights, count=3):
+    totals = {}
+    for book, weight in zip(history, weights):
+        name = str(book.get(field) or '').strip()
+        if name:
+            totals[name] = totals.get(name, 0) + float(weight)
+    return [name for name, _ in sorted(totals.items(), key=lambda item: -item[1])[:count]]
+
+
+def recommend(reading_history, catalog=None, top_n=TOP_N):
+    """
+    Returns (recommendations, top_genres, top_authors, error), the same shape
+    as recommendations.fetch_recommendations_from_lambda.
+    """
+    catalog = catalog or get_catalog()
+    if catalog is None or not catalog.books:
+        return None, None, None, "Local recommendations are unavailable: no book catalog is configured."
+    if not reading_history:
+        return [], [], [], None
+
+    weights = _history_weights(reading_history)
+    genre_aff = _affinity(catalog.genres, reading_history, 'genre', weights)
+    author_aff = _affinity(catalog.authors, reading_history, 'author', weights)
+    tag_aff = _affinity(catalog.tags, reading_history, 'tags', weights)
+
+    scores = GENRE_WEIGHT * genre_aff[catalog.genre_idx] + AUTHOR_WEIGHT * author_aff[catalog.author_idx]
+    if len(catalog.tag_idx):
+        # Sum each book's tag affinities, damped by the square root of its tag count.
+        tag_sums = np.bincount(catalog.tag_book, weights=tag_aff[catalog.tag_idx], minlength=len(catalog.books))
+        scores += TAG_WEIGHT * (tag_sums / np.sqrt(np.maximum(catalog.tag_counts, 1))).astype(np.float32)
+
+    # Never recommend what the reader already has.
+    for book in reading_history:
+        index = catalog.keys.get((_key(book.get('title')), _key(book.get('author'))))
+        if index is not None:
+            scores[index] = -np.inf
+
+    top_n = min(top_n, len(scores))
+    best = np.argpartition(-scores, top_n - 1)[:top_n]
+    best = best[np.argsort(-scores[best], kind='stable')]
+    recommendations = [
+        {
+            'title': catalog.books[i]['title'],
+            'author': catalog.books[i].get('author', 'Unknown'),
+            'genre': catalog.books[i].get('genre', 'Unknown'),
+        }
+        for i in best if np.isfinite(scores[i]) and scores[i] > 0
+    ]
+    return (recommendations, _top_names(reading_history, 'genre', weights),
+            _top_names(reading_history, 'author', weights), None)
@@ -1,14 +1,36 @@
 import streamlit as st
-import requests
 import json
-import boto3
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 import os
 from dotenv import load_dotenv
 import database as db
+import change_feed
+import rec_client
+import collab_filter
+from cache import TTLCache
 
 load_dotenv()
-LAMBDA_URL = os.getenv("LAMBDA_FUNCTION_URL")
+LAMBDA_URL = rec_client.LAMBDA_URL
+# 'lambda' calls LAMBDA_FUNCTION_URL (falling back to the local engine when a
+# BOOK_CATALOG_PATH is set); 'local' only uses the in-process rec_engine.
+RECOMMENDER = os.getenv("RECOMMENDER", "lambda").lower()
+
+# Results are served fresh for REC_FRESH_SECONDS; after that, until
+# REC_CACHE_TTL, the cached answer is still shown while a refresh runs.
+REC_FRESH_SECONDS = float(os.getenv("REC_FRESH_SECONDS", "3600"))
+REC_CACHE_TTL = float(os.getenv("REC_CACHE_TTL", "86400"))
+REC_CACHE_PERSIST = os.getenv("REC_CACHE_PERSIST", "0") == "1"
+
+# Keyed by history fingerprint, so identical histories share one entry
+# across reruns and across users of this process.
+_rec_cache = TTLCache(maxsize=int(os.getenv("REC_CACHE_SIZE", "1024")), ttl=REC_CACHE_TTL)
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='rec-refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
 
 class DecimalEncoder(json.JSONEncoder):
     def default(self, o):
@@ -16,29 +38,204 @@ class DecimalEncoder(json.JSONEncoder):
             return float(o) if o % 1 > 0 else int(o)
         return super(DecimalEncoder, self).default(o)
 
+# The fields the recommender and the history cards use, nothing else.
+HISTORY_FIELDS = ('book_id', 'title', 'author', 'genre', 'rating', 'status', 'tags')
+
+
+def compact_history(books):
+    """Reduces full book items to HISTORY_FIELDS with JSON-ready values."""
+    return [
+        {field: db.to_plain(book[field]) for field in HISTORY_FIELDS if field in book}
+        for book in books
+    ]
+
+
 def get_reading_history(user_id):
     try:
-        response = db.books_table.query(
-            IndexName='user_id-index',
-            KeyConditionExpression=boto3.dynamodb.conditions.Key('user_id').eq(user_id)
-        )
-        items = response.get('Items', [])
+        # Archived books are finished reads, so the history covers the full
+        # base table rather than the active library.
+        items = list(db.iter_user_books(user_id, projection=list(HISTORY_FIELDS)))
         if not items:
             return None, f"No reading history found. Add books to get recommendations."
-        return json.loads(json.dumps(items, cls=DecimalEncoder)), None
+        return compact_history(items), None
     except Exception:
         return None, "A database error occurred while fetching your history."
 
 def fetch_recommendations_from_lambda(reading_history):
     try:
-        response = requests.post(LAMBDA_URL, json={'reading_history': reading_history})
-        response.raise_for_status()
-        data = response.json()
+        data = rec_client.post_json({'reading_history': reading_history})
         return data.get('recommendations'), data.get('top_genres'), data.get('top_authors'), None
-    except Exception:
+    except Exception as e:
+        print(f"Recommendation service error: {e}")
         return None, None, None, "Could not retrieve recommendations. The service may be down."
 
 
+def fetch_recommendations(reading_history):
+    """Returns (recommendations, top_genres, top_authors, error) from the configured engine."""
+    import rec_engine
+    if RECOMMENDER == 'local':
+        return rec_engine.recommend(reading_history)
+    result = fetch_recommendations_from_lambda(reading_history)
+    if result[3] and rec_engine.get_catalog() is not None:
+        return rec_engine.recommend(reading_history)
+    return result
+
+
+# --- Recommendation cache ---
+def history_fingerprint(reading_history):
+    """Stable hash of the parts of the history that drive recommendations."""
+    compact = sorted(
+        ({field: book.get(field) for field in HISTORY_FIELDS} for book in reading_history),
+        key=lambda book: str(book.get('book_id'))
+    )
+    payload = json.dumps(compact, sort_keys=True, cls=DecimalEncoder, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _fetch_and_cache(fingerprint, reading_history, email):
+    recommendations, top_genres, top_authors, rec_error = fetch_recommendations(reading_history)
+    if rec_error:
+        return None
+    entry = {
+        'fingerprint': fingerprint,
+        'fetched_at': time.time(),
+        'recommendations': recommendations,
+        'top_genres': top_genres,
+        'top_authors': top_authors,
+    }
+    _rec_cache.set(fingerprint, entry)
+    if REC_CACHE_PERSIST and email:
+        try:
+            # DynamoDB only accepts Decimal numbers.
+            db.save_recommendation_cache(email, json.loads(json.dumps(entry), parse_float=Decimal))
+        except Exception as e:
+            print(f"Error persisting recommendation cache: {e}")
+    return entry
+
+
+def _revalidate(fingerprint, reading_history, email):
+    with _refreshing_lock:
+        if fingerprint in _refreshing:
+            return
+        _refreshing.add(fingerprint)
+
+    def run():
+        try:
+            _fetch_and_cache(fingerprint, reading_history, email)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(fingerprint)
+
+    _refresh_executor.submit(run)
+
+
+def _persisted_entry(email, fingerprint):
+    if not (REC_CACHE_PERSIST and email):
+        return None
+    entry = db.get_user(email).get('recommendation_cache')
+    if not entry or entry.get('fingerprint') != fingerprint:
+        return None
+    entry = json.loads(json.dumps(entry, cls=DecimalEncoder))
+    if time.time() - entry['fetched_at'] > REC_CACHE_TTL:
+        return None
+    _rec_cache.set(fingerprint, entry)
+    return entry
+
+
+def get_recommendations(reading_history, email=None):
+    """
+    Returns (recommendations, top_genres, top_authors, error, is_stale).
+    A cached answer for the same history is returned immediately; once it is
+    older than REC_FRESH_SECONDS a background refresh is started as well.
+    """
+    fingerprint = history_fingerprint(reading_history)
+    entry = _rec_cache.get(fingerprint) or _persisted_entry(email, fingerprint)
+    if entry is None:
+        entry = _fetch_and_cache(fingerprint, reading_history, email)
+        if entry is None:
+            return None, None, None, "Could not retrieve recommendations. The service may be down.", False
+    is_stale = time.time() - entry['fetched_at'] > REC_FRESH_SECONDS
+    if is_stale:
+        _revalidate(fingerprint, reading_history, email)
+    return entry['recommendations'], entry['top_genres'], entry['top_authors'], None, is_stale
+
+
+def refresh_user_recommendations(user_id, email):
+    """
+    Computes recommendations for a user's current history (through the
+    fingerprint cache) and stores them on their record.
+    """
+    history, error_msg = get_reading_history(user_id)
+    if error_msg:
+        return None
+    fingerprint = history_fingerprint(history)
+    entry = _rec_cache.get(fingerprint)
+    if entry is None or time.time() - entry['fetched_at'] > REC_FRESH_SECONDS:
+        entry = _fetch_and_cache(fingerprint, history, email)
+    if entry is None or entry['recommendations'] is None:
+        return None
+    recommendations = entry['recommendations']
+    # DynamoDB only accepts Decimal numbers.
+    db.save_user_recommendations(email, json.loads(json.dumps(recommendations), parse_float=Decimal))
+    return recommendations
+
+
+# --- Prefetch after writes ---
+_prefetch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("REC_PREFETCH_WORKERS", "4")), thread_name_prefix='rec-prefetch'
+)
+# A finished prefetch is handed out once by get_prefetch; ones nobody
+# collects expire, so the map stays bounded by recently active users.
+_prefetches = TTLCache(
+    maxsize=int(os.getenv("REC_PREFETCH_SIZE", "1024")), ttl=float(os.getenv("REC_PREFETCH_TTL", "900"))
+)
+_prefetches_lock = threading.Lock()
+
+
+def prefetch_recommendations(user_id, email):
+    """
+    Starts computing the user's recommendations in the background and
+    returns the Future. A queued prefetch for the same user is replaced, so a
+    burst of writes costs one computation over the final history.
+    """
+    with _prefetches_lock:
+        previous = _prefetches.get(user_id)
+        if previous is not None:
+            previous.cancel()
+        future = _prefetch_executor.submit(refresh_user_recommendations, user_id, email)
+        _prefetches.set(user_id, future)
+    return future
+
+
+def get_prefetch(user_id):
+    """
+    The user's latest prefetch Future, or None. A finished Future is
+    returned once and then dropped; the caller keeps it for redisplay.
+    """
+    with _prefetches_lock:
+        future = _prefetches.get(user_id)
+        if future is not None and future.done():
+            _prefetches.invalidate(user_id)
+        return future
+
+
+def handle_changes(events):
+    """Change-feed handler: prefetches recommendations once per affected user."""
+    users = {}
+    for event in events:
+        book = event.new_book or event.old_book or {}
+        if book.get('email'):
+            users[event.user_id] = book['email']
+    for user_id, email in users.items():
+        prefetch_recommendations(user_id, email)
+
+
+# Refreshing calls the Lambda, so it only runs on writes when enabled.
+REFRESH_ON_CHANGE = os.getenv("REFRESH_RECOMMENDATIONS_ON_CHANGE", "0") == "1"
+if REFRESH_ON_CHANGE:
+    change_feed.register_handler('recommendations', handle_changes)
+
+
 def create_book_card(book, is_history=False):
     with st.container():
         st.subheader(book.get('title', 'No Title'))
@@ -55,7 +252,7 @@ def create_book_card(book, is_history=False):
 def show_recommendations_page():
     st.title("Book Recommendations 💡")
 
-    if not db.books_table or not LAMBDA_URL:
+    if not db.books_table or (RECOMMENDER == 'lambda' and not LAMBDA_URL):
         st.error("CRITICAL ERROR: Application is not configured correctly. Check .env and db.py files.")
         return
 
@@ -83,12 +280,25 @@ def show_recommendations_page():
 
         st.markdown("---")
 
+        also_read = collab_filter.similar_books(history, limit=6)
+        if also_read:
+            st.header("👥 Readers With Similar Libraries Also Read")
+            for i in range(0, len(also_read), num_columns):
+                cols = st.columns(num_columns)
+                for j, book in enumerate(also_read[i:i + num_columns]):
+                    with cols[j]:
+                        create_book_card(book)
+            st.markdown("---")
+
         if st.button('✨ Get My Recommendations!', key="get_recs"):
             with st.spinner('Analyzing your preferences...'):
-                recommendations, top_genres, top_authors, rec_error = fetch_recommendations_from_lambda(history)
+                recommendations, top_genres, top_authors, rec_error, is_stale = get_recommendations(
+                    history, email=st.session_state.get('user_email'))
 
 
             st.header("Here Are Your Personalized Suggestions")
+            if is_stale:
+                st.caption("Showing your last suggestions while fresh ones are prepared.")
             if rec_error:
                 st.warning(rec_error)
             elif recommendations:
@@ -0,0 +1,191 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import book_frame
+import charts
+from cache import TTLCache
+
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+# Libraries with more rows than this are rendered to a temporary file
+# instead of an in-memory buffer.
+REPORT_SPOOL_ROWS = int(os.getenv('REPORT_SPOOL_ROWS', '5000'))
+# The book table is split into separate tables of this many rows so that
+# reportlab lays out (and splits across pages) one small table at a time.
+TABLE_CHUNK_ROWS = 500
+ROWS_PER_PAGE = 45
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='report')
+
+
+def _on_job_evicted(key, job):
+    # Expired or pushed out by newer reports: nothing can reach the job's
+    # spool file any more. A render still in progress removes it when done.
+    if job.future is None:
+        job.remove_spool()
+    else:
+        job.future.add_done_callback(lambda _: job.remove_spool())
+
+
+_jobs = TTLCache(maxsize=64, ttl=float(os.getenv('REPORT_CACHE_TTL', '3600')), on_evict=_on_job_evicted)
+
+
+def library_fingerprint(df):
+    """Content hash of the columns that appear in the report."""
+    hashed = pd.util.hash_pandas_object(df[book_frame.FRAME_COLUMNS], index=False)
+    return hashlib.sha256(hashed.to_numpy().tobytes()).hexdigest()
+
+
+def generate_pdf(df, user_id, output=None, progress=None):
+    """
+    Renders the library report into `output` (a path or file object; a new
+    BytesIO when omitted) and returns it. `progress(fraction)` is called as
+    pages are written.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Image as RLImage, Spacer
+    from reportlab.lib import colors
+
+    buffer = output if output is not None else io.BytesIO()
+
+    # Same charts (and cache entries) as the dashboard for the same data.
+    rated = df['rating'][df['rating'] > 0]
+    img_rating = io.BytesIO(charts.rating_chart(rated.value_counts().to_dict()))
+    genre_counts = df['genre'].value_counts()
+    img_genre = io.BytesIO(charts.genre_bar_chart(genre_counts[genre_counts > 0].to_dict()))
+
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ])
+    header = ['Title', 'Genre', 'Rating', 'Date']
+    rows = list(map(list, zip(
+        df['title'].astype(str).to_numpy(),
+        df['genre'].astype(str).to_numpy(),
+        book_frame.format_ratings(df['rating']),
+        book_frame.format_dates(df['timestamp'])
+    )))
+    for start in range(0, max(len(rows), 1), TABLE_CHUNK_ROWS):
+        data_table = Table([header] + rows[start:start + TABLE_CHUNK_ROWS], repeatRows=1)
+        data_table.setStyle(table_style)
+        elements.append(data_table)
+    del rows
+
+    elements.append(Spacer(1, 12))
+    elements.append(RLImage(img_rating, width=400, height=200))
+    elements.append(Spacer(1, 12))
+    elements.append(RLImage(img_genre, width=400, height=200))
+
+    expected_pages = len(df) // ROWS_PER_PAGE + 2
+    pages_done = [0]
+
+    def on_page(canvas, doc):
+        pages_done[0] += 1
+        if progress:
+            progress(min(pages_done[0] / expected_pages, 0.99))
+
+    doc.build(elements, onFirstPage=on_page, onLaterPages=on_page)
+    if isinstance(buffer, io.BytesIO):
+        buffer.seek(0)
+    if progress:
+        progress(1.0)
+    return buffer
+
+
+class ReportJob:
+    """A report rendering in the background, with its progress and output."""
+
+    def __init__(self, key, spool):
+        self.key = key
+        self.progress = 0.0
+        self.path = None
+        self.data = None
+        if spool:
+            handle, self.path = tempfile.mkstemp(prefix='bookmate_report_', suffix='.pdf')
+            os.close(handle)
+        self.future = None
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def error(self):
+        return self.future.exception() if self.done() else None
+
+    def read(self):
+        """
+        Returns the finished PDF as bytes, or None when a spooled report's
+        file has already been removed (the job was evicted or replaced).
+        """
+        if self.path:
+            try:
+                with open(self.path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                return None
+        return self.data
+
+    def _run(self, df, user_id):
+        def report(fraction):
+            self.progress = fraction
+        if self.path:
+            generate_pdf(df, user_id, output=self.path, progress=report)
+        else:
+            self.data = generate_pdf(df, user_id, progress=report).getvalue()
+
+    def discard(self):
+        # A newer job for the same library may have taken this key already.
+        if _jobs.get(self.key) is self:
+            _jobs.invalidate(self.key)
+        self.remove_spool()
+
+    def remove_spool(self):
+        # Eviction and replacement can both get here for the same job.
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+_latest_jobs = {}
+_latest_lock = threading.Lock()
+
+
+def request_report(user_id, df):
+    """
+    Returns the ReportJob for the user's current library, starting a
+    background render unless an identical library was rendered already.
+    """
+    key = (user_id, library_fingerprint(df))
+    job = _jobs.get(key)
+    if job is not None and job.error() is None:
+        return job
+
+    job = ReportJob(key, spool=len(df) > REPORT_SPOOL_ROWS)
+    job.future = _executor.submit(job._run, df.copy(), user_id)
+    _jobs.set(key, job)
+    with _latest_lock:
+        previous = _latest_jobs.get(user_id)
+        _latest_jobs[user_id] = job
+    if previous is not None and previous.key != job.key:
+        # A changed library makes the user's previous spooled report obsolete.
+        previous.future.add_done_callback(lambda _: previous.discard())
+    elif previous is not None and previous is not job:
+        # Re-render of the same library (expired, evicted or failed): the new
+        # job owns the cache key, so only the old job's file is dropped.
+        previous.future.add_done_callback(lambda _: previous.remove_spool())
+    return job
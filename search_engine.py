@@ -0,0 +1,154 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from cache import PerUserIndexes
+import change_feed
+import database as db
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = {'a', 'an', 'and', 'by', 'for', 'in', 'of', 'on', 'or', 'the', 'to'}
+
+# Field boosts: a hit in the title counts for more than one in the tags.
+FIELD_WEIGHTS = {'title': 3.0, 'author': 2.0, 'tags': 1.0}
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+
+# A misspelled term is matched to vocabulary terms sharing at least this
+# fraction of trigrams; those hits are scored down by the same fraction.
+FUZZY_THRESHOLD = 0.3
+FUZZY_CANDIDATES = 3
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(str(text).casefold()) if t not in STOPWORDS]
+
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    BM25-ranked full-text index over title, author and tags, with trigram
+    fuzzy matching for query terms that are not in the vocabulary.
+    Documents can be added, replaced and removed one at a time.
+    """
+
+    def __init__(self, books=()):
+        self._lock = threading.Lock()
+        self._postings = {}    # term -> {book_id: weighted term frequency}
+        self._doc_terms = {}   # book_id -> {term: weighted term frequency}
+        self._doc_len = {}     # book_id -> weighted document length
+        self._total_len = 0.0
+        self._trigrams = {}    # trigram -> set of terms
+        for book in books:
+            self.add_book(book)
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def add_book(self, book):
+        book_id = book['book_id']
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            value = book.get(field) or ''
+            if isinstance(value, (list, set, tuple)):
+                value = " ".join(str(v) for v in value)
+            for token in tokenize(value):
+                terms[token] += weight
+
+        with self._lock:
+            self._remove_locked(book_id)
+            for term, tf in terms.items():
+                if term not in self._postings:
+                    self._postings[term] = {}
+                    for gram in trigrams(term):
+                        self._trigrams.setdefault(gram, set()).add(term)
+                self._postings[term][book_id] = tf
+            self._doc_terms[book_id] = dict(terms)
+            self._doc_len[book_id] = sum(terms.values())
+            self._total_len += self._doc_len[book_id]
+
+    def remove_book(self, book_id):
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def _remove_locked(self, book_id):
+        if book_id not in self._doc_terms:
+            return
+        for term in self._doc_terms.pop(book_id):
+            postings = self._postings[term]
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[term]
+                for gram in trigrams(term):
+                    terms = self._trigrams.get(gram)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._trigrams[gram]
+        self._total_len -= self._doc_len.pop(book_id)
+
+    def _fuzzy_terms(self, token):
+        """Returns [(term, similarity)] for the closest vocabulary terms."""
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            for term in self._trigrams.get(gram, ()):
+                shared[term] += 1
+        candidates = []
+        for term, overlap in shared.items():
+            similarity = overlap / len(grams | trigrams(term))
+            if similarity >= FUZZY_THRESHOLD:
+                candidates.append((term, similarity))
+        candidates.sort(key=lambda item: -item[1])
+        return candidates[:FUZZY_CANDIDATES]
+
+    def search(self, text, limit=10):
+        """Returns up to `limit` (book_id, score) pairs, best match first."""
+        with self._lock:
+            doc_count = len(self._doc_len)
+            if not doc_count:
+                return []
+            avg_len = self._total_len / doc_count
+            scores = Counter()
+            for token in set(tokenize(text)):
+                if token in self._postings:
+                    expansions = [(token, 1.0)]
+                else:
+                    expansions = self._fuzzy_terms(token)
+                for term, boost in expansions:
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for book_id, tf in postings.items():
+                        norm = K1 * (1 - B + B * self._doc_len[book_id] / avg_len)
+                        scores[book_id] += boost * idf * tf * (K1 + 1) / (tf + norm)
+            return scores.most_common(limit)
+
+
+# --- Per-user indexes, rebuilt from the library cache on a miss ---
+_indexes = PerUserIndexes(
+    lambda user_id: SearchIndex(db.get_user_books(user_id).values()),
+    maxsize=int(os.getenv('LIBRARY_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('LIBRARY_CACHE_TTL', '300'))
+)
+
+
+def get_search_index(user_id):
+    return _indexes.get(user_id)
+
+
+def search_user_books(user_id, text, limit=10):
+    """Returns the user's best-matching books for `text`, best first."""
+    library = db.get_user_books(user_id)
+    hits = get_search_index(user_id).search(text, limit=limit)
+    return [library[book_id] for book_id, _ in hits if book_id in library]
+
+
+change_feed.register_handler('search_index', _indexes.apply)
@@ -0,0 +1,237 @@
+import os
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+import change_feed
+import database as db
+import dynamo_client
+
+# One item per user ({'user_id': ...}) holding running totals and histograms.
+# Histogram buckets are flat attributes with a prefix, e.g. 'g:Fantasy' or
+# 'm:2024-05', so that a single ADD can create or bump them atomically.
+stats_table = dynamo_client.get_table(os.getenv('STATS_TABLE', 'UserStatsTable'))
+
+GENRE_PREFIX = 'g:'
+RATING_PREFIX = 'r:'
+MONTH_PREFIX = 'm:'
+# Bumped by every delta, so a rebuild can tell whether one landed meanwhile.
+VERSION = 'version'
+REBUILD_ATTEMPTS = 5
+COMPLETED_STATUSES = {'completed', 'done', 'read'}
+PENDING_STATUSES = {'to read', 'reading'}
+
+
+def _rating(book):
+    """Mirrors the dashboard's numeric rating: rounded to 1 dp, None if unset."""
+    try:
+        return Decimal(str(book.get('rating'))).quantize(Decimal('0.1'))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _month(book):
+    timestamp = str(book.get('timestamp') or '')
+    if len(timestamp) >= 7 and timestamp[4] == '-' and timestamp[:4].isdigit() and timestamp[5:7].isdigit():
+        return timestamp[:7]
+    return None
+
+
+def book_contribution(book):
+    """Returns the counters a single book adds to its owner's aggregate."""
+    if not book:
+        return Counter()
+    rating = _rating(book)
+    rated = rating is not None and rating > 0
+    status = str(book.get('status', 'unknown')).lower()
+
+    counts = Counter({'total_books': 1})
+    counts[GENRE_PREFIX + str(book.get('genre', 'Unknown'))] += 1
+    if rated:
+        counts['rated_books'] += 1
+        counts['rating_sum'] += rating
+        counts[RATING_PREFIX + str(rating)] += 1
+        if status in COMPLETED_STATUSES:
+            counts['completed_books'] += 1
+    if not rated or status in PENDING_STATUSES:
+        counts['pending_books'] += 1
+    month = _month(book)
+    if month:
+        counts[MONTH_PREFIX + month] += 1
+    return counts
+
+
+def apply_delta(user_id, delta):
+    """
+    Atomically adds every counter in `delta` to the user's stats item.
+    Users without an item yet are skipped; their first read rebuilds it.
+    """
+    if not delta:
+        return
+    names, values, terms = {'#u': 'user_id', '#v': VERSION}, {':v': 1}, ["#v :v"]
+    for i, (name, value) in enumerate(delta.items()):
+        names[f"#a{i}"] = name
+        values[f":a{i}"] = Decimal(str(value))
+        terms.append(f"#a{i} :a{i}")
+    try:
+        stats_table.update_item(
+            Key={'user_id': user_id},
+            UpdateExpression="ADD " + ", ".join(terms),
+            ConditionExpression="attribute_exists(#u)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+    except stats_table.meta.client.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def compute_stats(books):
+    """Builds the aggregate for a list of books from scratch."""
+    totals = Counter()
+    for book in books:
+        totals.update(book_contribution(book))
+    return dict(totals)
+
+
+def rebuild_stats(user_id):
+    """
+    Recomputes a user's aggregate from the raw rows and stores it. The put
+    is conditional on the item's version being unchanged since the read
+    started, so a delta applied during the rebuild is not overwritten; the
+    rebuild is retried instead.
+    """
+    for _ in range(REBUILD_ATTEMPTS):
+        current = stats_table.get_item(
+            Key={'user_id': user_id}, ConsistentRead=True,
+            ProjectionExpression="#u, #v", ExpressionAttributeNames={'#u': 'user_id', '#v': VERSION}
+        ).get('Item')
+        stats = compute_stats(db.iter_user_books(user_id))
+        item = {'user_id': user_id, **{k: Decimal(str(v)) for k, v in stats.items()}}
+        if current is None:
+            condition = {'ConditionExpression': "attribute_not_exists(user_id)"}
+        elif VERSION in current:
+            item[VERSION] = current[VERSION]
+            condition = {
+                'ConditionExpression': "#v = :v",
+                'ExpressionAttributeNames': {'#v': VERSION},
+                'ExpressionAttributeValues': {':v': current[VERSION]},
+            }
+        else:
+            condition = {
+                'ConditionExpression': "attribute_exists(user_id) AND attribute_not_exists(#v)",
+                'ExpressionAttributeNames': {'#v': VERSION},
+            }
+        try:
+            stats_table.put_item(Item=item, **condition)
+            return stats
+        except stats_table.meta.client.exceptions.ConditionalCheckFailedException:
+            continue
+    print(f"Stats for {user_id} kept changing during {REBUILD_ATTEMPTS} rebuilds; left as they were.")
+    return stats
+
+
+def check_stats(user_id, repair=False):
+    """
+    Compares the stored aggregate with one recomputed from the raw rows and
+    returns {counter: (stored, actual)} for every mismatch.
+    """
+    stored = _load(user_id) or {}
+    actual = compute_stats(db.iter_user_books(user_id))
+    mismatches = {}
+    for name in set(stored) | set(actual):
+        if stored.get(name, 0) != actual.get(name, 0):
+            mismatches[name] = (stored.get(name, 0), actual.get(name, 0))
+    if mismatches and repair:
+        rebuild_stats(user_id)
+    return mismatches
+
+
+def _load(user_id):
+    item = stats_table.get_item(Key={'user_id': user_id}).get('Item')
+    if item is None:
+        return None
+    item.pop('user_id', None)
+    item.pop(VERSION, None)
+    return item
+
+
+def get_user_stats(user_id):
+    """
+    Returns the user's aggregate as a UserStats view, building it from the
+    raw rows the first time it is requested.
+    """
+    item = _load(user_id)
+    if item is None:
+        item = rebuild_stats(user_id)
+    return UserStats(item)
+
+
+class UserStats:
+    """Read-side view of a stats item with the figures the dashboard shows."""
+
+    def __init__(self, item):
+        self.item = item
+
+    def _count(self, name):
+        return int(self.item.get(name, 0))
+
+    def _buckets(self, prefix):
+        return {
+            name[len(prefix):]: int(value)
+            for name, value in self.item.items()
+            if name.startswith(prefix) and int(value) > 0
+        }
+
+    @property
+    def total_books(self):
+        return self._count('total_books')
+
+    @property
+    def completed_books(self):
+        return self._count('completed_books')
+
+    @property
+    def pending_books(self):
+        return self._count('pending_books')
+
+    @property
+    def progress_pct(self):
+        return self.completed_books / self.total_books * 100 if self.total_books else 0
+
+    @property
+    def avg_rating(self):
+        rated = self._count('rated_books')
+        return float(self.item.get('rating_sum', 0)) / rated if rated else None
+
+    @property
+    def genre_counts(self):
+        """{genre: count}, most common first."""
+        return dict(sorted(self._buckets(GENRE_PREFIX).items(), key=lambda item: -item[1]))
+
+    @property
+    def rating_counts(self):
+        """{rating: count} for rated books, in rating order."""
+        return dict(sorted((float(k), v) for k, v in self._buckets(RATING_PREFIX).items()))
+
+    @property
+    def monthly_counts(self):
+        """{'YYYY-MM': count}, in month order."""
+        return dict(sorted(self._buckets(MONTH_PREFIX).items()))
+
+    @property
+    def avg_per_month(self):
+        months = self.monthly_counts
+        return sum(months.values()) / len(months) if months else None
+
+
+def handle_changes(events):
+    """Change-feed handler: folds a batch of book writes into one ADD per user."""
+    deltas = {}
+    for event in events:
+        user_delta = deltas.setdefault(event.user_id, Counter())
+        user_delta.update(book_contribution(event.new_book))
+        user_delta.subtract(book_contribution(event.old_book))
+    for user_id, delta in deltas.items():
+        apply_delta(user_id, {name: value for name, value in delta.items() if value})
+
+
+change_feed.register_handler('stats', handle_changes)
@@ -0,0 +1,119 @@
+import bisect
+import os
+import threading
+
+from cache import PerUserIndexes
+import change_feed
+import database as db
+
+
+def normalize_tag(tag):
+    return " ".join(str(tag).split()).casefold()
+
+
+class TagIndex:
+    """
+    Inverted index from tag to book_ids for one user's library.
+    Tags are matched case-insensitively; the first spelling seen for a tag
+    is kept for display.
+    """
+
+    def __init__(self, books=()):
+        self._lock = threading.Lock()
+        self._postings = {}     # normalized tag -> set of book_ids
+        self._labels = {}       # normalized tag -> display spelling
+        self._book_tags = {}    # book_id -> set of normalized tags
+        self._sorted_tags = []  # normalized tags, kept sorted for prefix search
+        for book in books:
+            self.add_book(book)
+
+    def add_book(self, book):
+        """Indexes a book, replacing whatever tags it had before."""
+        book_id = book['book_id']
+        with self._lock:
+            self._remove_locked(book_id)
+            tags = set()
+            for raw in book.get('tags') or []:
+                tag = normalize_tag(raw)
+                if not tag:
+                    continue
+                tags.add(tag)
+                if tag not in self._postings:
+                    self._postings[tag] = set()
+                    self._labels[tag] = str(raw).strip()
+                    bisect.insort(self._sorted_tags, tag)
+                self._postings[tag].add(book_id)
+            self._book_tags[book_id] = tags
+
+    def remove_book(self, book_id):
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def _remove_locked(self, book_id):
+        for tag in self._book_tags.pop(book_id, ()):
+            postings = self._postings[tag]
+            postings.discard(book_id)
+            if not postings:
+                del self._postings[tag]
+                del self._labels[tag]
+                del self._sorted_tags[bisect.bisect_left(self._sorted_tags, tag)]
+
+    def lookup(self, tag):
+        """Returns the set of book_ids carrying exactly this tag."""
+        with self._lock:
+            return set(self._postings.get(normalize_tag(tag), ()))
+
+    def tags_with_prefix(self, prefix, limit=None):
+        """Returns display labels of the tags starting with `prefix`, in order."""
+        prefix = normalize_tag(prefix)
+        with self._lock:
+            start = bisect.bisect_left(self._sorted_tags, prefix)
+            labels = []
+            for tag in self._sorted_tags[start:]:
+                if not tag.startswith(prefix) or (limit is not None and len(labels) >= limit):
+                    break
+                labels.append(self._labels[tag])
+            return labels
+
+    def query(self, tags, mode='and', prefix=False):
+        """
+        Returns the book_ids matching all (mode='and') or any (mode='or') of
+        `tags`. With `prefix`, each term matches every tag starting with it.
+        """
+        if mode not in ('and', 'or'):
+            raise ValueError("Invalid mode. Use 'and' or 'or'.")
+        result = None
+        for term in tags:
+            if prefix:
+                matches = set()
+                for label in self.tags_with_prefix(term):
+                    matches |= self.lookup(label)
+            else:
+                matches = self.lookup(term)
+            if result is None:
+                result = matches
+            elif mode == 'and':
+                result &= matches
+            else:
+                result |= matches
+        return result or set()
+
+    def counts(self):
+        """Returns {display label: number of books} for every tag."""
+        with self._lock:
+            return {self._labels[tag]: len(ids) for tag, ids in self._postings.items()}
+
+
+# --- Per-user indexes, rebuilt from the library cache on a miss ---
+_indexes = PerUserIndexes(
+    lambda user_id: TagIndex(db.get_user_books(user_id).values()),
+    maxsize=int(os.getenv('LIBRARY_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('LIBRARY_CACHE_TTL', '300'))
+)
+
+
+def get_tag_index(user_id):
+    return _indexes.get(user_id)
+
+
+change_feed.register_handler('tag_index', _indexes.apply)
@@ -0,0 +1,97 @@
+import os
+import sys
+import threading
+
+import pytest
+
+# The modules live at the project root and connect to DynamoDB on import,
+# so point them at moto's fake region and credentials before they load.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+# BooksTable GSIs: name -> [(attribute, type, key type)].
+INDEXES = {
+    'TitleAuthorIndex': [('user_id', 'S', 'HASH'), ('title_author_key', 'S', 'RANGE')],
+    'UserRatingIndex': [('user_id', 'S', 'HASH'), ('rating_key', 'N', 'RANGE')],
+    'UserGenreIndex': [('user_genre', 'S', 'HASH')],
+    'UserStatusIndex': [('user_status', 'S', 'HASH')],
+    'UserActiveIndex': [('active_user_id', 'S', 'HASH')],
+    'UserArchiveIndex': [('archived_user_id', 'S', 'HASH'), ('archived_date', 'S', 'RANGE')],
+}
+
+
+def create_books_table(client, indexes=()):
+    attributes = {'user_id': 'S', 'book_id': 'S'}
+    kwargs = {}
+    if indexes:
+        kwargs['GlobalSecondaryIndexes'] = []
+        for name in indexes:
+            for attribute, attribute_type, _ in INDEXES[name]:
+                attributes[attribute] = attribute_type
+            kwargs['GlobalSecondaryIndexes'].append({
+                'IndexName': name,
+                'KeySchema': [{'AttributeName': a, 'KeyType': k} for a, _, k in INDEXES[name]],
+                'Projection': {'ProjectionType': 'ALL'},
+            })
+    client.create_table(
+        TableName='BooksTable',
+        KeySchema=[
+            {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'book_id', 'KeyType': 'RANGE'},
+        ],
+        AttributeDefinitions=[{'AttributeName': a, 'AttributeType': t} for a, t in attributes.items()],
+        BillingMode='PAY_PER_REQUEST',
+        **kwargs
+    )
+
+
+def create_simple_table(client, name, key):
+    client.create_table(
+        TableName=name,
+        KeySchema=[{'AttributeName': key, 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST',
+    )
+
+
+@pytest.fixture
+def mock_db():
+    """
+    Returns start(indexes=()), which creates the app's tables in moto's
+    DynamoDB (BooksTable with the named GSIs) and returns the database
+    module bound to them. The change feed is unhooked meanwhile; caches
+    and listeners are restored afterwards.
+    """
+    import boto3
+    from moto import mock_aws
+
+    with mock_aws():
+        import database
+        import change_feed
+        listeners = list(database._book_listeners), list(database._book_batch_listeners)
+        # Tests feed handlers themselves; the process-wide poller would
+        # otherwise reach DynamoDB after the mock has stopped.
+        if change_feed._on_book_changes in database._book_batch_listeners:
+            database._book_batch_listeners.remove(change_feed._on_book_changes)
+
+        def start(indexes=()):
+            client = boto3.client('dynamodb', region_name='us-east-1')
+            create_books_table(client, indexes)
+            create_simple_table(client, 'UsersTable', 'email')
+            create_simple_table(client, 'CountersTable', 'counter_name')
+            create_simple_table(client, 'UserStatsTable', 'user_id')
+
+            import dynamo_client
+            # The table handles resolve per call, so dropping the session,
+            # client and this thread's resource points them at this mock.
+            dynamo_client._session = dynamo_client._client = None
+            dynamo_client._local = threading.local()
+            database.library_cache.clear()
+            return database
+
+        yield start
+        database.library_cache.clear()
+        database._book_listeners[:], database._book_batch_listeners[:] = listeners
@@ -0,0 +1,126 @@
+"""
+Archiving: the sparse archive index attributes, archived-book paging, the
+archive-keys backfill, and how the library lookups treat archived books
+through their indexes and their fallbacks, against moto's DynamoDB.
+"""
+import pytest
+
+LOOKUP_INDEXES = ['UserGenreIndex', 'UserRatingIndex', 'UserStatusIndex', 'TitleAuthorIndex']
+
+
+def _book(n, user_id='US001', **fields):
+    return {
+        'user_id': user_id, 'book_id': f"BS_{user_id}_{n:03d}", 'title': f"Book {n}", 'author': 'Author',
+        'genre': 'Fantasy', 'status': 'Completed', 'rating': 4, **fields,
+    }
+
+
+@pytest.fixture(params=[True, False], ids=['gsi', 'fallback'])
+def library(request, mock_db):
+    """Three books, one of them archived."""
+    database = mock_db(LOOKUP_INDEXES if request.param else [])
+    for n in range(3):
+        database.save_book(_book(n))
+    database.update_book('US001', 'BS_US001_001', set_fields={'archived': True})
+    database.library_cache.clear()
+    return database
+
+
+def _ids(books):
+    return sorted(b['book_id'] for b in books)
+
+
+def test_lookups_return_active_books_only(library):
+    active = ['BS_US001_000', 'BS_US001_002']
+    assert _ids(library.query_books_by_genre('Fantasy', 'US001')) == active
+    assert _ids(library.query_books_by_status('Completed', 'US001')) == active
+    assert _ids(library.query_books_by_rating(4, 'US001', comparison='eq')) == active
+
+    library.update_book('US001', 'BS_US001_001', remove_fields=['archived'])
+    library.library_cache.clear()
+    assert len(library.query_books_by_genre('Fantasy', 'US001')) == 3
+
+
+def test_duplicate_check_includes_archived_books(library):
+    found = library.find_book_by_title_author('US001', 'Book 1', 'Author')
+    assert found is not None and found['book_id'] == 'BS_US001_001'
+    assert library.find_book_by_title_author('US001', 'Book 9', 'Author') is None
+
+
+def _stored(database, book_id, user_id='US001'):
+    return database.books_table.get_item(Key={'user_id': user_id, 'book_id': book_id})['Item']
+
+
+def test_update_kwargs_swaps_archive_attributes(mock_db):
+    db = mock_db()
+    kwargs, set_fields, remove_fields = db._update_kwargs('US001', 'BS_US001_000', set_fields={'archived': True})
+    assert set_fields['archived_user_id'] == 'US001' and set_fields['archived_date']
+    assert 'active_user_id' in remove_fields
+
+    _, set_fields, remove_fields = db._update_kwargs('US001', 'BS_US001_000', remove_fields=['archived'])
+    assert set_fields == {'active_user_id': 'US001'}
+    assert remove_fields == ['archived', 'archived_user_id']
+
+    _, set_fields, remove_fields = db._update_kwargs('US001', 'BS_US001_000', set_fields={'archived': False})
+    assert set_fields['active_user_id'] == 'US001' and 'archived_date' not in set_fields
+    assert 'archived_user_id' in remove_fields
+
+    # Unrelated edits leave the archive attributes alone.
+    _, set_fields, remove_fields = db._update_kwargs('US001', 'BS_US001_000', set_fields={'title': 'New'})
+    assert not {'active_user_id', 'archived_user_id'} & (set(set_fields) | set(remove_fields))
+
+    db.save_book(_book(0))
+    assert _stored(db, 'BS_US001_000')['active_user_id'] == 'US001'
+    db.update_book('US001', 'BS_US001_000', set_fields={'archived': True, 'archived_date': '2024-05-01 10:00:00'})
+    stored = _stored(db, 'BS_US001_000')
+    assert stored['archived_user_id'] == 'US001' and 'active_user_id' not in stored
+    assert stored['archived_date'] == '2024-05-01 10:00:00'
+    db.update_book('US001', 'BS_US001_000', remove_fields=['archived'])
+    stored = _stored(db, 'BS_US001_000')
+    assert stored['active_user_id'] == 'US001' and 'archived_user_id' not in stored
+
+
+@pytest.mark.parametrize('indexed', [True, False], ids=['index', 'fallback'])
+def test_archived_books_page_through_in_full(mock_db, indexed):
+    db = mock_db(['UserArchiveIndex'] if indexed else [])
+    for n in range(25):
+        db.save_book(_book(n, archived=n % 5 != 0, archived_date=f"2024-05-{n + 1:02d} 10:00:00"))
+    db.save_book(_book(0, user_id='US002', archived=True, archived_date='2024-06-01 10:00:00'))
+
+    pages, start_key = [], None
+    while True:
+        books, start_key = db.get_archived_books('US001', limit=7, start_key=start_key)
+        pages.append(books)
+        if start_key is None:
+            break
+
+    archived = [b for page in pages for b in page]
+    assert len(archived) == 20 and len(set(_ids(archived))) == 20
+    assert all(b['archived'] and b['user_id'] == 'US001' for b in archived)
+    if indexed:
+        # The index is sorted by archived_date, newest first.
+        assert [len(page) for page in pages[:3]] == [7, 7, 6]
+        dates = [b['archived_date'] for b in archived]
+        assert dates == sorted(dates, reverse=True)
+
+
+def test_backfill_archive_keys(mock_db):
+    db = mock_db(['UserActiveIndex', 'UserArchiveIndex'])
+    with db.books_table.batch_writer() as batch:
+        batch.put_item(Item=_book(0))
+        batch.put_item(Item=_book(1, archived=True, archived_date='2024-05-01 10:00:00'))
+        batch.put_item(Item=_book(2, archived=True))
+        # Left over from before the sparse indexes: both keys present.
+        batch.put_item(Item=_book(3, active_user_id='US001', archived_user_id='US001'))
+
+    import migrations
+    assert migrations.backfill_archive_keys() == 4
+    assert migrations.backfill_archive_keys() == 0
+
+    assert _stored(db, 'BS_US001_000')['active_user_id'] == 'US001'
+    assert _stored(db, 'BS_US001_001')['archived_date'] == '2024-05-01 10:00:00'
+    assert _stored(db, 'BS_US001_002')['archived_date']
+    assert 'archived_user_id' not in _stored(db, 'BS_US001_003')
+    db.library_cache.clear()
+    assert _ids(db.fetch_all_user_books('US001', max_items=None)) == ['BS_US001_000', 'BS_US001_003']
+    assert _ids(db.get_archived_books('US001')[0]) == ['BS_US001_001', 'BS_US001_002']
@@ -0,0 +1,50 @@
+"""
+The dashboard/report DataFrame: typed columns, timestamp parsing and the
+vectorized row formatting.
+"""
+import numpy as np
+import pandas as pd
+
+import book_frame
+
+
+def test_typed_columns_sorted_oldest_first():
+    df = book_frame.books_to_frame([
+        {'title': 'B', 'genre': 'Horror', 'rating': '4.46', 'status': 'Completed', 'timestamp': '2024-06-01 09:00:00'},
+        {'title': 'A', 'genre': 'Fantasy', 'rating': '', 'status': 'Reading', 'timestamp': '2024-05-01 09:00:00'},
+        {'genre': 'Fantasy'},
+    ])
+    assert list(df.columns) == book_frame.FRAME_COLUMNS
+    assert list(df['title']) == ['A', 'B', 'Untitled']
+    assert isinstance(df['genre'].dtype, pd.CategoricalDtype)
+    assert list(df['status']) == ['reading', 'completed', 'unknown']
+    assert df['rating'].dtype == np.float32
+    assert np.isnan(df['rating'][0]) and df['rating'][1] == np.float32(4.5)
+    assert pd.api.types.is_datetime64_dtype(df['timestamp'])
+    assert pd.isna(df['timestamp'][2])
+
+
+def test_timestamps_in_other_shapes_are_kept(capsys):
+    values = pd.Series([
+        '2024-05-01 10:00:00', '2024-06-02', '2024-07-03T08:30:00',
+        '2024-08-04T08:30:00+02:00', 'someday', '', None,
+    ], dtype=object)
+
+    parsed = book_frame.parse_timestamps(values)
+
+    assert list(parsed[:4]) == [
+        pd.Timestamp('2024-05-01 10:00:00'), pd.Timestamp('2024-06-02'),
+        pd.Timestamp('2024-07-03 08:30:00'), pd.Timestamp('2024-08-04 06:30:00'),
+    ]
+    assert parsed[4:].isna().all()
+    # Only the value that was there but unreadable is reported.
+    assert "1 timestamp(s) could not be parsed" in capsys.readouterr().out
+
+
+def test_formatting_helpers():
+    df = book_frame.books_to_frame([
+        {'title': 'A', 'rating': 3, 'timestamp': '2024-05-01 10:00:00'},
+        {'title': 'B', 'rating': '', 'timestamp': 'bad'},
+    ])
+    assert list(book_frame.format_ratings(df['rating'])) == ['3.0', '']
+    assert list(book_frame.format_dates(df['timestamp'])) == ['2024-05-01', '']
@@ -0,0 +1,123 @@
+"""
+Bulk updates and deletes (update_books / delete_books): chunking, old
+images read from the table, cache patching and listener payloads, against
+moto's DynamoDB.
+"""
+import pytest
+
+
+@pytest.fixture
+def db(mock_db):
+    database = mock_db(['UserActiveIndex', 'UserArchiveIndex'])
+    database.changes = []
+    database.add_book_batch_listener(database.changes.extend)
+    return database
+
+
+def _fill(database, user_id, count, **fields):
+    books = []
+    with database.books_table.batch_writer() as batch:
+        for n in range(count):
+            book = {
+                'user_id': user_id,
+                'book_id': f"BS_{user_id}_{n:03d}",
+                'title': f"Book {n}",
+                'author': 'Author',
+                'genre': 'Fantasy',
+                'status': 'Reading',
+                **fields,
+            }
+            database._add_derived_keys(book)
+            batch.put_item(Item=book)
+            books.append(book)
+    return books
+
+
+def _count_calls(monkeypatch, client, name):
+    calls = []
+    original = getattr(client, name)
+
+    def counted(**kwargs):
+        calls.append(kwargs)
+        return original(**kwargs)
+    monkeypatch.setattr(client, name, counted)
+    return calls
+
+
+def test_update_books_chunks_and_skips_missing_ids(db, monkeypatch):
+    _fill(db, 'US001', 60)
+    calls = _count_calls(monkeypatch, db.books_table.meta.client, 'transact_write_items')
+    changes = [(f"BS_US001_{n:03d}", {'status': 'Completed'}, None) for n in range(60)]
+    changes.append(('BS_US001_999', {'status': 'Completed'}, None))
+
+    updated = db.update_books('US001', changes)
+
+    assert [len(call['TransactItems']) for call in calls] == [25, 25, 10]
+    assert len(updated) == 60
+    stored = db.books_table.get_item(Key={'user_id': 'US001', 'book_id': 'BS_US001_042'})['Item']
+    assert stored['status'] == 'Completed'
+    assert stored['user_status'] == 'US001#Completed'
+    assert 'Item' not in db.books_table.get_item(Key={'user_id': 'US001', 'book_id': 'BS_US001_999'})
+
+
+def test_update_books_merges_repeated_ids(db):
+    _fill(db, 'US001', 1, rating=3)
+    db.update_books('US001', [
+        ('BS_US001_000', {'status': 'Completed', 'rating': 4}, None),
+        ('BS_US001_000', {'pages_read': 10}, ['rating']),
+    ])
+    stored = db.books_table.get_item(Key={'user_id': 'US001', 'book_id': 'BS_US001_000'})['Item']
+    assert stored['status'] == 'Completed'
+    assert stored['pages_read'] == 10
+    assert 'rating' not in stored and 'rating_key' not in stored
+
+
+def test_update_books_patches_cache_without_rereading(db, monkeypatch):
+    _fill(db, 'US001', 3)
+    assert len(db.get_user_books('US001')) == 3
+    queries = _count_calls(monkeypatch, db.books_table, 'query')
+
+    db.update_books('US001', [
+        ('BS_US001_000', {'status': 'Completed'}, None),
+        ('BS_US001_001', {'archived': True}, None),
+    ])
+
+    library = db.get_user_books('US001')
+    assert queries == []
+    assert library['BS_US001_000']['status'] == 'Completed'
+    assert library['BS_US001_000']['title'] == 'Book 0'
+    assert 'BS_US001_001' not in library
+    assert set(library) == {'BS_US001_000', 'BS_US001_002'}
+
+
+def test_update_books_sends_stored_old_images(db):
+    # The cache only holds active books, so the archived book is read from the table.
+    _fill(db, 'US001', 1)
+    _fill(db, 'US002', 1, archived=True, archived_date='2024-01-01 00:00:00')
+    db.get_user_books('US002')
+
+    db.update_books('US002', [('BS_US002_000', {'archived': False}, None)])
+
+    [(user_id, book_id, old_book, new_book)] = db.changes
+    assert (user_id, book_id) == ('US002', 'BS_US002_000')
+    assert old_book['archived'] is True and old_book['title'] == 'Book 0'
+    assert new_book['title'] == 'Book 0' and new_book['archived'] is False
+    assert new_book['active_user_id'] == 'US002' and 'archived_user_id' not in new_book
+    assert 'BS_US002_000' in db.get_user_books('US002')
+
+
+def test_delete_books_notifies_with_stored_books(db):
+    _fill(db, 'US001', 30)
+    db.update_books('US001', [('BS_US001_029', {'archived': True}, None)])
+    assert len(db.get_user_books('US001')) == 29
+    db.changes.clear()
+
+    deleted = db.delete_books('US001', ['BS_US001_000', 'BS_US001_029', 'BS_US001_000', 'BS_US001_999'])
+
+    assert deleted == 2
+    assert sorted((c[1], c[3]) for c in db.changes) == [('BS_US001_000', None), ('BS_US001_029', None)]
+    old_books = {c[1]: c[2] for c in db.changes}
+    assert old_books['BS_US001_029']['archived'] is True
+    assert old_books['BS_US001_000']['title'] == 'Book 0'
+    assert len(db.get_user_books('US001')) == 28
+    assert db.books_table.get_item(Key={'user_id': 'US001', 'book_id': 'BS_US001_029'}).get('Item') is None
@@ -0,0 +1,143 @@
+"""
+Change-feed processing against an in-memory LocalStream: checkpoint
+skipping, retries, dead-lettering, replay and the background poller.
+"""
+import json
+import threading
+
+import pytest
+
+import change_feed
+from change_feed import ChangeFeedProcessor, CheckpointStore, LocalStream, StreamPoller
+
+
+def _stream(count, user_id='US001'):
+    stream = LocalStream()
+    for n in range(count):
+        stream.publish(user_id, f"BS_{user_id}_{n:03d}", None, {'user_id': user_id, 'book_id': f"BS_{user_id}_{n:03d}"})
+    return stream
+
+
+class Recorder:
+    """A handler that records the sequences it saw and can fail on demand."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("handler down")
+        self.batches.append([event.sequence for event in events])
+
+    @property
+    def sequences(self):
+        return [sequence for batch in self.batches for sequence in batch]
+
+
+@pytest.fixture(autouse=True)
+def dead_letter_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(change_feed, 'DEAD_LETTER_DIR', str(tmp_path / 'dead_letter'))
+    return tmp_path / 'dead_letter'
+
+
+def test_records_before_the_checkpoint_are_skipped():
+    checkpoints = CheckpointStore()
+    checkpoints.set('counter', 2)
+    handler = Recorder()
+    processor = ChangeFeedProcessor(handlers={'counter': handler}, checkpoints=checkpoints, batch_size=2)
+    stream = _stream(5)
+
+    assert processor.poll(stream)
+    assert handler.batches == [[3, 4], [5]]
+    assert checkpoints.get('counter') == 5
+    # Replaying the same records is a no-op once they are checkpointed.
+    processor.process_records(_stream(5).read())
+    assert handler.sequences == [3, 4, 5]
+    assert stream.read() == []
+
+
+def test_failed_batch_is_retried_and_others_carry_on():
+    failing, healthy = Recorder(failures=1), Recorder()
+    processor = ChangeFeedProcessor(handlers={'failing': failing, 'healthy': healthy})
+    stream = _stream(3)
+
+    assert not processor.poll(stream)
+    assert healthy.sequences == [1, 2, 3]
+    assert processor.checkpoints.get('failing') == 0
+    # Nothing is trimmed until the failing handler has the records too.
+    assert len(stream.read()) == 3
+
+    assert processor.poll(stream)
+    assert failing.sequences == [1, 2, 3]
+    assert healthy.sequences == [1, 2, 3]
+    assert stream.read() == []
+
+
+def test_batch_is_dead_lettered_after_max_attempts(dead_letter_dir):
+    failing = Recorder(failures=change_feed.MAX_ATTEMPTS)
+    processor = ChangeFeedProcessor(handlers={'failing': failing})
+    stream = _stream(3)
+
+    for _ in range(change_feed.MAX_ATTEMPTS - 1):
+        assert not processor.poll(stream)
+    assert not (dead_letter_dir / 'failing.jsonl').exists()
+    assert processor.poll(stream)
+
+    lines = (dead_letter_dir / 'failing.jsonl').read_text().splitlines()
+    assert [int(json.loads(line)['dynamodb']['SequenceNumber']) for line in lines] == [1, 2, 3]
+    assert processor.checkpoints.get('failing') == 3
+    assert failing.sequences == []
+    assert stream.read() == []
+
+
+def test_backlog_over_the_cap_is_dead_lettered(dead_letter_dir, monkeypatch):
+    monkeypatch.setattr(change_feed, 'MAX_BACKLOG', 4)
+    handler = Recorder()
+    processor = ChangeFeedProcessor(handlers={'slow': handler})
+
+    processor.poll(_stream(10))
+
+    assert handler.sequences == [7, 8, 9, 10]
+    lines = (dead_letter_dir / 'slow.jsonl').read_text().splitlines()
+    assert len(lines) == 6
+
+
+def test_dead_letter_file_replays_into_one_handler(dead_letter_dir, tmp_path):
+    failing = Recorder(failures=change_feed.MAX_ATTEMPTS)
+    processor = ChangeFeedProcessor(handlers={'failing': failing})
+    stream = _stream(2)
+    for _ in range(change_feed.MAX_ATTEMPTS):
+        processor.poll(stream)
+
+    fixed = Recorder()
+    checkpoint_path = tmp_path / 'checkpoints.json'
+    result = change_feed.replay(str(dead_letter_dir / 'failing.jsonl'), str(checkpoint_path), {'failing': fixed})
+
+    assert fixed.sequences == [1, 2]
+    assert result.low_watermark() == 2
+    assert json.loads(checkpoint_path.read_text()) == {'failing': 2}
+    # Replaying again with the saved checkpoints applies nothing twice.
+    change_feed.replay(str(dead_letter_dir / 'failing.jsonl'), str(checkpoint_path), {'failing': fixed})
+    assert fixed.sequences == [1, 2]
+
+
+def test_poller_processes_off_the_writer_thread():
+    release, seen = threading.Event(), threading.Event()
+    threads = []
+
+    def slow_handler(events):
+        threads.append(threading.current_thread())
+        release.wait(5)
+        seen.set()
+
+    stream = LocalStream()
+    poller = StreamPoller(stream, ChangeFeedProcessor(handlers={'slow': slow_handler}), interval=0)
+    stream.publish('US001', 'BS_US001_001', None, {'user_id': 'US001', 'book_id': 'BS_US001_001'})
+    # notify() returns while the handler is still blocked.
+    poller.notify()
+    assert not seen.is_set()
+    release.set()
+    assert seen.wait(5)
+    assert threads and threads[0] is not threading.current_thread()
@@ -0,0 +1,162 @@
+"""
+The collaborative filtering job: a full build, an incremental update
+folded in from the pending queue (including queues left by a crashed
+run), and serving neighbours from missing or partial index files.
+"""
+import glob
+import json
+import os
+
+import pytest
+
+pytest.importorskip('scipy')
+
+import collab_filter  # noqa: E402
+from change_feed import ChangeEvent  # noqa: E402
+
+LIBRARIES = {
+    'US001': [('Dune', 5), ('Hyperion', 4), ('Foundation', 4)],
+    'US002': [('Dune', 4), ('Hyperion', 5)],
+    'US003': [('Dune', 3), ('Foundation', '')],
+    'US004': [('Emma', 5), ('Persuasion', 4)],
+}
+
+
+@pytest.fixture
+def db(mock_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(collab_filter, 'CF_INDEX_DIR', str(tmp_path / 'cf'))
+    monkeypatch.setattr(collab_filter, '_index', None)
+    database = mock_db()
+    for user_id, books in LIBRARIES.items():
+        for n, (title, rating) in enumerate(books):
+            _save(database, user_id, n, title, rating)
+    return database
+
+
+def _save(database, user_id, n, title, rating=4):
+    database.save_book({
+        'user_id': user_id, 'book_id': f"BS_{user_id}_{n:03d}", 'title': title,
+        'author': f"{title} Author", 'genre': 'Fiction', 'rating': rating,
+    })
+
+
+def _queue(*user_ids):
+    collab_filter.handle_changes([ChangeEvent(f"local-{u}", 'MODIFY', u, 'BS', None, None, 1) for u in user_ids])
+
+
+def _titles(books):
+    return [b['title'] for b in books]
+
+
+def _neighbours():
+    """Every book's neighbour list as {title: {neighbour title: score}}."""
+    import numpy as np
+    index_dir = collab_filter.CF_INDEX_DIR
+    with open(os.path.join(index_dir, 'items.json')) as f:
+        items = json.load(f)
+    neighbors = np.load(os.path.join(index_dir, 'neighbors.npy'))
+    scores = np.load(os.path.join(index_dir, 'scores.npy'))
+    return {
+        items[i]['title']: {items[n]['title']: round(float(s), 5) for n, s in zip(neighbors[i], scores[i]) if n >= 0}
+        for i in range(len(items))
+    }
+
+
+def test_build_serves_co_read_books(db):
+    assert collab_filter.build() == (4, 5)
+
+    # Hyperion and Foundation are both read alongside Dune; owned books are skipped.
+    assert set(_titles(collab_filter.similar_books([{'title': 'Dune', 'author': 'Dune Author', 'rating': 5}]))) \
+        == {'Hyperion', 'Foundation'}
+    reader = [{'title': 'Dune', 'author': 'Dune Author'}, {'title': 'Hyperion', 'author': 'Hyperion Author'}]
+    assert _titles(collab_filter.similar_books(reader)) == ['Foundation']
+    assert collab_filter.similar_books([{'title': 'Emma', 'author': 'Emma Author'}]) == [
+        {'title': 'Persuasion', 'author': 'Persuasion Author', 'genre': 'Fiction'}]
+    assert collab_filter.similar_books([{'title': 'Unknown', 'author': 'Nobody'}]) == []
+
+
+def test_update_after_a_delta_matches_a_rebuild(db, tmp_path, monkeypatch):
+    collab_filter.build()
+    # US004 starts reading Dune, US002 drops Hyperion, and a new user appears.
+    _save(db, 'US004', 2, 'Dune', 5)
+    db.delete_book('US002', 'BS_US002_001')
+    _save(db, 'US005', 0, 'Emma', 3)
+    _save(db, 'US005', 1, 'Hyperion', 2)
+    _queue('US004', 'US002', 'US005')
+
+    assert collab_filter.update()[0] == 3
+    assert not os.path.exists(collab_filter._path(collab_filter.PENDING_FILE))
+    updated = _neighbours()
+
+    monkeypatch.setattr(collab_filter, 'CF_INDEX_DIR', str(tmp_path / 'rebuilt'))
+    collab_filter.build()
+    assert updated == _neighbours()
+
+
+def test_update_with_nothing_queued_is_a_no_op(db):
+    collab_filter.build()
+    assert collab_filter.update() == (0, 0)
+
+
+def test_update_without_an_index_builds_one(db):
+    assert collab_filter.update() == (4, 5)
+
+
+def test_update_recovers_queues_left_by_a_crashed_run(db):
+    collab_filter.build()
+    _save(db, 'US003', 2, 'Hyperion', 5)
+    _save(db, 'US004', 2, 'Foundation', 5)
+    # A run that claimed US003 and died before finishing, plus a fresh queue.
+    _queue('US003')
+    pending = collab_filter._path(collab_filter.PENDING_FILE)
+    os.replace(pending, f"{pending}.999.1.processing")
+    _queue('US004')
+
+    assert collab_filter.update()[0] == 2
+    assert glob.glob(f"{pending}*") == []
+    assert 'Foundation' in _titles(collab_filter.similar_books([{'title': 'Emma', 'author': 'Emma Author'}]))
+
+
+def test_similar_books_without_an_index(db):
+    assert collab_filter.similar_books([{'title': 'Dune', 'author': 'Dune Author'}]) == []
+
+
+def test_similar_books_with_partial_index_files(db, capsys):
+    collab_filter.build()
+    dune = [{'title': 'Dune', 'author': 'Dune Author'}]
+    good = collab_filter.similar_books(dune)
+
+    # A truncated neighbour file keeps the last good index in service.
+    path = collab_filter._path('neighbors.npy')
+    with open(path, 'rb') as f:
+        head = f.read(40)
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(head)
+    os.replace(f"{path}.tmp", path)
+    os.utime(path, (1, 1))
+    assert collab_filter.similar_books(dune) == good
+    assert "Could not load" in capsys.readouterr().out
+
+    # With nothing loaded before, it serves nothing rather than failing.
+    collab_filter._index = None
+    assert collab_filter.similar_books(dune) == []
+    collab_filter.build()
+    os.remove(collab_filter._path('items.json'))
+    os.utime(collab_filter._path('neighbors.npy'), (2, 2))
+    collab_filter._index = None
+    assert collab_filter.similar_books(dune) == []
+
+
+def test_similar_books_skips_neighbours_past_the_item_list(db):
+    collab_filter.build()
+    # Neighbour arrays from a newer run than items.json: the books they
+    # point to past the end of the item list are left out.
+    with open(collab_filter._path('items.json')) as f:
+        items = json.load(f)
+    dune = next(i for i, item in enumerate(items) if item['title'] == 'Dune')
+    kept = items[:dune + 1]
+    with open(collab_filter._path('items.json'), 'w') as f:
+        json.dump(kept, f)
+
+    results = collab_filter.similar_books([{'title': 'Dune', 'author': 'Dune Author'}])
+    assert set(_titles(results)) <= {item['title'] for item in kept} - {'Dune'}
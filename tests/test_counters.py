@@ -0,0 +1,81 @@
+"""
+Atomic ID allocation (CounterAllocator and the user/book ID generators):
+seeding, block reservation and concurrent use, against moto's DynamoDB.
+"""
+import threading
+
+import pytest
+
+from counters import CounterAllocator, CounterNotSeededError
+
+
+@pytest.fixture
+def db(mock_db):
+    return mock_db()
+
+
+def test_unseeded_counter_raises_until_seeded(db):
+    counter = CounterAllocator(db.counters_table, 'test')
+    with pytest.raises(CounterNotSeededError):
+        counter.next_value()
+    counter.seed(41)
+    # A second seed (another process racing the first) changes nothing.
+    counter.seed(0)
+    assert counter.next_value() == 42
+    assert counter.reserve(3) == (43, 45)
+
+
+def test_user_ids_are_seeded_from_a_scan_once(db, monkeypatch):
+    for n in (3, 12, 7):
+        db.save_user(f"US{n:03d}", 'Reader', f"reader{n}@example.com", 'hash')
+    db.save_user('U_legacy', 'Reader', 'legacy@example.com', 'hash')
+    monkeypatch.setattr(db, 'user_id_counter', CounterAllocator(db.counters_table, 'user_id'))
+    scans = []
+    scan = db._max_user_id_from_scan
+    monkeypatch.setattr(db, '_max_user_id_from_scan', lambda: scans.append(1) or scan())
+
+    assert db.generate_next_user_id() == 'US013'
+    assert db.generate_next_user_id() == 'US014'
+    assert len(scans) == 1
+
+
+def test_book_ids_continue_after_existing_books(db):
+    with db.books_table.batch_writer() as batch:
+        for book_id in ('BS_US001_002', 'BS_US001_009', 'BS_US001_bad'):
+            batch.put_item(Item={'user_id': 'US001', 'book_id': book_id})
+    assert db.generate_next_book_id('US001') == 'BS_US001_010'
+    assert db.reserve_book_ids('US001', 3) == ['BS_US001_011', 'BS_US001_012', 'BS_US001_013']
+    assert db.generate_next_book_id('US002') == 'BS_US002_001'
+
+
+def test_blocks_are_served_from_memory(db, monkeypatch):
+    CounterAllocator(db.counters_table, 'blocks').seed(0)
+    first = CounterAllocator(db.counters_table, 'blocks', block_size=10)
+    second = CounterAllocator(db.counters_table, 'blocks', block_size=10)
+    calls = []
+    reserve = first.reserve
+    monkeypatch.setattr(first, 'reserve', lambda count: calls.append(count) or reserve(count))
+
+    assert [first.next_value() for _ in range(12)] == list(range(1, 13))
+    assert calls == [10, 10]
+    # The other process's block starts after everything `first` reserved.
+    assert second.next_value() == 21
+
+
+def test_concurrent_allocation_never_repeats(db):
+    CounterAllocator(db.counters_table, 'shared').seed(0)
+    shared = CounterAllocator(db.counters_table, 'shared', block_size=5)
+    values, lock = [], threading.Lock()
+
+    def allocate():
+        got = [shared.next_value() for _ in range(20)]
+        with lock:
+            values.extend(got)
+
+    threads = [threading.Thread(target=allocate) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(values) == list(range(1, 161))
@@ -0,0 +1,36 @@
+"""
+The shared DynamoDB connection: one low-level client for every thread,
+and table handles that resolve to a per-thread resource.
+"""
+import threading
+
+import dynamo_client
+
+
+def _in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_client_is_shared_and_resources_are_per_thread(mock_db):
+    mock_db()
+    assert _in_thread(dynamo_client.get_client) is dynamo_client.get_client()
+    assert _in_thread(dynamo_client.get_resource) is not dynamo_client.get_resource()
+
+    table = dynamo_client.get_table('UsersTable')
+    table.put_item(Item={'email': 'reader@example.com', 'name': 'Reader'})
+    # The same handle works from another thread, through that thread's resource.
+    item = _in_thread(lambda: table.get_item(Key={'email': 'reader@example.com'})['Item'])
+    assert item['name'] == 'Reader'
+
+
+def test_get_user_reads_through_the_low_level_client(mock_db):
+    db = mock_db()
+    db.save_user('US001', 'Reader', 'reader@example.com', 'hash')
+    assert db.get_user('reader@example.com') == {
+        'email': 'reader@example.com', 'user_id': 'US001', 'name': 'Reader', 'password': 'hash'
+    }
+    assert db.get_user('nobody@example.com') == {}
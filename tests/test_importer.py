@@ -0,0 +1,117 @@
+"""
+Bulk import: mapping CSV, Goodreads and JSON-lines rows to books, date
+handling, and de-duplication against the library and within the file.
+"""
+import io
+import json
+
+import pytest
+
+import importer
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024-05-01 10:30:00', '2024-05-01 10:30:00'),
+    ('2024-05-01', '2024-05-01 00:00:00'),
+    ('2024/05/01', '2024-05-01 00:00:00'),
+    ('01/05/2024', '2024-05-01 00:00:00'),
+    ('2024-05-01T10:30:00', '2024-05-01 10:30:00'),
+    ('2024-05-01T10:30:00+02:00', '2024-05-01 08:30:00'),
+    ('  2024-05-01  ', '2024-05-01 00:00:00'),
+    ('last spring', ''),
+    ('', ''),
+    (None, ''),
+])
+def test_timestamp(value, expected):
+    assert importer._timestamp(value) == expected
+
+
+def test_csv_row():
+    book = importer.to_book({
+        'Title': ' Dune ', 'Author': 'Frank Herbert', 'Genre': 'Science Fiction', 'Rating': '4.0',
+        'Status': 'COMPLETED', 'Tags': 'classic, desert,', 'Date': '2024-05-01', 'Total Pages': '412',
+    }, 'csv')
+    assert book == {
+        'title': 'Dune', 'author': 'Frank Herbert', 'genre': 'Science Fiction', 'rating': 4,
+        'status': 'Completed', 'tags': ['classic', 'desert'], 'timestamp': '2024-05-01 00:00:00',
+        'total_pages': 412, 'pages_read': 0,
+    }
+
+
+def test_goodreads_row():
+    book = importer.to_book({
+        'Title': 'Emma', 'Author': 'Jane Austen', 'My Rating': '5', 'Exclusive Shelf': 'read',
+        'Bookshelves': 'read, classics', 'Date Read': '', 'Date Added': '2023/01/15', 'Number of Pages': '474',
+    }, 'goodreads')
+    assert book['status'] == 'Completed' and book['rating'] == 5 and book['genre'] == 'Unknown'
+    assert book['tags'] == ['classics']
+    # Date Read is empty, so the date the book was shelved is used.
+    assert book['timestamp'] == '2023-01-15 00:00:00'
+    assert book['pages_read'] == 474
+
+    reading = importer.to_book({'Title': 'X', 'Author': 'Y', 'Exclusive Shelf': 'currently-reading'}, 'goodreads')
+    assert reading['status'] == 'Reading' and reading['pages_read'] == 0 and reading['timestamp'] == ''
+
+
+def test_jsonl_row():
+    book = importer.to_book({
+        'title': 'Hyperion', 'author': 'Dan Simmons', 'rating': 3, 'status': 'reading',
+        'tags': ['sci-fi', ' '], 'timestamp': '2024-05-01 10:00:00', 'pages_read': 120,
+    }, 'jsonl')
+    assert book['status'] == 'Reading' and book['tags'] == ['sci-fi'] and book['pages_read'] == 120
+    assert book['genre'] == 'Unknown' and book['total_pages'] == 0
+
+
+@pytest.mark.parametrize('rating, status, expected', [
+    ('9', 'Completed', 5),
+    ('0', 'Completed', ''),
+    ('-2', 'Completed', ''),
+    ('great', 'Completed', ''),
+    ('4', 'To Read', ''),
+    ('4', 'someday', ''),
+])
+def test_rating_rules(rating, status, expected):
+    book = importer.to_book({'title': 'T', 'author': 'A', 'rating': rating, 'status': status}, 'csv')
+    assert book['rating'] == expected
+
+
+@pytest.mark.parametrize('row', [None, 'not a dict', {'title': 'No author'}, {'title': ' ', 'author': 'A'}])
+def test_unusable_rows(row):
+    assert importer.to_book(row, 'csv') is None
+
+
+def test_detect_format():
+    assert importer.detect_format('books.jsonl', 'title') == 'jsonl'
+    assert importer.detect_format('books.txt', '{"title": "Dune"}') == 'jsonl'
+    assert importer.detect_format('goodreads.csv', 'Book Id,Title,Author,My Rating,Exclusive Shelf') == 'goodreads'
+    assert importer.detect_format('books.csv', 'title,author') == 'csv'
+
+
+def test_import_skips_duplicates_and_counts_undated_books(mock_db, monkeypatch):
+    db = mock_db(['TitleAuthorIndex'])
+    monkeypatch.setattr(importer, 'IMPORT_CHUNK_SIZE', 2)
+    db.save_book({'user_id': 'US001', 'book_id': 'BS_US001_900', 'title': 'Dune', 'author': 'Frank Herbert'})
+    db.save_book({'user_id': 'US001', 'book_id': 'BS_US001_901', 'title': 'Emma', 'author': 'Jane Austen',
+                  'archived': True})
+    lines = [
+        {'title': 'DUNE', 'author': ' frank herbert'},
+        {'title': 'Emma', 'author': 'Jane Austen'},
+        {'title': 'Hyperion', 'author': 'Dan Simmons', 'timestamp': '2024-05-01'},
+        {'title': 'hyperion', 'author': 'Dan  Simmons'},
+        {'title': 'Foundation', 'author': 'Isaac Asimov', 'timestamp': 'someday'},
+        {'title': 'Persuasion', 'author': 'Jane Austen'},
+    ]
+    data = ("\n".join(json.dumps(line) for line in lines) + "\n{broken\n").encode('utf-8')
+    progress = []
+
+    summary = importer.import_file('US001', 'a@example.com', io.BytesIO(data), name='books.jsonl',
+                                   progress=lambda s: progress.append(dict(s)))
+
+    assert summary == {'imported': 3, 'duplicates': 3, 'invalid': 1, 'undated': 2}
+    assert [p['imported'] for p in progress] == [2, 3]
+    imported = {b['title']: b for b in db.iter_user_books('US001') if b['book_id'] not in ('BS_US001_900', 'BS_US001_901')}
+    assert set(imported) == {'Hyperion', 'Foundation', 'Persuasion'}
+    assert imported['Hyperion']['timestamp'] == '2024-05-01 00:00:00'
+    assert imported['Foundation']['timestamp'] == ''
+    assert len({b['book_id'] for b in imported.values()}) == 3
+    assert all(b['email'] == 'a@example.com' for b in imported.values())
@@ -0,0 +1,69 @@
+"""
+Rating lookups through the UserRatingIndex and the library fallback, and
+the rating_key that feeds the index, against moto's DynamoDB.
+"""
+from decimal import Decimal
+
+import pytest
+
+RATINGS = ['', 1, 2, 3, 3, 4, Decimal('4.5'), 5, 'not rated']
+
+
+@pytest.fixture(params=[True, False], ids=['gsi', 'fallback'])
+def db(request, mock_db):
+    database = mock_db(['UserRatingIndex'] if request.param else [])
+    for n, rating in enumerate(RATINGS):
+        database.save_book({
+            'user_id': 'US001', 'book_id': f"BS_US001_{n:03d}", 'title': f"Book {n}",
+            'author': 'Author', 'genre': 'Fantasy', 'status': 'Completed', 'rating': rating,
+        })
+    database.save_book({
+        'user_id': 'US002', 'book_id': 'BS_US002_000', 'title': 'Other', 'author': 'Author',
+        'genre': 'Fantasy', 'status': 'Completed', 'rating': 5,
+    })
+    database.library_cache.clear()
+    return database
+
+
+@pytest.mark.parametrize('comparison, rating, expected', [
+    ('eq', 3, [3, 3]),
+    ('gte', 4, [4, 4.5, 5]),
+    ('gt', 4, [4.5, 5]),
+    ('lte', 2, [1, 2]),
+    ('lt', 2, [1]),
+    ('gte', Decimal('4.5'), [4.5, 5]),
+])
+def test_comparisons(db, comparison, rating, expected):
+    books = db.query_books_by_rating(rating, 'US001', comparison=comparison)
+    assert sorted(float(b['rating']) for b in books) == expected
+    assert {b['user_id'] for b in books} == {'US001'}
+
+
+def test_unknown_comparison_is_rejected(db):
+    with pytest.raises(ValueError):
+        db.query_books_by_rating(3, 'US001', comparison='ne')
+
+
+def test_unrated_books_carry_no_rating_key(db):
+    unrated = db.books_table.get_item(Key={'user_id': 'US001', 'book_id': 'BS_US001_000'})['Item']
+    assert 'rating_key' not in unrated
+    # Clearing a rating drops the book from the index.
+    db.update_book('US001', 'BS_US001_005', set_fields={'rating': ''})
+    db.library_cache.clear()
+    assert sorted(float(b['rating']) for b in db.query_books_by_rating(4, 'US001')) == [4.5, 5]
+
+
+@pytest.mark.parametrize('rating, key', [
+    ('', None),
+    (None, None),
+    ('not rated', None),
+    ('NaN', None),
+    ('Infinity', None),
+    (0, Decimal('0')),
+    ('4', Decimal('4')),
+    (4.5, Decimal('4.5')),
+    (Decimal('3'), Decimal('3')),
+])
+def test_rating_key(rating, key):
+    import database
+    assert database.rating_key(rating) == key
@@ -0,0 +1,75 @@
+"""
+The in-process recommendation engine against a small fixture catalog: the
+response matches what show_recommendations_page renders, and books the
+reader already owns are never suggested.
+"""
+import json
+
+import pytest
+
+import rec_engine
+
+CATALOG = [
+    {'title': 'The Hobbit', 'author': 'J.R.R. Tolkien', 'genre': 'Fantasy', 'tags': 'dragons,quest'},
+    {'title': 'The Silmarillion', 'author': 'J.R.R. Tolkien', 'genre': 'Fantasy', 'tags': 'myth'},
+    {'title': 'A Wizard of Earthsea', 'author': 'Ursula K. Le Guin', 'genre': 'Fantasy', 'tags': 'magic,quest'},
+    {'title': 'His Majesty\'s Dragon', 'author': 'Naomi Novik', 'genre': 'Fantasy', 'tags': 'dragons'},
+    {'title': 'Dune', 'author': 'Frank Herbert', 'genre': 'Science Fiction', 'tags': 'desert'},
+    {'title': 'Gone Girl', 'author': 'Gillian Flynn', 'genre': 'Thriller', 'tags': ''},
+    {'title': '', 'author': 'Nobody', 'genre': 'Fantasy'},
+]
+HISTORY = [
+    {'book_id': 'BS_US001_001', 'title': 'the hobbit ', 'author': 'J.R.R.  Tolkien', 'genre': 'Fantasy',
+     'rating': 5, 'tags': ['dragons']},
+    {'book_id': 'BS_US001_002', 'title': 'Dune', 'author': 'Frank Herbert', 'genre': 'Science Fiction',
+     'rating': 2, 'tags': []},
+]
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    path = tmp_path / 'catalog.jsonl'
+    path.write_text("\n".join(json.dumps(book) for book in CATALOG) + "\n", encoding='utf-8')
+    return rec_engine.Catalog.load(str(path))
+
+
+def test_response_has_the_shape_the_page_renders(catalog):
+    recommendations, top_genres, top_authors, error = rec_engine.recommend(HISTORY, catalog=catalog)
+
+    assert error is None
+    assert recommendations and all(set(rec) == {'title', 'author', 'genre'} for rec in recommendations)
+    assert all(isinstance(value, str) for rec in recommendations for value in rec.values())
+    # The page joins these with ', '; the higher-rated history comes first.
+    assert top_genres == ['Fantasy', 'Science Fiction']
+    assert top_authors == ['J.R.R.  Tolkien', 'Frank Herbert']
+    # Results are stored in the JSON recommendation cache unchanged.
+    assert json.loads(json.dumps(recommendations)) == recommendations
+
+
+def test_owned_books_are_never_recommended(catalog):
+    recommendations, _, _, _ = rec_engine.recommend(HISTORY, catalog=catalog)
+    titles = [rec['title'] for rec in recommendations]
+
+    # Matched on normalised title and author, despite the case and spacing.
+    assert 'The Hobbit' not in titles and 'Dune' not in titles
+    assert titles[0] == 'The Silmarillion'
+    # Books with nothing in common with the history (score 0) are left out.
+    assert 'Gone Girl' not in titles
+    assert len(titles) == len(set(titles))
+
+
+def test_top_n_and_empty_inputs(catalog):
+    recommendations, _, _, _ = rec_engine.recommend(HISTORY, catalog=catalog, top_n=2)
+    assert len(recommendations) == 2
+    assert rec_engine.recommend([], catalog=catalog) == ([], [], [], None)
+
+    owned = [dict(book, rating=4) for book in CATALOG if book['title']]
+    assert rec_engine.recommend(owned, catalog=catalog)[0] == []
+
+
+def test_missing_catalog_reports_an_error(monkeypatch):
+    monkeypatch.setattr(rec_engine, 'CATALOG_PATH', '')
+    monkeypatch.setattr(rec_engine, '_catalog', None)
+    recommendations, top_genres, top_authors, error = rec_engine.recommend(HISTORY)
+    assert (recommendations, top_genres, top_authors) == (None, None, None)
+    assert error
@@ -0,0 +1,65 @@
+"""
+Recommendation prefetches after writes: a burst keeps only the latest
+computation, and finished prefetches are handed out once and not kept.
+"""
+import threading
+
+import pytest
+
+pytest.importorskip('streamlit')
+
+
+@pytest.fixture
+def release():
+    """Set to let the stubbed recommendation refreshes finish."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def recs(mock_db, monkeypatch, release):
+    mock_db()
+    import recommendations
+    from cache import TTLCache
+
+    def refresh(user_id, email):
+        release.wait(timeout=30)
+        return [{'title': f"For {user_id}", 'author': 'A', 'genre': 'G'}]
+    monkeypatch.setattr(recommendations, 'refresh_user_recommendations', refresh)
+    monkeypatch.setattr(recommendations, '_prefetches', TTLCache(maxsize=8, ttl=60))
+    return recommendations
+
+
+def test_finished_prefetch_is_returned_once(recs, release):
+    future = recs.prefetch_recommendations('US001', 'a@example.com')
+    # Still running: every check sees the same Future.
+    assert recs.get_prefetch('US001') is future
+    assert recs.get_prefetch('US001') is future
+
+    release.set()
+    assert future.result(timeout=30) == [{'title': 'For US001', 'author': 'A', 'genre': 'G'}]
+    assert recs.get_prefetch('US001') is future
+    assert recs.get_prefetch('US001') is None
+    assert len(recs._prefetches) == 0
+
+
+def test_burst_keeps_only_the_latest_prefetch(recs, release, monkeypatch):
+    monkeypatch.setattr(recs, '_prefetch_executor', recs.ThreadPoolExecutor(max_workers=1))
+    # The first one occupies the only worker, so the next two queue up.
+    running = recs.prefetch_recommendations('US001', 'a@example.com')
+    queued = recs.prefetch_recommendations('US002', 'b@example.com')
+    replaced = recs.prefetch_recommendations('US002', 'b@example.com')
+
+    assert queued.cancelled()
+    release.set()
+    assert running.result(timeout=30) and replaced.result(timeout=30)
+    assert recs.get_prefetch('US002') is replaced
+
+
+def test_uncollected_prefetches_expire(recs, release):
+    recs._prefetches.ttl = 0
+    release.set()
+    recs.prefetch_recommendations('US001', 'a@example.com').result(timeout=30)
+    assert recs.get_prefetch('US001') is None
+    assert len(recs._prefetches) == 0
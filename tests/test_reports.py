@@ -0,0 +1,118 @@
+"""
+Background report jobs: the finished PDF is returned as bytes, and spool
+files are removed when their job leaves the report cache.
+"""
+import threading
+
+import pytest
+
+from cache import TTLCache
+
+pytest.importorskip('reportlab')
+pytest.importorskip('matplotlib')
+
+import book_frame  # noqa: E402
+import reports  # noqa: E402
+
+
+def _frame(title='Book'):
+    return book_frame.books_to_frame([
+        {'title': title, 'genre': 'Fantasy', 'rating': 4, 'status': 'Completed', 'timestamp': '2024-05-01 10:00:00'},
+        {'title': f"{title} 2", 'genre': 'Horror', 'rating': '', 'status': 'Reading', 'timestamp': '2024-06-01 10:00:00'},
+    ])
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    """Reports are spooled to disk and at most two are cached."""
+    monkeypatch.setattr(reports, 'REPORT_SPOOL_ROWS', 0)
+    monkeypatch.setattr(reports, '_jobs', TTLCache(maxsize=2, ttl=3600, on_evict=reports._on_job_evicted))
+    monkeypatch.setattr(reports, '_latest_jobs', {})
+    return reports._jobs
+
+
+def _finished(user_id, df=None):
+    job = reports.request_report(user_id, df if df is not None else _frame())
+    job.future.result(timeout=60)
+    return job
+
+
+def test_finished_report_is_returned_as_bytes(jobs):
+    job = _finished('US001')
+    pdf = job.read()
+    assert isinstance(pdf, bytes) and pdf.startswith(b'%PDF')
+    assert reports.request_report('US001', _frame()) is job
+
+    job.remove_spool()
+    assert job.read() is None
+
+
+def test_in_memory_reports_are_not_spooled(jobs, monkeypatch):
+    monkeypatch.setattr(reports, 'REPORT_SPOOL_ROWS', 100)
+    job = _finished('US001')
+    assert job.path is None
+    assert job.read().startswith(b'%PDF')
+
+
+def test_evicted_jobs_remove_their_spool_files(jobs):
+    first, second = _finished('US001'), _finished('US002')
+    third = _finished('US003')
+
+    assert first.read() is None
+    assert second.read() is not None and third.read() is not None
+    assert len(jobs) == 2
+
+
+def test_expired_jobs_remove_their_spool_files(jobs):
+    jobs.ttl = 0
+    job = _finished('US001')
+    # The next request finds the entry expired and renders again.
+    again = _finished('US001')
+    assert again is not job
+    assert job.read() is None and again.read() is not None
+
+
+def test_running_job_keeps_its_file_until_it_finishes(jobs, monkeypatch):
+    release = threading.Event()
+
+    def slow_pdf(df, user_id, output=None, progress=None):
+        release.wait(timeout=60)
+        with open(output, 'wb') as f:
+            f.write(b'%PDF-slow')
+    monkeypatch.setattr(reports, 'generate_pdf', slow_pdf)
+
+    running = reports.request_report('US001', _frame())
+    reports.request_report('US002', _frame('Other'))
+    reports.request_report('US003', _frame('Third'))
+    assert running.path and not running.done()
+
+    release.set()
+    running.future.result(timeout=60)
+    assert running.read() is None
+
+
+def test_library_change_discards_the_previous_report(jobs):
+    old = _finished('US001')
+    new = _finished('US001', _frame('Changed'))
+    assert old.read() is None and new.read() is not None
+    assert jobs.get(old.key) is None
+
+
+def test_cache_calls_on_evict_for_lru_and_expiry_only():
+    evicted = []
+    cache = TTLCache(maxsize=2, ttl=3600, on_evict=lambda key, value: evicted.append(key))
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert evicted == ['b']
+
+    cache.set('a', 10)
+    cache.invalidate('c')
+    cache.clear()
+    assert evicted == ['b']
+
+    cache.ttl = 0
+    cache.set('d', 4)
+    assert cache.get('d') is None
+    assert evicted == ['b', 'd']
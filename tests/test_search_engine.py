@@ -0,0 +1,113 @@
+"""
+BM25 ranking, trigram typo matching and incremental updates of the
+full-text search index, including through PerUserIndexes.
+"""
+from cache import PerUserIndexes
+from change_feed import ChangeEvent
+from search_engine import SearchIndex
+
+BOOKS = [
+    {'book_id': 'hobbit', 'title': 'The Hobbit', 'author': 'J.R.R. Tolkien', 'tags': ['fantasy', 'dragons']},
+    {'book_id': 'rings', 'title': 'The Fellowship of the Ring', 'author': 'J.R.R. Tolkien', 'tags': ['fantasy']},
+    {'book_id': 'dune', 'title': 'Dune', 'author': 'Frank Herbert', 'tags': ['science fiction', 'desert']},
+    {'book_id': 'dragons', 'title': 'A Natural History of Dragons', 'author': 'Marie Brennan', 'tags': ['fantasy']},
+    {'book_id': 'temeraire', 'title': 'His Majesty\'s Dragon', 'author': 'Naomi Novik', 'tags': ['alternate history']},
+]
+
+
+def _ids(hits):
+    return [book_id for book_id, _ in hits]
+
+
+def test_title_hits_outrank_tag_hits():
+    index = SearchIndex(BOOKS)
+    # 'dragons' is in one title and in one book's tags.
+    assert _ids(index.search('dragons'))[:2] == ['dragons', 'hobbit']
+
+
+def test_rarer_terms_weigh_more():
+    index = SearchIndex(BOOKS)
+    # Both match 'tolkien'; only The Hobbit also matches the rarer 'hobbit'.
+    hits = index.search('tolkien hobbit')
+    assert _ids(hits)[0] == 'hobbit'
+    assert set(_ids(hits)) == {'hobbit', 'rings'}
+    scores = dict(hits)
+    assert scores['hobbit'] > 2 * scores['rings']
+
+
+def test_shorter_documents_rank_higher_for_the_same_match():
+    index = SearchIndex([
+        {'book_id': 'short', 'title': 'Dune', 'author': 'A', 'tags': []},
+        {'book_id': 'long', 'title': 'Dune and many other words in a long title', 'author': 'B', 'tags': []},
+    ])
+    assert _ids(index.search('dune')) == ['short', 'long']
+
+
+def test_stopwords_and_empty_queries_match_nothing():
+    index = SearchIndex(BOOKS)
+    assert index.search('the of a') == []
+    assert index.search('') == []
+    assert SearchIndex().search('dune') == []
+
+
+def test_typos_fall_back_to_trigram_matches():
+    index = SearchIndex(BOOKS)
+    assert _ids(index.search('hobit'))[0] == 'hobbit'
+    assert set(_ids(index.search('tolkein'))) == {'hobbit', 'rings'}
+    assert _ids(index.search('herbret dune'))[0] == 'dune'
+    assert index.search('zzzzzz') == []
+
+
+def test_exact_matches_score_above_fuzzy_ones():
+    index = SearchIndex([
+        {'book_id': 'exact', 'title': 'Dragon', 'author': 'A', 'tags': []},
+        {'book_id': 'fuzzy', 'title': 'Dragons', 'author': 'B', 'tags': []},
+    ])
+    # 'dragon' is in the vocabulary, so only the exact book matches.
+    assert _ids(index.search('dragon')) == ['exact']
+    # 'dragonn' is not, and is closer to 'dragon' than to 'dragons'.
+    assert _ids(index.search('dragonn')) == ['exact', 'fuzzy']
+
+
+def test_replacing_and_removing_books_updates_the_index():
+    index = SearchIndex(BOOKS)
+    index.add_book({'book_id': 'dune', 'title': 'Children of Dune', 'author': 'Frank Herbert', 'tags': []})
+    assert len(index) == len(BOOKS)
+    assert index.search('desert') == []
+    assert _ids(index.search('children')) == ['dune']
+
+    for book in BOOKS:
+        index.remove_book(book['book_id'])
+    index.remove_book('never-added')
+    assert len(index) == 0
+    assert index._postings == {} and index._trigrams == {} and index._total_len == 0
+
+
+def _event(book_id, old_book=None, new_book=None, user_id='US001'):
+    name = 'INSERT' if old_book is None else 'REMOVE' if new_book is None else 'MODIFY'
+    return ChangeEvent(f"local-{book_id}", name, user_id, book_id, old_book, new_book, 1)
+
+
+def test_per_user_indexes_follow_change_events():
+    built = []
+
+    def factory(user_id):
+        built.append(user_id)
+        return SearchIndex(BOOKS[:2])
+    indexes = PerUserIndexes(factory)
+    index = indexes.get('US001')
+
+    dune = {'book_id': 'dune', 'title': 'Dune', 'author': 'Frank Herbert', 'tags': []}
+    indexes.apply([
+        _event('dune', None, dune),
+        _event('rings', BOOKS[1], {**BOOKS[1], 'archived': True}),
+        _event('hobbit', BOOKS[0], None),
+        # Indexes that are not loaded are left to be built on the next get().
+        _event('other', None, {'book_id': 'other', 'title': 'Other'}, user_id='US002'),
+    ])
+
+    assert indexes.get('US001') is index
+    assert built == ['US001']
+    assert _ids(index.search('dune')) == ['dune']
+    assert index.search('tolkien') == []
+    assert len(index) == 1
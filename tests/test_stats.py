@@ -0,0 +1,127 @@
+"""
+The per-user stats aggregate: per-book contributions, deltas from book
+writes, and the consistency checker, against moto's DynamoDB.
+"""
+from decimal import Decimal
+
+import pytest
+
+import change_feed
+
+
+@pytest.fixture
+def db(mock_db):
+    database = mock_db()
+    database.changes = []
+    database.add_book_batch_listener(database.changes.extend)
+    return database
+
+
+@pytest.fixture
+def stats(db):
+    import stats
+    return stats
+
+
+def _book(n, **fields):
+    return {
+        'user_id': 'US001',
+        'book_id': f"BS_US001_{n:03d}",
+        'title': f"Book {n}",
+        'author': 'Author',
+        'genre': 'Fantasy',
+        'rating': 4,
+        'status': 'Completed',
+        'timestamp': '2024-05-01 10:00:00',
+        **fields,
+    }
+
+
+def _apply_changes(db, stats):
+    """Feeds the writes captured so far to the stats handler, as the change feed would."""
+    records = [change_feed.make_record(i + 1, *change) for i, change in enumerate(db.changes)]
+    stats.handle_changes([change_feed.to_event(record) for record in records])
+    db.changes.clear()
+
+
+def _stored(stats):
+    return {k: v for k, v in (stats._load('US001') or {}).items() if v}
+
+
+def _expected(db, stats):
+    return {k: Decimal(str(v)) for k, v in stats.compute_stats(db.iter_user_books('US001')).items() if v}
+
+
+def test_book_contribution():
+    import stats
+    rated = stats.book_contribution(_book(1))
+    assert rated == {
+        'total_books': 1, 'g:Fantasy': 1, 'rated_books': 1, 'rating_sum': Decimal('4.0'),
+        'r:4.0': 1, 'completed_books': 1, 'm:2024-05': 1,
+    }
+    unrated = stats.book_contribution(_book(2, rating='', status='To Read', timestamp='someday'))
+    assert unrated == {'total_books': 1, 'g:Fantasy': 1, 'pending_books': 1}
+    assert stats.book_contribution(None) == {}
+
+
+def test_deltas_follow_add_edit_archive_and_delete(db, stats):
+    db.save_book(_book(1))
+    stats.rebuild_stats('US001')
+    db.changes.clear()
+
+    db.save_book(_book(2, rating='', status='Reading'))
+    _apply_changes(db, stats)
+    assert _stored(stats) == _expected(db, stats)
+
+    db.update_book('US001', 'BS_US001_002', set_fields={'rating': 5, 'status': 'Completed', 'genre': 'Horror'})
+    _apply_changes(db, stats)
+    assert _stored(stats) == _expected(db, stats)
+
+    db.update_books('US001', [('BS_US001_001', {'archived': True}, None)])
+    _apply_changes(db, stats)
+    assert _stored(stats) == _expected(db, stats)
+
+    db.delete_books('US001', ['BS_US001_001'])
+    db.delete_book('US001', 'BS_US001_002')
+    _apply_changes(db, stats)
+    assert _stored(stats) == {}
+    assert stats.check_stats('US001') == {}
+
+
+def test_users_without_an_aggregate_are_skipped(db, stats):
+    stats.apply_delta('US009', {'total_books': 1})
+    assert stats._load('US009') is None
+
+
+def test_check_stats_reports_and_repairs_drift(db, stats):
+    for n in range(3):
+        db.save_book(_book(n))
+    stats.rebuild_stats('US001')
+    stats.apply_delta('US001', {'total_books': 2, 'g:Horror': 1})
+
+    mismatches = stats.check_stats('US001', repair=True)
+
+    assert mismatches == {'total_books': (5, 3), 'g:Horror': (1, 0)}
+    assert stats.check_stats('US001') == {}
+    assert stats.get_user_stats('US001').total_books == 3
+
+
+def test_rebuild_retries_when_a_delta_lands_meanwhile(db, stats, monkeypatch):
+    db.save_book(_book(1))
+    stats.rebuild_stats('US001')
+    iter_user_books = db.iter_user_books
+    raced = []
+
+    def racing_iter(user_id, **kwargs):
+        # Another session adds a book while the rebuild is reading.
+        if not raced:
+            raced.append(True)
+            db.save_book(_book(2))
+            stats.apply_delta('US001', stats.book_contribution(_book(2)))
+        return iter_user_books(user_id, **kwargs)
+    monkeypatch.setattr(db, 'iter_user_books', racing_iter)
+
+    stats.rebuild_stats('US001')
+
+    assert _stored(stats)['total_books'] == 2
+    assert _stored(stats) == _expected(db, stats)
@@ -0,0 +1,55 @@
+"""
+Duplicate detection through the TitleAuthorIndex GSI, its library
+fallback, and the index-key backfill, against moto's DynamoDB.
+"""
+import pytest
+
+LIBRARY_SIZE = 10000
+
+
+@pytest.fixture(params=[True, False], ids=['gsi', 'fallback'])
+def db(request, mock_db):
+    return mock_db(['TitleAuthorIndex'] if request.param else [])
+
+
+def _fill(database, user_id, count, with_keys=True):
+    with database.books_table.batch_writer() as batch:
+        for n in range(count):
+            book = {
+                'user_id': user_id,
+                'book_id': f"BS_{user_id}_{n:05d}",
+                'title': f"Book {n}",
+                'author': f"Author {n % 97}",
+                'genre': 'Fantasy',
+                'rating': (n % 5) + 1,
+                'status': 'Completed',
+            }
+            if with_keys:
+                book.update(database.index_keys(book))
+            batch.put_item(Item=book)
+
+
+def test_finds_book_in_large_library(db):
+    _fill(db, 'US001', LIBRARY_SIZE)
+    # Book 4321 is by Author 53 (4321 % 97); case and spacing are normalized.
+    found = db.find_book_by_title_author('US001', '  book 4321 ', 'AUTHOR  53')
+    assert found is not None
+    assert found['book_id'] == 'BS_US001_04321'
+
+
+def test_missing_book_and_other_users(db):
+    _fill(db, 'US001', 50)
+    _fill(db, 'US002', 1)
+    assert db.find_book_by_title_author('US001', 'Book 50', 'Author 50') is None
+    assert db.find_book_by_title_author('US002', 'Book 10', 'Author 10') is None
+
+
+def test_backfill_makes_old_books_findable(db):
+    _fill(db, 'US001', 200, with_keys=False)
+    import migrations
+    assert migrations.backfill_index_keys() == 200
+    assert migrations.backfill_index_keys() == 0
+    db.library_cache.clear()
+    found = db.find_book_by_title_author('US001', 'Book 150', 'Author 53')
+    assert found is not None
+    assert found['title_author_key'] == 'book 150#author 53'